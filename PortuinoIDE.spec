@@ -12,7 +12,13 @@ a = Analysis(
     ],
     hiddenimports=[
         'portuino_compiler',
+        'arduino_cli_manager',
         'interpretador_portuino',
+        'servidor_compilacao',
+        'catalogo_placas',
+        'tradutor_portuino',
+        'historico_tamanho',
+        'analise_tempo',
     ],
     hookspath=[],
     hooksconfig={},
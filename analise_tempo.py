@@ -0,0 +1,506 @@
+# analise_tempo.py
+# Estimativa estática de tempo de um programa Portuino ("quão rápido roda o meu laço?"),
+# sem compilar nem executar nada.
+#
+# - Percorre a árvore do tradutor (analisar) somando os esperar() e o custo estimado de cada
+#   instrução, com um modelo de custo por alvo: placas compiladas (AVR, ESP8266, ESP32) e o
+#   interpretador no PC falando com a placa por Firmata
+# - Cada custo é um intervalo (mín, máx); máx = None quando não há limite conhecido
+#   (ex.: "enquanto (ler(2) == 0)" espera o botão pelo tempo que for)
+# - Relatório: duração do setup, período do laço principal (ou de cada tarefa no modo não
+#   bloqueante), pior latência de resposta a cada entrada lida e os pontos que mais bloqueiam
+# - quando_mudar: a interrupção conta a borda na hora; a latência é até o corpo rodar (o trecho
+#   mais longo do laço sem esperar() mais os corpos de todos os quando_mudar)
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import tradutor_portuino as tp
+
+LIMIAR_BLOQUEIO_US = 1000   # instruções a partir de 1 ms entram nos "pontos que bloqueiam"
+MAX_PONTOS = 8
+
+
+@dataclass(frozen=True)
+class ModeloCusto:
+    """Custos aproximados (µs) de cada operação num alvo."""
+    nome: str
+    descricao: str
+    instrucao_us: float         # atribuição, comparação, volta de laço
+    operacao_us: float          # operação com inteiro
+    operacao_real_us: float     # operação com real (sem FPU é por software)
+    texto_us: float             # operação com texto (String no heap)
+    modo_us: float              # pinMode
+    escrita_us: float           # digitalWrite
+    leitura_us: float           # digitalRead
+    escrever_us: float          # custo fixo de cada escrever()
+    serial_byte_us: float       # copiar 1 byte para o buffer da Serial
+    serial_buffer: int          # bytes aceitos sem esperar a transmissão (0 = não usa a Serial da placa)
+    sonar_us: Tuple[float, float]   # medir_distancia(): eco a ~2 cm .. timeout sem eco
+    esperar_extra_us: float = 0.0   # atraso a mais (pior caso) de cada esperar()
+    latencia_entrada_us: float = 0.0  # até a mudança no pino chegar ao programa
+
+
+ALVOS: Dict[str, ModeloCusto] = {
+    "avr": ModeloCusto(
+        "avr", "Arduino AVR 16 MHz (Uno, Nano, Mega) — sketch compilado",
+        instrucao_us=1.0, operacao_us=0.4, operacao_real_us=10.0, texto_us=30.0,
+        modo_us=4.0, escrita_us=4.0, leitura_us=4.0,
+        escrever_us=10.0, serial_byte_us=4.0, serial_buffer=64, sonar_us=(150.0, 30050.0),
+    ),
+    "esp8266": ModeloCusto(
+        "esp8266", "ESP8266 80 MHz — sketch compilado",
+        instrucao_us=0.1, operacao_us=0.03, operacao_real_us=1.0, texto_us=5.0,
+        modo_us=1.0, escrita_us=1.0, leitura_us=1.0,
+        escrever_us=5.0, serial_byte_us=1.0, serial_buffer=128, sonar_us=(150.0, 30050.0),
+    ),
+    "esp32": ModeloCusto(
+        "esp32", "ESP32 240 MHz — sketch compilado",
+        instrucao_us=0.03, operacao_us=0.01, operacao_real_us=0.05, texto_us=2.0,
+        modo_us=2.0, escrita_us=0.1, leitura_us=0.1,
+        escrever_us=2.0, serial_byte_us=0.5, serial_buffer=128, sonar_us=(150.0, 30050.0),
+    ),
+    # Cada linha é analisada e avaliada em Python; cada escrita vira uma mensagem Firmata
+    # (3 bytes a 57600 baud); as leituras usam o último valor que a placa reportou.
+    "interpretador": ModeloCusto(
+        "interpretador", "Interpretador no PC + placa via Firmata (57600 baud)",
+        instrucao_us=40.0, operacao_us=2.0, operacao_real_us=2.0, texto_us=3.0,
+        modo_us=600.0, escrita_us=520.0, leitura_us=5.0,
+        escrever_us=50.0, serial_byte_us=0.0, serial_buffer=0, sonar_us=(2500.0, 62500.0),
+        esperar_extra_us=2000.0, latencia_entrada_us=2000.0,
+    ),
+}
+
+
+def alvo_para_fqbn(fqbn: Optional[str]) -> str:
+    """Modelo de custo mais próximo da placa escolhida."""
+    f = (fqbn or "").lower()
+    if f.startswith("esp32:"):
+        return "esp32"
+    if f.startswith("esp8266:"):
+        return "esp8266"
+    return "avr"
+
+
+# ------------------ Resultado ------------------
+
+@dataclass(frozen=True)
+class Custo:
+    """Intervalo de tempo em µs; max_us None = sem limite conhecido."""
+    min_us: float = 0.0
+    max_us: Optional[float] = 0.0
+
+    def __add__(self, outro: "Custo") -> "Custo":
+        maximo = None if self.max_us is None or outro.max_us is None else self.max_us + outro.max_us
+        return Custo(self.min_us + outro.min_us, maximo)
+
+    def vezes(self, n: int) -> "Custo":
+        return Custo(self.min_us * n, None if self.max_us is None else self.max_us * n)
+
+    def ou(self, outro: "Custo") -> "Custo":
+        """Um dos dois caminhos (se/senao)."""
+        maximo = None if self.max_us is None or outro.max_us is None else max(self.max_us, outro.max_us)
+        return Custo(min(self.min_us, outro.min_us), maximo)
+
+    def texto(self) -> str:
+        if self.max_us is None:
+            return f"≥ {_fmt(self.min_us)} (sem limite)"
+        if _fmt(self.min_us) == _fmt(self.max_us):
+            return _fmt(self.max_us)
+        return f"{_fmt(self.min_us)} – {_fmt(self.max_us)}"
+
+
+@dataclass
+class PontoCritico:
+    linha: int
+    descricao: str
+    custo: Custo
+
+
+@dataclass
+class Latencia:
+    """Pior tempo entre uma mudança no pino e o programa perceber (None = sem limite)."""
+    entrada: str        # "ler(botao=2)"
+    linha: int
+    max_us: Optional[float]
+    nota: str = ""
+
+
+@dataclass
+class Periodo:
+    nome: str           # "Laço principal" | "Tarefa 1"
+    linha: int
+    custo: Custo
+
+
+@dataclass
+class RelatorioTempo:
+    alvo: str
+    descricao: str
+    inicializacao: Custo
+    periodos: List[Periodo] = field(default_factory=list)
+    latencias: List[Latencia] = field(default_factory=list)
+    pontos: List[PontoCritico] = field(default_factory=list)
+    avisos: List[str] = field(default_factory=list)
+
+    def texto(self) -> str:
+        linhas = [f"Alvo: {self.descricao}", f"Inicialização (setup): {self.inicializacao.texto()}"]
+        if not self.periodos:
+            linhas.append("Sem \"enquanto (verdadeiro)\": o programa roda uma vez.")
+        for p in self.periodos:
+            por_segundo = ""
+            if p.custo.max_us:
+                por_segundo = f"  (≈ {1e6 / p.custo.max_us:.3g} voltas/s no pior caso)"
+            linhas.append(f"{p.nome} (linha {p.linha}): {p.custo.texto()} por volta{por_segundo}")
+        if self.latencias:
+            linhas.append("Resposta a entradas (pior caso):")
+            for lat in self.latencias:
+                tempo = "sem limite" if lat.max_us is None else f"até {_fmt(lat.max_us)}"
+                linhas.append(f"  linha {lat.linha}: {lat.entrada}: {tempo}" + (f" — {lat.nota}" if lat.nota else ""))
+        if self.pontos:
+            linhas.append("Pontos que bloqueiam:")
+            for p in self.pontos:
+                linhas.append(f"  linha {p.linha}: {p.descricao} — {p.custo.texto()}")
+        for aviso in self.avisos:
+            linhas.append(f"AVISO: {aviso}")
+        return "\n".join(linhas)
+
+
+def _fmt(us: float) -> str:
+    if us < 1000:
+        return f"{us:.3g} µs"
+    if us < 1e6:
+        return f"{us / 1000:.4g} ms"
+    return f"{us / 1e6:.3g} s"
+
+
+# ------------------ Análise ------------------
+
+_CHAMADA_RE = re.compile(r"\b(ler|medir_distancia)\s*\(([^()]*)\)")
+_CARACTERES = {"inteiro": 5, "real": 6, "logico": 10, "texto": 10}  # largura típica ao escrever
+
+
+class _Analisador:
+    """
+    Custo de instruções num modelo. com_esperas=False: esperar() não conta
+    (no modo não bloqueante ele devolve a vez em vez de parar a placa).
+    """
+    def __init__(self, modelo: ModeloCusto, tipos: Dict[str, str], constantes: Dict[str, str],
+                 baud: int, com_esperas: bool = True, subrotinas: Optional[Dict[str, tp.Subrotina]] = None):
+        self.m = modelo
+        self.tipos = tipos
+        self.constantes = constantes
+        self.baud = baud
+        self.com_esperas = com_esperas
+        self.subrotinas = subrotinas or {}
+        self.pontos: List[PontoCritico] = []
+        self.leituras: Dict[str, int] = {}  # entrada -> 1ª linha que lê
+        self.avisos: List[str] = []
+        self._custos: Dict[str, Optional[Custo]] = {}  # custo do corpo; None = analisando (recursão)
+
+    def _valor(self, texto: str) -> Optional[float]:
+        """Valor numérico constante (literal ou variável declarada com constante e nunca reatribuída)."""
+        texto = texto.strip()
+        texto = self.constantes.get(texto, texto)
+        try:
+            return float(texto)
+        except ValueError:
+            return self._conta(texto)
+
+    def _conta(self, texto: str) -> Optional[float]:
+        """Conta simples com constantes e tamanho(v) (ex.: para i de 0 ate tamanho(v) - 1)."""
+        def tamanho(m: re.Match) -> str:
+            vetor = tp._vetor(self.tipos.get(m.group(1)))
+            return str(vetor[1]) if vetor else m.group(0)
+
+        texto = re.sub(r"\btamanho\s*\(\s*(\w+)\s*\)", tamanho, texto)
+        texto = re.sub(r"\b[A-Za-z_]\w*\b", lambda m: self.constantes.get(m.group(0), m.group(0)), texto)
+        if not re.fullmatch(r"[\d\s+\-*()]+", texto):  # sem divisão: / e % do C diferem do Python
+            return None
+        try:
+            return float(eval(texto, {"__builtins__": {}}))
+        except (SyntaxError, TypeError):
+            return None
+
+    def _entrada(self, funcao: str, args: str) -> str:
+        pinos = []
+        for a in args.split(","):
+            v = self._valor(a)
+            pinos.append(a.strip() if v is None or a.strip() == str(int(v)) else f"{a.strip()}={int(v)}")
+        return f"{funcao}({', '.join(pinos)})"
+
+    def _ponto(self, linha: int, descricao: str, custo: Custo) -> None:
+        if custo.max_us is None or custo.max_us >= LIMIAR_BLOQUEIO_US:
+            self.pontos.append(PontoCritico(linha, descricao, custo))
+
+    def expr(self, texto: str, linha: int) -> Custo:
+        tokens = [(m.lastgroup, m.group(m.lastgroup)) for m in tp._TOKEN_RE.finditer(texto)]
+        ops = sum(1 for g, t in tokens if g == "op" and t not in "(),]")  # v[i] conta como uma operação
+        real = any(
+            (g == "num" and "." in t) or (g == "id" and (self.tipos.get(t, "").startswith("real") or t == "float"))
+            for g, t in tokens
+        )
+        com_texto = any(g == "str" or (g == "id" and self.tipos.get(t) == "texto") for g, t in tokens)
+        por_op = self.m.texto_us if com_texto else self.m.operacao_real_us if real else self.m.operacao_us
+        custo = Custo(ops * por_op, ops * por_op)
+        for nome in re.findall(r"\b(\w+)\s*\(", re.sub(r'"(?:\\.|[^"\\])*"', '""', texto)):
+            if nome in self.subrotinas:
+                custo += self.chamada(nome, linha)
+        for m in _CHAMADA_RE.finditer(texto):
+            entrada = self._entrada(m.group(1), m.group(2))
+            self.leituras.setdefault(entrada, linha)
+            if m.group(1) == "ler":
+                custo += Custo(self.m.leitura_us, self.m.leitura_us)
+            else:
+                sonar = Custo(*self.m.sonar_us)
+                self._ponto(linha, f"{entrada} (espera o eco; sem eco, o timeout inteiro)", sonar)
+                custo += sonar
+        return custo
+
+    def chamada(self, nome: str, linha: int) -> Custo:
+        """Procedimento/funcao: o corpo (analisado uma vez) mais a ida e a volta da chamada."""
+        if nome not in self._custos:
+            sub = self.subrotinas[nome]
+            self._custos[nome] = None
+            tipos, self.tipos = self.tipos, tp._locais(sub, self.tipos)[0]
+            try:
+                self._custos[nome] = self.bloco(sub.corpo)
+            finally:
+                self.tipos = tipos
+        corpo = self._custos[nome]
+        if corpo is None:
+            self.avisos.append(f"Linha {linha}: '{nome}' é recursiva: custo sem limite.")
+            return Custo(0.0, None)
+        return corpo + Custo(2 * self.m.instrucao_us, 2 * self.m.instrucao_us)  # call + return
+
+    def _caracteres(self, texto: str) -> int:
+        n = 2  # \r\n do println
+        for m in tp._TOKEN_RE.finditer(texto):
+            if m.lastgroup == "str":
+                n += len(m.group("str")) - 2
+            elif m.lastgroup == "num":
+                n += len(m.group("num"))
+            elif m.lastgroup == "id" and m.group("id") in self.tipos:
+                n += _CARACTERES[self.tipos[m.group("id")].split("[")[0]]  # vetor: largura do item
+        return n
+
+    def comando(self, s: str, linha: int) -> Custo:
+        base = Custo(self.m.instrucao_us, self.m.instrucao_us)
+        m = re.match(r"^(configurar_saida|configurar_entrada|ligar|desligar|esperar|escrever)\((.*)\)$", s)
+        if not m and re.match(r"^(\w+)\s*\(", s) and re.match(r"^(\w+)", s).group(1) in self.subrotinas:
+            return base + self.expr(s, linha)
+        if not m:
+            self.avisos.append(f"Linha {linha}: C++ direto, custo não estimado: {s}")
+            return base
+        nome, arg = m.groups()
+        custo = base + self.expr(arg, linha)
+        if nome.startswith("configurar_"):
+            return custo + Custo(self.m.modo_us, self.m.modo_us)
+        if nome in ("ligar", "desligar"):
+            return custo + Custo(self.m.escrita_us, self.m.escrita_us)
+        if nome == "esperar":
+            if not self.com_esperas:
+                return custo
+            ms = self._valor(arg)
+            if ms is None:
+                espera = Custo(0.0, None)
+                self.avisos.append(f"Linha {linha}: esperar({arg.strip()}) com tempo variável: duração desconhecida.")
+            else:
+                espera = Custo(ms * 1000, ms * 1000 + self.m.esperar_extra_us)
+            self._ponto(linha, f"esperar({arg.strip()})", espera)
+            return custo + espera
+        # escrever
+        n = self._caracteres(arg)
+        fixo = self.m.escrever_us + n * self.m.serial_byte_us
+        if not self.m.serial_buffer:
+            serial = Custo(fixo, fixo)
+        else:
+            # Cabe no buffer: só copia. Buffer já cheio (escritas seguidas): espera cada byte sair.
+            por_byte = 10e6 / self.baud
+            serial = Custo(fixo + max(0, n - self.m.serial_buffer) * por_byte, fixo + n * por_byte)
+        self._ponto(linha, f"escrever (~{n} caracteres a {self.baud} baud)", serial)
+        return custo + serial
+
+    def no(self, no: tp.No) -> Custo:
+        i = self.m.instrucao_us
+        if isinstance(no, (tp.Decl, tp.Atribuicao)):
+            return Custo(i, i) + self.expr(no.expr, no.linha)
+        if isinstance(no, tp.Retornar):
+            return Custo(i, i) + self.expr(no.expr or "", no.linha)
+        if isinstance(no, tp.Comando):
+            return self.comando(no.texto, no.linha)
+        if isinstance(no, tp.Se):
+            cond = Custo(i, i) + self.expr(no.cond, no.linha)
+            return cond + self.bloco(no.entao).ou(self.bloco(no.senao))
+        if isinstance(no, tp.Enquanto):
+            volta = Custo(i, i) + self.expr(no.cond, no.linha)
+            corpo = self.bloco(no.corpo)
+            if tp._eh_verdadeiro(no.cond):
+                self.avisos.append(f"Linha {no.linha}: laço infinito dentro do programa: o que vem depois nunca roda.")
+                custo = Custo(volta.min_us + corpo.min_us, None)
+                self._ponto(no.linha, "enquanto (verdadeiro) interno (não termina)", custo)
+                return custo
+            # Repetições desconhecidas: no mínimo testa a condição uma vez
+            custo = Custo(volta.min_us, None)
+            if _CHAMADA_RE.search(no.cond):
+                self._ponto(no.linha, f"enquanto ({no.cond.strip()}): espera a entrada mudar", custo)
+            else:
+                self._ponto(no.linha, f"enquanto ({no.cond.strip()}): repetições desconhecidas", custo)
+            return custo
+        if isinstance(no, tp.Para):
+            de, ate, passo = (self._valor(x) for x in (no.de, no.ate, no.passo))
+            volta = Custo(2 * i, 2 * i) + self.bloco(no.corpo)
+            if None in (de, ate, passo) or not passo:
+                custo = Custo(0.0, None)
+                self._ponto(no.linha, f"para {no.var}: número de voltas desconhecido", custo)
+                return custo
+            voltas = max(0, int((ate - de) // passo) + 1)
+            custo = Custo(i, i) + volta.vezes(voltas)
+            self._ponto(no.linha, f"para {no.var} ({voltas} volta{'' if voltas == 1 else 's'})", custo)
+            return custo
+        return Custo()
+
+    def bloco(self, nos: List[tp.No]) -> Custo:
+        total = Custo()
+        for no in nos:
+            total += self.no(no)
+        return total
+
+
+def _constantes(programa: List[tp.No], declaradas: Dict[str, tp.Decl]) -> Dict[str, str]:
+    """Variáveis declaradas com constante e nunca reatribuídas (ex.: inteiro botao <- 2)."""
+    reatribuidas = {no.nome for no in tp._percorrer(programa) if isinstance(no, tp.Atribuicao)}
+    reatribuidas |= {no.var for no in tp._percorrer(programa) if isinstance(no, tp.Para)}
+    return {
+        nome: d.expr for nome, d in declaradas.items()
+        if nome not in reatribuidas and not tp._vetor(d.tipo) and tp._constante(d.expr)
+    }
+
+
+def estimar(code_ptn: str, alvo: str = "avr", baud: int = 9600, nao_bloqueante: bool = False) -> RelatorioTempo:
+    """
+    Estima os tempos do programa no alvo (veja ALVOS). Levanta ErroTraducao se o programa
+    não é válido. nao_bloqueante só vale para os alvos compilados (o interpretador roda em ordem).
+    """
+    if alvo not in ALVOS:
+        raise ValueError(f"Alvo desconhecido: {alvo} (opções: {', '.join(ALVOS)})")
+    modelo = ALVOS[alvo]
+    programa = tp.analisar(code_ptn)
+    subrotinas = {no.nome: no for no in programa if isinstance(no, tp.Subrotina)}
+    quandos = [no for no in programa if isinstance(no, tp.QuandoMudar)]
+    programa = [no for no in programa if not isinstance(no, (tp.Subrotina, tp.QuandoMudar))]
+    tipos, declaradas, _ = tp._tabela_tipos(programa, tp._assinaturas(list(subrotinas.values())))
+    # globais reatribuídas dentro de uma sub-rotina ou quando_mudar não são constantes
+    constantes = _constantes(programa + list(subrotinas.values()) + quandos, declaradas)
+
+    def analisador(com_esperas: bool = True) -> _Analisador:
+        return _Analisador(modelo, tipos, constantes, baud, com_esperas, subrotinas)
+
+    avisos: List[str] = []
+    if nao_bloqueante and alvo == "interpretador":
+        avisos.append("O interpretador não tem modo não bloqueante: os laços rodam em ordem.")
+        nao_bloqueante = False
+
+    if nao_bloqueante:
+        tarefas = [no for no in programa if isinstance(no, tp.Enquanto) and tp._eh_verdadeiro(no.cond)]
+    elif programa and isinstance(programa[-1], tp.Enquanto) and tp._eh_verdadeiro(programa[-1].cond):
+        tarefas = [programa[-1]]
+    else:
+        tarefas = []
+    inicial = [no for no in programa if not any(no is t for t in tarefas)]
+
+    a_setup = analisador()
+    rel = RelatorioTempo(alvo=alvo, descricao=modelo.descricao, inicializacao=a_setup.bloco(inicial))
+    pontos = list(a_setup.pontos)
+    avisos += a_setup.avisos
+    for entrada, linha in a_setup.leituras.items():
+        rel.latencias.append(Latencia(entrada, linha, None, "lido só na inicialização: mudanças depois não são vistas"))
+
+    # Período de cada laço (com as esperas) e fatia sem devolver a vez (sem as esperas)
+    analises = []
+    for k, t in enumerate(tarefas, 1):
+        a = analisador()
+        volta = Custo(modelo.instrucao_us, modelo.instrucao_us) + a.bloco(t.corpo)
+        if nao_bloqueante:
+            # esperar() devolve a vez: não bloqueia as outras tarefas
+            sem_esperas = analisador(com_esperas=False)
+            fatia = sem_esperas.bloco(t.corpo)
+            pontos += sem_esperas.pontos
+        else:
+            fatia = volta
+            pontos += a.pontos
+        nome = f"Tarefa {k}" if nao_bloqueante else "Laço principal"
+        rel.periodos.append(Periodo(nome, t.linha, volta))
+        analises.append((a, volta, fatia))
+        avisos += a.avisos
+
+    for k, (a, volta, fatia) in enumerate(analises):
+        # No modo não bloqueante as outras tarefas rodam entre duas voltas desta
+        outras = Custo()
+        for j, (_, _, f) in enumerate(analises):
+            if j != k:
+                outras += f
+        espera = volta + outras
+        maximo = None if espera.max_us is None else espera.max_us + modelo.latencia_entrada_us
+        for entrada, linha in a.leituras.items():
+            nota = "" if maximo is not None else "o laço tem uma espera sem limite"
+            rel.latencias.append(Latencia(entrada, linha, maximo, nota))
+
+    if quandos:
+        rel.latencias += _latencias_quando(quandos, tarefas, analisador, modelo)
+
+    pontos.sort(key=lambda p: (p.custo.max_us is not None, -(p.custo.max_us or 0), p.linha))
+    rel.pontos = pontos[:MAX_PONTOS]
+    rel.avisos = list(dict.fromkeys(avisos))
+    return rel
+
+
+def _latencias_quando(quandos: List[tp.QuandoMudar], tarefas: List[tp.Enquanto], analisador,
+                      modelo: ModeloCusto) -> List[Latencia]:
+    """
+    Pior tempo entre a borda e o corpo do quando_mudar: os corpos rodam nos esperar() e a cada
+    volta de laço, então conta o laço sem as esperas (uma volta de cada tarefa) mais os corpos
+    de todos os quando_mudar (podem ter bordas pendentes na frente).
+    """
+    a = analisador()
+    corpos = Custo()
+    for q in quandos:
+        sub = tp.Subrotina(q.linha, f"quando_mudar({q.pino})", None, [], q.corpo, q.linha_fim)
+        tipos, a.tipos = a.tipos, tp._locais(sub, a.tipos)[0]
+        try:
+            corpos += a.bloco(q.corpo)
+        finally:
+            a.tipos = tipos
+    trecho = Custo()
+    for t in tarefas:
+        trecho += Custo(modelo.instrucao_us, modelo.instrucao_us) + analisador(com_esperas=False).bloco(t.corpo)
+    latencias = []
+    for q in quandos:
+        entrada = f"quando_mudar({q.pino}, {q.borda})"
+        if not tarefas:
+            latencias.append(Latencia(entrada, q.linha, None, "sem laço final: depois da inicialização o corpo não roda"))
+            continue
+        espera = trecho + corpos
+        maximo = None if espera.max_us is None else espera.max_us + modelo.latencia_entrada_us
+        if modelo.nome == "interpretador":
+            nota = "a borda chega por mensagem do Firmata"
+        else:
+            nota = "a interrupção conta a borda na hora; o corpo roda no próximo esperar() ou volta de laço"
+            if modelo.nome == "avr" and q.pino not in (2, 3):
+                nota += " (no Uno/Nano só os pinos 2 e 3 têm interrupção: nos outros a borda é vista por leitura)"
+        if maximo is None:
+            nota += "; o laço tem um trecho sem limite"
+        latencias.append(Latencia(entrada, q.linha, maximo, nota))
+    return latencias
+
+
+def estimar_alvos(code_ptn: str, fqbn: Optional[str] = None, baud: int = 9600,
+                  nao_bloqueante: bool = False) -> List[RelatorioTempo]:
+    """Relatórios da placa (sketch compilado) e do interpretador, para comparar."""
+    return [
+        estimar(code_ptn, alvo_para_fqbn(fqbn), baud, nao_bloqueante),
+        estimar(code_ptn, "interpretador", baud, nao_bloqueante),
+    ]
@@ -1,9 +1,18 @@
-import os, sys, json, shutil, platform, stat, tarfile, zipfile, tempfile
+import os, io, sys, json, shutil, platform, stat, tarfile, zipfile, hashlib, subprocess
 from pathlib import Path
+from typing import Callable, Dict, Optional
+from urllib.error import HTTPError
 from urllib.request import Request, urlopen
 
 APP_NAME = "PortuinoIDE"
-GITHUB_API_LATEST = "https://api.github.com/repos/arduino/arduino-cli/releases/latest"
+# PORTUINO_CLI_RELEASE_URL permite apontar para um espelho local (ou um servidor de teste)
+GITHUB_API_LATEST = os.environ.get(
+    "PORTUINO_CLI_RELEASE_URL", "https://api.github.com/repos/arduino/arduino-cli/releases/latest"
+)
+CHUNK = 64 * 1024
+
+# progress(baixados, total) — total é None quando o servidor não informa o tamanho
+Progress = Callable[[int, Optional[int]], None]
 
 def is_frozen() -> bool:
     return getattr(sys, "frozen", False)
@@ -27,49 +36,327 @@ def tools_dir() -> Path:
 def cli_filename() -> str:
     return "arduino-cli.exe" if os.name == "nt" else "arduino-cli"
 
+def manifest_path() -> Path:
+    return appdata_dir() / "arduino-cli.json"
+
+def _legacy_cache_dir() -> Path:
+    # Onde versões antigas do portuino_compiler extraíam o arduino-cli
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or str(Path.home() / "AppData" / "Local")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base) / "Portuino" / "tools" / "arduino-cli"
+
 def cli_path_candidates():
     exe = cli_filename()
-    # 1) PATH
+    # 1) embutido no bundle (PyInstaller onefile/onefolder) ou ao lado do executável/script
+    bases = [bundled_base_dir()]
+    exe_dir = Path(getattr(sys, "executable", "") or "").parent
+    if is_frozen() and exe_dir not in bases:
+        bases.append(exe_dir)
+    for b in bases:
+        yield b / "tools" / "arduino-cli" / exe
+        yield b / "tools" / exe
+        yield b / exe
+    # 2) PATH
     p = shutil.which(exe)
     if p:
         yield Path(p)
-    # 2) embutido (se existir)
-    yield bundled_base_dir() / "tools" / exe
-    # 3) instalado via bootstrap
+    # 3) instalado via bootstrap (atual e legado)
     yield tools_dir() / exe
+    yield _legacy_cache_dir() / exe
+
+def _make_executable(p: Path) -> None:
+    if os.name != "nt":
+        try:
+            p.chmod(p.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        except OSError:
+            pass
+
+def cli_version(p: Path) -> str:
+    try:
+        r = subprocess.run(
+            [str(p), "version", "--format", "json"], capture_output=True, text=True, timeout=15
+        )
+        return json.loads(r.stdout).get("VersionString", "")
+    except Exception:
+        return ""
+
+def _read_manifest() -> Optional[dict]:
+    try:
+        return json.loads(manifest_path().read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+def _write_manifest(p: Path) -> None:
+    st = p.stat()
+    doc = {
+        "path": str(p),
+        "version": cli_version(p),
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+    }
+    mp = manifest_path()
+    mp.parent.mkdir(parents=True, exist_ok=True)
+    tmp = mp.with_name(mp.name + ".tmp")
+    tmp.write_text(json.dumps(doc, indent=2), encoding="utf-8")
+    os.replace(tmp, mp)
+
+def _manifest_hit() -> Optional[Path]:
+    """Valida o binário registrado com um único stat (mesmo tamanho e mtime)."""
+    doc = _read_manifest()
+    if not doc or not doc.get("path"):
+        return None
+    try:
+        st = os.stat(doc["path"])
+    except OSError:
+        return None
+    if st.st_mtime_ns != doc.get("mtime_ns") or st.st_size != doc.get("size"):
+        return None
+    return Path(doc["path"])
 
-def ensure_cli(download_if_missing=True) -> Path:
-    for p in cli_path_candidates():
-        if p.exists():
-            return p
-    if not download_if_missing:
-        raise RuntimeError("arduino-cli não encontrado e download desabilitado.")
-    return download_and_install_latest_cli()
+def cli_info() -> Optional[dict]:
+    """Dados do manifesto (path/version/mtime_ns/size), se já houver resolução registrada."""
+    return _read_manifest()
+
+def ensure_cli(download_if_missing=True, progress: Optional[Progress] = None) -> Path:
+    """
+    Resolução única do arduino-cli.
+    Ordem: PORTUINO_ARDUINO_CLI > embutido > PATH > tools > download.
+    O resultado (caminho, versão, mtime) fica no manifesto: se o candidato escolhido é o mesmo
+    binário registrado (caminho, tamanho e mtime), não roda `version` nem acessa a rede. Um
+    instalador novo (embutido) ou outro arduino-cli no PATH muda o candidato e refaz o manifesto.
+    """
+    override = os.environ.get("PORTUINO_ARDUINO_CLI")
+    if override and os.path.exists(override):
+        p = Path(override)
+        _make_executable(p)
+        return p
+
+    found = next((p for p in cli_path_candidates() if p.is_file()), None)
+    hit = _manifest_hit()
+    if found and hit and os.path.abspath(hit) == os.path.abspath(found):
+        return hit
+    if not found:
+        if not download_if_missing:
+            raise RuntimeError("arduino-cli não encontrado e download desabilitado.")
+        found = download_and_install_latest_cli(progress)
+
+    _make_executable(found)
+    try:
+        _write_manifest(found)
+    except OSError:
+        pass  # sem permissão de escrita: funciona, só não memoriza
+    return found
+
+def data_dir() -> Path:
+    return appdata_dir() / "arduino-data"
+
+def build_cache_dir() -> Path:
+    """core.a compilado por placa; compartilhado por todos os sketches (e pelo aquecimento)."""
+    return appdata_dir() / "arduino-build-cache"
 
 def ensure_cli_config() -> Path:
     cfg = appdata_dir() / "arduino-cli.yaml"
     cfg.parent.mkdir(parents=True, exist_ok=True)
-    if not cfg.exists():
-        data_dir = appdata_dir() / "arduino-data"
-        dl_dir = appdata_dir() / "arduino-downloads"
-        user_dir = appdata_dir() / "arduino-user"
-        data_dir.mkdir(parents=True, exist_ok=True)
-        dl_dir.mkdir(parents=True, exist_ok=True)
-        user_dir.mkdir(parents=True, exist_ok=True)
-        cfg.write_text(
-            "directories:\n"
-            f"  data: {data_dir.as_posix()}\n"
-            f"  downloads: {dl_dir.as_posix()}\n"
-            f"  user: {user_dir.as_posix()}\n",
-            encoding="utf-8"
-        )
+    dl_dir = appdata_dir() / "arduino-downloads"
+    user_dir = appdata_dir() / "arduino-user"
+    conteudo = (
+        "directories:\n"
+        f"  data: {data_dir().as_posix()}\n"
+        f"  downloads: {dl_dir.as_posix()}\n"
+        f"  user: {user_dir.as_posix()}\n"
+        "build_cache:\n"
+        f"  path: {build_cache_dir().as_posix()}\n"
+    )
+    # Reescreve também configs antigas (sem build_cache)
+    if not cfg.exists() or cfg.read_text(encoding="utf-8") != conteudo:
+        for d in (data_dir(), dl_dir, user_dir, build_cache_dir()):
+            d.mkdir(parents=True, exist_ok=True)
+        cfg.write_text(conteudo, encoding="utf-8")
     return cfg
 
+# ------------------ Pacote offline (toolchain pré-instalada) ------------------
+# Um .tar.gz com a pasta de dados do arduino-cli (cores instalados + índices) e o próprio
+# arduino-cli. Um PC com internet exporta; os PCs do laboratório importam de um arquivo local.
+# (tar preserva permissões de execução do avr-gcc/avrdude; zip não.)
+
+BUNDLE_MANIFEST = "portuino-bundle.json"
+
+def export_toolchain_bundle(dest: Path, progress: Optional[Progress] = None) -> Path:
+    """Empacota data_dir() + arduino-cli em `dest` (.tar.gz). progress(arquivos, total)."""
+    ensure_cli_config()
+    src = data_dir()
+    if not (src / "packages").is_dir():
+        raise RuntimeError(
+            "Nenhum core instalado na pasta isolada da Portuino. "
+            "Compile uma vez (ou instale o core) antes de exportar."
+        )
+    cli = ensure_cli(download_if_missing=False)
+    files = [p for p in src.rglob("*") if p.is_file() or p.is_symlink()]
+    info = {"format": 1, "cli_version": cli_version(cli), "cli_name": cli_filename(), "system": platform.system()}
+
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".tmp")
+    with tarfile.open(tmp, "w:gz") as t:
+        data = json.dumps(info, indent=2).encode("utf-8")
+        ti = tarfile.TarInfo(BUNDLE_MANIFEST)
+        ti.size = len(data)
+        t.addfile(ti, io.BytesIO(data))
+        t.add(cli, arcname=f"tools/{cli_filename()}")
+        for n, p in enumerate(files, 1):
+            t.add(p, arcname="arduino-data/" + p.relative_to(src).as_posix(), recursive=False)
+            if progress:
+                progress(n, len(files))
+    os.replace(tmp, dest)
+    return dest
+
+def _safe_member(m: tarfile.TarInfo, root: Path) -> bool:
+    raiz = str(root.resolve())
+
+    def dentro(p: Path) -> bool:
+        return os.path.commonpath([raiz, str(p.resolve())]) == raiz
+
+    alvo = root / m.name
+    if os.path.isabs(m.name) or not dentro(alvo):
+        return False
+    if m.issym():
+        return dentro(alvo.parent / m.linkname)
+    if m.islnk():
+        return dentro(root / m.linkname)
+    return m.isfile() or m.isdir()
+
+def import_toolchain_bundle(archive: Path, progress: Optional[Progress] = None) -> dict:
+    """
+    Provisiona este PC a partir de um pacote exportado (sem internet).
+    Substitui a pasta de dados isolada de forma atômica e instala o arduino-cli do pacote
+    se ele for do mesmo sistema. Retorna o manifesto do pacote.
+    """
+    ensure_cli_config()
+    base = appdata_dir()
+    staging = base / ".import-tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    try:
+        with tarfile.open(archive, "r:gz") as t:
+            members = t.getmembers()
+            ruins = [m.name for m in members if not _safe_member(m, staging)]
+            if ruins:
+                raise RuntimeError(f"Pacote inválido (caminhos fora da pasta): {ruins[:3]}")
+            for n, m in enumerate(members, 1):
+                t.extract(m, staging)
+                if progress:
+                    progress(n, len(members))
+
+        mf = staging / BUNDLE_MANIFEST
+        if not mf.exists() or not (staging / "arduino-data").is_dir():
+            raise RuntimeError("Arquivo não é um pacote de toolchain da Portuino.")
+        info = json.loads(mf.read_text(encoding="utf-8"))
+
+        old = base / ".arduino-data-old"
+        shutil.rmtree(old, ignore_errors=True)
+        if data_dir().exists():
+            os.replace(data_dir(), old)
+        os.replace(staging / "arduino-data", data_dir())
+        shutil.rmtree(old, ignore_errors=True)
+
+        cli = staging / "tools" / cli_filename()
+        if cli.exists() and info.get("system") == platform.system():
+            with open(cli, "rb") as src:
+                _stream_to(src, tools_dir() / cli_filename())
+            manifest_path().unlink(missing_ok=True)  # força nova resolução (e novo manifesto)
+        return info
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
 def _http_json(url: str) -> dict:
     req = Request(url, headers={"User-Agent": f"{APP_NAME}/1.0"})
     with urlopen(req) as r:
         return json.loads(r.read().decode("utf-8"))
 
+def download_file(
+    url: str,
+    dest: Path,
+    progress: Optional[Progress] = None,
+    expected_sha256: Optional[str] = None,
+) -> Path:
+    """
+    Download em blocos (sem carregar o arquivo inteiro na memória).
+    - Retoma de onde parou (HTTP Range) usando `<dest>.part`
+    - Chama progress(baixados, total) a cada bloco
+    - Confere SHA-256 (se informado) antes de publicar `dest`
+    """
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    part = dest.with_name(dest.name + ".part")
+    inicio = part.stat().st_size if part.exists() else 0
+
+    headers = {"User-Agent": f"{APP_NAME}/1.0"}
+    if inicio:
+        headers["Range"] = f"bytes={inicio}-"
+
+    h = hashlib.sha256()
+    try:
+        r = urlopen(Request(url, headers=headers))
+    except HTTPError as e:
+        if e.code != 416 or not inicio:
+            raise
+        r = None  # 416: o .part já está completo
+
+    if r is None:
+        total = inicio
+        with open(part, "rb") as f:
+            for bloco in iter(lambda: f.read(CHUNK), b""):
+                h.update(bloco)
+    else:
+        with r:
+            retomando = inicio and r.status == 206
+            if not retomando:
+                inicio = 0  # servidor ignorou o Range: recomeça
+            tamanho = r.headers.get("Content-Length")
+            total = inicio + int(tamanho) if tamanho else None
+
+            if retomando:
+                with open(part, "rb") as f:
+                    for bloco in iter(lambda: f.read(CHUNK), b""):
+                        h.update(bloco)
+
+            baixados = inicio
+            with open(part, "ab" if retomando else "wb") as f:
+                for bloco in iter(lambda: r.read(CHUNK), b""):
+                    f.write(bloco)
+                    h.update(bloco)
+                    baixados += len(bloco)
+                    if progress:
+                        progress(baixados, total)
+            if total is not None and baixados < total:
+                # Conexão caiu: mantém o .part para retomar na próxima tentativa
+                raise RuntimeError(f"Download interrompido em {baixados}/{total} bytes: {url}")
+
+    if expected_sha256 and h.hexdigest().lower() != expected_sha256.lower():
+        part.unlink(missing_ok=True)
+        raise RuntimeError(
+            f"Checksum SHA-256 não confere para {dest.name} (arquivo corrompido ou adulterado)."
+        )
+    os.replace(part, dest)
+    return dest
+
+def fetch_release_checksums(release: dict) -> Dict[str, str]:
+    """{nome_do_asset: sha256} a partir do `*checksums.txt` publicado no release."""
+    for a in release.get("assets", []):
+        if a.get("name", "").lower().endswith("checksums.txt"):
+            req = Request(a["browser_download_url"], headers={"User-Agent": f"{APP_NAME}/1.0"})
+            with urlopen(req) as r:
+                texto = r.read().decode("utf-8", errors="replace")
+            sums = {}
+            for ln in texto.splitlines():
+                partes = ln.split()
+                if len(partes) == 2:
+                    sums[partes[1].lstrip("*")] = partes[0]
+            return sums
+    return {}
+
 def _select_asset(assets: list[dict]) -> dict:
     sysname = platform.system().lower()
     mach = platform.machine().lower()
@@ -101,47 +388,67 @@ def _select_asset(assets: list[dict]) -> dict:
         raise RuntimeError("Não consegui identificar o pacote correto do arduino-cli para este SO/CPU.")
     return best
 
-def download_and_install_latest_cli() -> Path:
+def _stream_to(src, dest: Path) -> None:
+    """Copia o stream para `dest` de forma atômica (arquivo temporário + os.replace)."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".{dest.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            shutil.copyfileobj(src, f, CHUNK)
+            f.flush()
+            os.fsync(f.fileno())
+        _make_executable(tmp)
+        os.replace(tmp, dest)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+def extract_cli_binary(archive: Path, dest: Path) -> Path:
+    """
+    Extrai SÓ o executável do arduino-cli (sem extractall nem varredura de pastas).
+    - .zip: localiza o membro pelo nome no índice (diretório central)
+    - .tar.gz: percorre os cabeçalhos e para no primeiro membro com o nome certo
+    Se o processo morrer no meio, sobra no máximo um .tmp: `dest` nunca fica pela metade.
+    """
+    names = {cli_filename(), "arduino-cli"}
+    lower = archive.name.lower()
+
+    if lower.endswith(".zip"):
+        with zipfile.ZipFile(archive, "r") as z:
+            member = next(
+                (i for i in z.infolist() if not i.is_dir() and i.filename.rsplit("/", 1)[-1] in names),
+                None,
+            )
+            if member:
+                with z.open(member) as src:
+                    _stream_to(src, dest)
+                return dest
+    elif lower.endswith(".tar.gz") or lower.endswith(".tgz"):
+        with tarfile.open(archive, "r:gz") as t:
+            for member in t:
+                if member.isfile() and member.name.rsplit("/", 1)[-1] in names:
+                    src = t.extractfile(member)
+                    with src:
+                        _stream_to(src, dest)
+                    return dest
+    else:
+        raise RuntimeError(f"Formato não suportado: {archive.name}")
+
+    raise RuntimeError("Baixei o pacote, mas não encontrei o binário arduino-cli dentro dele.")
+
+def download_and_install_latest_cli(progress: Optional[Progress] = None) -> Path:
     rel = _http_json(GITHUB_API_LATEST)
     asset = _select_asset(rel.get("assets", []))
     url = asset["browser_download_url"]
     name = asset["name"]
+    sums = fetch_release_checksums(rel)
+    if name not in sums:
+        raise RuntimeError(f"O release não publica checksum para {name}; download recusado.")
 
     dest = tools_dir() / cli_filename()
+    # Pacote fica em tools/downloads: se a conexão cair, a próxima tentativa retoma
+    archive = download_file(url, tools_dir() / "downloads" / name, progress, sums[name])
 
-    with tempfile.TemporaryDirectory() as td:
-        td = Path(td)
-        archive = td / name
-
-        req = Request(url, headers={"User-Agent": f"{APP_NAME}/1.0"})
-        with urlopen(req) as r, open(archive, "wb") as f:
-            f.write(r.read())
-
-        if name.lower().endswith(".zip"):
-            with zipfile.ZipFile(archive, "r") as z:
-                z.extractall(td)
-        elif name.lower().endswith(".tar.gz"):
-            with tarfile.open(archive, "r:gz") as t:
-                t.extractall(td)
-        else:
-            raise RuntimeError(f"Formato não suportado: {name}")
-
-        exe = cli_filename()
-        found = None
-        for p in td.rglob(exe):
-            found = p
-            break
-        if not found and os.name != "nt":
-            for p in td.rglob("arduino-cli"):
-                found = p
-                break
-        if not found:
-            raise RuntimeError("Baixei o pacote, mas não encontrei o binário arduino-cli dentro dele.")
-
-        dest.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(found, dest)
-
-    if os.name != "nt":
-        dest.chmod(dest.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
-
+    extract_cli_binary(archive, dest)
+    archive.unlink(missing_ok=True)
     return dest
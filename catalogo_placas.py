@@ -0,0 +1,149 @@
+# catalogo_placas.py
+# Catálogo de placas (FQBN) para a janela "Selecionar placa".
+#
+# - Persistido em disco, com chave = versões dos cores instalados
+#   (abre instantaneamente; só consulta `board listall` quando um core muda)
+# - Índice de tokens com busca por prefixo (bisect) e ranking aproximado (fuzzy)
+
+from __future__ import annotations
+
+import os
+import re
+import json
+import bisect
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import portuino_compiler as pc
+
+Placa = Tuple[str, str]  # (nome, fqbn)
+
+_ARQUIVO = "catalogo_placas.json"
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+# ------------------ Persistência ------------------
+
+def _caminho_cache() -> str:
+    return os.path.join(pc._cache_base(), _ARQUIVO)
+
+
+def chave_cores() -> str:
+    """Hash das versões dos cores instalados (`core list --format json`)."""
+    doc = pc._run_json(["core", "list"], pc.TTL_CATALOGO)
+    plataformas = doc.get("platforms", []) if isinstance(doc, dict) else (doc or [])
+    versoes = sorted(
+        f"{p.get('id', '')}@{p.get('installed_version') or p.get('installed') or ''}"
+        for p in plataformas
+    )
+    return hashlib.sha1("\n".join(versoes).encode("utf-8")).hexdigest()
+
+
+def catalogo_em_disco() -> Tuple[Optional[str], List[Placa]]:
+    """(chave, placas) salvos na última consulta; (None, []) se não houver. Não executa o arduino-cli."""
+    try:
+        with open(_caminho_cache(), "r", encoding="utf-8") as f:
+            doc = json.load(f)
+        return doc.get("chave"), [(n, f) for n, f in doc.get("placas", [])]
+    except Exception:
+        return None, []
+
+
+def _salvar(chave: str, placas: List[Placa]) -> None:
+    destino = _caminho_cache()
+    tmp = destino + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"chave": chave, "placas": placas}, f, ensure_ascii=False)
+    os.replace(tmp, destino)
+
+
+def atualizar_catalogo() -> Tuple[List[Placa], bool]:
+    """
+    Confere a chave dos cores; só roda `board listall` se ela mudou.
+    Retorna (placas, mudou).
+    """
+    chave_disco, placas_disco = catalogo_em_disco()
+    chave = chave_cores()
+    if chave == chave_disco and placas_disco:
+        return placas_disco, False
+
+    placas = [(b.name, b.fqbn) for b in pc.listar_todas_placas()]
+    _salvar(chave, placas)
+    return placas, placas != placas_disco
+
+
+# ------------------ Índice ------------------
+
+def _tokens(texto: str) -> List[str]:
+    return _TOKEN_RE.findall(texto.lower())
+
+
+def _pontuacao_fuzzy(consulta: str, alvo: str) -> int:
+    """Subsequência (ex.: 'ardmeg' ~ 'arduino mega'); 0 = não casa. Letras seguidas valem mais."""
+    pos = -1
+    pontos = 0
+    seguidas = 0
+    for ch in consulta:
+        nova = alvo.find(ch, pos + 1)
+        if nova < 0:
+            return 0
+        seguidas = seguidas + 1 if nova == pos + 1 else 0
+        pontos += 1 + seguidas
+        pos = nova
+    return pontos
+
+
+class IndiceCatalogo:
+    """Índice invertido token -> placas, com busca por prefixo e ranking."""
+
+    def __init__(self, placas: List[Placa]):
+        self.placas = sorted(placas, key=lambda p: (p[0].lower(), p[1]))
+        self._textos = [f"{n} {f}".lower() for n, f in self.placas]
+        self._postings: Dict[str, List[int]] = {}
+        for i, (nome, fqbn) in enumerate(self.placas):
+            for t in set(_tokens(nome) + _tokens(fqbn)):
+                self._postings.setdefault(t, []).append(i)
+        self._vocab = sorted(self._postings)
+
+    def __len__(self) -> int:
+        return len(self.placas)
+
+    def _com_prefixo(self, prefixo: str) -> Dict[int, int]:
+        """{placa: pontos} para tokens que começam com o prefixo (exato vale mais)."""
+        achados: Dict[int, int] = {}
+        i = bisect.bisect_left(self._vocab, prefixo)
+        while i < len(self._vocab) and self._vocab[i].startswith(prefixo):
+            token = self._vocab[i]
+            pontos = 30 if token == prefixo else 20 - min(10, len(token) - len(prefixo))
+            for idx in self._postings[token]:
+                if pontos > achados.get(idx, 0):
+                    achados[idx] = pontos
+            i += 1
+        return achados
+
+    def buscar(self, consulta: str) -> List[int]:
+        """Índices de self.placas ordenados por relevância."""
+        termos = _tokens(consulta)
+        if not termos:
+            return list(range(len(self.placas)))
+
+        total: Optional[Dict[int, int]] = None
+        for termo in termos:
+            achados = self._com_prefixo(termo)
+            if total is None:
+                total = achados
+            else:
+                total = {i: total[i] + p for i, p in achados.items() if i in total}
+            if not total:
+                break
+
+        if not total:
+            # Nada por prefixo: aproximação por subsequência (erros de digitação/abreviações)
+            alvo = "".join(termos)
+            total = {}
+            for i, texto in enumerate(self._textos):
+                p = _pontuacao_fuzzy(alvo, texto)
+                if p:
+                    total[i] = p
+
+        return sorted(total, key=lambda i: (-total[i], i))
@@ -0,0 +1,104 @@
+# historico_tamanho.py
+# Histórico de uso de flash/RAM por sketch + FQBN (+ perfil), com orçamento e alerta de regressão.
+#
+# - Um registro por compilação bem-sucedida (últimos HISTORICO_MAX por sketch/placa)
+# - Avisos quando o uso passa do orçamento (% da flash/RAM da placa)
+#   ou cresce mais que um delta desde a compilação anterior
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+import portuino_compiler as pc
+
+_ARQUIVO = "historico_tamanho.json"
+HISTORICO_MAX = 50
+_LOCK = threading.Lock()  # CLI compila em paralelo
+
+
+@dataclass
+class Orcamento:
+    flash_pct: float = 90.0     # aviso acima de X% da flash
+    ram_pct: float = 75.0       # RAM precisa de folga para a pilha (variáveis locais)
+    delta_flash: int = 1024     # aviso se crescer mais que N bytes desde a última compilação
+    delta_ram: int = 128
+
+
+@dataclass
+class Registro:
+    quando: float
+    flash: int
+    ram: Optional[int] = None
+
+
+def _caminho() -> str:
+    return os.path.join(pc._cache_base(), _ARQUIVO)
+
+
+def _chave(sketch: str, fqbn: str, perfil: str = "padrao") -> str:
+    chave = f"{os.path.abspath(sketch) if os.path.exists(sketch) else sketch}|{fqbn}"
+    # perfis têm históricos separados: trocar de perfil não conta como regressão
+    return chave if perfil == "padrao" else f"{chave}|{perfil}"
+
+
+def _ler() -> Dict[str, List[dict]]:
+    try:
+        with open(_caminho(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _salvar(doc: Dict[str, List[dict]]) -> None:
+    destino = _caminho()
+    tmp = destino + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False)
+    os.replace(tmp, destino)
+
+
+def historico(sketch: str, fqbn: str, perfil: str = "padrao") -> List[Registro]:
+    """Registros do mais antigo para o mais recente."""
+    return [Registro(**r) for r in _ler().get(_chave(sketch, fqbn, perfil), [])]
+
+
+def avaliar(
+    tamanho: pc.Tamanho, anterior: Optional[Registro], orcamento: Optional[Orcamento] = None
+) -> List[str]:
+    """Avisos de orçamento e de crescimento em relação à compilação anterior."""
+    orc = orcamento or Orcamento()
+    avisos = []
+    if tamanho.flash_pct is not None and tamanho.flash_pct > orc.flash_pct:
+        avisos.append(f"Flash em {tamanho.flash_pct:.0f}% (orçamento: {orc.flash_pct:.0f}%).")
+    if tamanho.ram_pct is not None and tamanho.ram_pct > orc.ram_pct:
+        avisos.append(f"RAM em {tamanho.ram_pct:.0f}% (orçamento: {orc.ram_pct:.0f}%); pouca folga para a pilha.")
+    if anterior:
+        delta = tamanho.flash - anterior.flash
+        if delta > orc.delta_flash:
+            avisos.append(f"Flash cresceu {delta} B desde a última compilação ({anterior.flash} -> {tamanho.flash}).")
+        if tamanho.ram is not None and anterior.ram is not None:
+            delta = tamanho.ram - anterior.ram
+            if delta > orc.delta_ram:
+                avisos.append(f"RAM cresceu {delta} B desde a última compilação ({anterior.ram} -> {tamanho.ram}).")
+    return avisos
+
+
+def registrar(
+    sketch: str, fqbn: str, tamanho: pc.Tamanho, orcamento: Optional[Orcamento] = None,
+    perfil: str = "padrao",
+) -> List[str]:
+    """Guarda o tamanho no histórico e retorna os avisos (veja avaliar)."""
+    chave = _chave(sketch, fqbn, perfil)
+    with _LOCK:
+        doc = _ler()
+        registros = doc.get(chave, [])
+        anterior = Registro(**registros[-1]) if registros else None
+        registros.append(asdict(Registro(quando=time.time(), flash=tamanho.flash, ram=tamanho.ram)))
+        doc[chave] = registros[-HISTORICO_MAX:]
+        _salvar(doc)
+    return avaliar(tamanho, anterior, orcamento)
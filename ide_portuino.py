@@ -1,8 +1,11 @@
 import os
 import json
 import threading
+import queue
+import tempfile
 import textwrap
 import sys
+from dataclasses import asdict
 from pathlib import Path
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -15,17 +18,35 @@ from PIL import Image, ImageTk
 
 from portuino_compiler import (
     ensure_arduino_cli,
+    aquecer_toolchain,
     auto_detect_port_and_fqbn,
     compile_sketch,
     upload_sketch,
     list_ports_cli,
+    exportar_toolchain,
+    importar_toolchain,
     BuildConfig,
+    Cancelamento,
+    OperacaoCancelada,
+    ErroArduinoCli,
+    ErroCompilacao,
+    tamanho_do_log,
+    traduzir,
+    ErroTraducao,
+    PERFIS,
 )
+from servidor_compilacao import compilar_remoto, upload_remoto
+from catalogo_placas import IndiceCatalogo, catalogo_em_disco, atualizar_catalogo
+from historico_tamanho import Orcamento, avaliar as avaliar_tamanho, registrar as registrar_tamanho
+from analise_tempo import estimar_alvos
 
 APP_TITLE = "Portuino IDE"
 DEFAULT_FQBN = "arduino:avr:uno"
 DEFAULT_BAUD = 9600
 CONFIG_FILE = "config_portuino.json"
+BUSCA_ATRASO_MS = 120   # debounce da busca de placas
+BUSCA_PAGINA = 200      # itens inseridos por vez na lista de placas
+PREVIA_ATRASO_MS = 80   # debounce da prévia do C++ gerado (tradução incremental, por bloco)
 
 def resource_path(*parts):
     base = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
@@ -71,6 +92,7 @@ def manual_portuino_md() -> str:
     - 11. Exemplos oficiais
     - 12. Erros comuns
     - 13. Gramática (EBNF simplificada)
+    - 14. Notas de migração (modo interpretado)
 
     ---
     ## 1) Visão geral
@@ -113,6 +135,11 @@ def manual_portuino_md() -> str:
     5. **Sketch > Enviar (Upload)**  
     6. **Ferramentas > Monitor Serial** para ver mensagens
 
+Dica: **Sketch > Mostrar C++ gerado** (`Ctrl+G`) abre, ao lado do editor, o código Arduino gerado,
+atualizado enquanto você digita; as linhas geradas pela instrução sob o cursor ficam destacadas.
+**Sketch > Estimar tempo** (`Ctrl+E`) mostra, sem rodar o programa, quanto dura cada volta do laço,
+quanto tempo a placa pode demorar para perceber um botão e quais linhas travam o programa.
+
     ---
     ## 4) Estrutura do programa
 
@@ -122,6 +149,8 @@ def manual_portuino_md() -> str:
     fim
     ```
 
+    Procedimentos, funções e `quando_mudar` (seção 8) ficam antes de `inicio`.
+
     ---
     ## 5) Léxico e comentários
 
@@ -154,13 +183,36 @@ def manual_portuino_md() -> str:
     fim
     ```
 
+    Vetor (tamanho fixo, começa zerado; itens de `0` a `tamanho - 1`):
+    - vetor inteiro, vetor real, vetor logico (não há vetor de texto)
+
+    ```portuino
+    inicio
+        vetor inteiro notas[5]
+        para i de 0 ate tamanho(notas) - 1 passo 1
+            notas[i] <- i * 10
+        fim_para
+        escrever("terceira: " + notas[2])
+    fim
+    ```
+
+    - o tamanho é um número escrito no programa (de 1 a 32767)
+    - índice fora do vetor: com número fixo (`notas[5]`) é erro na tradução;
+      calculado, o interpretador para com erro (no Arduino estragaria a memória sem aviso)
+    - declarar o vetor de novo (ex.: dentro de um laço) zera todos os itens
+
     ---
     ## 7) Expressões e operadores
 
-    Aritméticos: + - * /  
-    Comparação: == != > < >= <=
+    Aritméticos: + - * / %  
+    Comparação: == != > < >= <=  
+    Lógicos: and or not (ou && || !)
 
-    Concatenação:
+    - inteiro / inteiro dá inteiro: `7 / 2` é 3 (use `7.0 / 2` para 3.5)
+    - real é escrito com 2 casas (`2.50`) e lógico como `verdadeiro`/`falso`
+    - o modo interpretado segue estas regras desde o teste diferencial; antes fazia diferente (veja a seção 14)
+
+    Concatenação (da esquerda para a direita: `1 + 2 + "a"` dá `3a`):
     ```portuino
     inteiro x <- 7
     escrever("Valor: " + x)
@@ -193,6 +245,63 @@ def manual_portuino_md() -> str:
     fim_para
     ```
 
+    **PROCEDIMENTO / FUNCAO** (antes de `inicio`)
+    ```portuino
+    procedimento piscar(inteiro pino, inteiro ms)
+        ligar(pino)
+        esperar(ms)
+        desligar(pino)
+        esperar(ms)
+    fim_procedimento
+
+    funcao inteiro dobro(inteiro x)
+        retornar x * 2
+    fim_funcao
+
+    inicio
+        configurar_saida(13)
+        piscar(13, 200)
+        escrever(dobro(21))
+    fim
+    ```
+
+    - parâmetros são cópias: mudar `pino` dentro do procedimento não muda quem chamou
+    - variáveis declaradas dentro (e os parâmetros) são locais; as do programa são globais
+    - `retornar` sai na hora; a funcao que chega ao fim sem `retornar` devolve 0 (ou `""`)
+    - evite, numa mesma expressão, chamar funções que escrevem ou mudam variáveis:
+      no Arduino a ordem em que os operandos são calculados não é garantida
+    - modo não bloqueante: uma tarefa não pode chamar procedimento que usa `esperar`
+
+    **QUANDO_MUDAR** (antes de `inicio`): reage a um pino sem perder aperto curto
+    ```portuino
+    quando_mudar(2, subida)
+        apertos <- apertos + 1
+        escrever("Apertos: " + apertos)
+    fim_quando_mudar
+
+    inicio
+        inteiro apertos <- 0
+        configurar_entrada(2)
+        configurar_saida(13)
+        enquanto (verdadeiro) faca
+            ligar(13)
+            esperar(1000)
+            desligar(13)
+            esperar(1000)
+        fim_enquanto
+    fim
+    ```
+
+    - borda: `subida` (0 → 1), `descida` (1 → 0) ou `mudanca` (as duas); o pino é um número
+    - a placa percebe a borda na hora (interrupção) e guarda; o corpo roda no próximo `esperar`
+      ou na próxima volta de `enquanto`, uma vez por borda (até 255 guardadas)
+    - o corpo é como um procedimento sem parâmetros (variáveis declaradas nele são locais)
+    - sem `enquanto (verdadeiro)` no final, os `quando_mudar` param junto com o programa
+    - no Uno/Nano só os pinos 2 e 3 têm interrupção; nos outros a borda é vista comparando
+      leituras (um aperto mais curto que o trecho entre dois `esperar` pode se perder)
+    - no interpretador a borda vem do Firmata (a placa avisa quando o pino muda)
+    - modo não bloqueante: o corpo não pode usar `esperar` (travaria as tarefas)
+
     ---
     ## 9) Biblioteca padrão (Arduino)
 
@@ -213,6 +322,21 @@ def manual_portuino_md() -> str:
     - desligar(p) → digitalWrite(p, LOW);
     - esperar(ms) → delay(ms);
     - escrever(x) → Serial.println(x);
+    - escrever("a=" + x) → Serial.print("a="); Serial.println(x); (sem String na memória)
+    - variáveis → globais, declaradas uma vez
+    - vetor inteiro v[5] → int v[5]; (global, zerado); declarado de novo → memset(v, 0, sizeof(v));
+    - tamanho(v) → o número do tamanho (5), calculado na tradução
+    - procedimento p(inteiro a) → void p(int a) { ... }; funcao real f(...) → float f(...) { ... }
+      (as pequenas, sem laço nem recursão, saem como `inline`: sem custo de chamada)
+    - comandos antes do `enquanto (verdadeiro)` final → setup(); o corpo dele → loop()
+    - sem esse laço final, o programa roda uma vez (como no interpretador)
+    - modo não bloqueante (Preferências > Tarefas): cada `enquanto (verdadeiro)` vira uma tarefa,
+      `esperar(ms)` usa millis() sem travar a placa e as tarefas rodam juntas
+      (ex.: piscar um LED enquanto lê um botão)
+    - quando_mudar(2, subida) → attachInterrupt(digitalPinToInterrupt(2), isr, RISING) em setup(),
+      logo depois das declarações e `configurar_*` do começo (o pino já está configurado);
+      a ISR só incrementa um contador `volatile` e o corpo (função comum) roda em `_eventos()`,
+      chamada nos `esperar` (que viram `_esperar(ms)`), no começo de cada volta de laço e de loop()
 
     ---
     ## 11) Exemplos oficiais
@@ -262,13 +386,23 @@ def manual_portuino_md() -> str:
     ## 13) Gramática (EBNF simplificada)
 
     ```ebnf
-    programa     = "inicio", { comando }, "fim" ;
+    programa     = { subrotina | quando }, "inicio", { comando }, "fim" ;
+
+    subrotina    = "procedimento", id, "(", [ parametros ], ")", { comando }, "fim_procedimento"
+                | "funcao", tipo, id, "(", [ parametros ], ")", { comando }, "fim_funcao" ;
+    parametros   = tipo, id, { ",", tipo, id } ;
+    quando       = "quando_mudar", "(", numero, ",", ( "subida" | "descida" | "mudanca" ), ")",
+                   { comando }, "fim_quando_mudar" ;
+
+    comando      = declaracao | vetor | atribuicao | escrever | esperar | gpio
+                | se | enquanto | para | chamada | retornar ;
 
-    comando      = declaracao | atribuicao | escrever | esperar | gpio
-                | se | enquanto | para ;
+    chamada      = id, "(", [ expr, { ",", expr } ], ")" ;
+    retornar     = "retornar", [ expr ] ;
 
     declaracao   = tipo, id, "<-", expr ;
-    atribuicao   = id, "<-", expr ;
+    vetor        = "vetor", ( "inteiro" | "real" | "logico" ), id, "[", numero, "]" ;
+    atribuicao   = id, [ "[", expr, "]" ], "<-", expr ;
 
     tipo         = "inteiro" | "real" | "logico" | "texto" ;
 
@@ -286,6 +420,27 @@ def manual_portuino_md() -> str:
                    { comando },
                    "fim_para" ;
     ```
+
+    ---
+    ## 14) Notas de migração (modo interpretado)
+
+    O modo interpretado (B) passou a fazer as contas **como a placa**, para que o mesmo programa dê o
+    mesmo resultado nos dois caminhos (o teste diferencial compara os dois). O caminho (A) —
+    Verificar/Enviar — não mudou. Programas testados só no interpretador podem escrever valores
+    diferentes de antes:
+
+    | Situação | Antes (interpretador) | Agora (interpretador e placa) | Para ter o resultado antigo |
+    |---|---|---|---|
+    | `7 / 2` | `3.5` | `3` (divisão inteira) | `7.0 / 2` |
+    | `-7 % 3` | `2` | `-1` (resto como em C) | — |
+    | `1 + 2 + "a"` | `12a` | `3a` (da esquerda para a direita) | `"" + 1 + 2 + "a"` |
+    | `real r <- 0.1 + 0.2` e `escrever(r)` | `0.30000000000000004` | `0.30` (real de 32 bits, 2 casas) | — |
+    | `inteiro x <- 7` e depois `x <- 2.7` | `x` vale `2.7` | `x` vale `2` (a variável guarda o tipo declarado) | declare `real x` |
+    | `escrever(verdadeiro)` | `True` | `verdadeiro` | — |
+    | `str(verdadeiro)` | `True` | `1` (como `String()` do Arduino) | — |
+    | `para` com o limite mudado dentro do laço | limite calculado uma vez | limite conferido a cada volta | guarde o limite numa variável antes |
+
+    Novidades que não quebram programas antigos: `%`, `&&`, `||`, `!` e blocos aninhados no interpretador.
     """
     ).strip()
 
@@ -300,6 +455,11 @@ class PortuinoIDE:
 
         self.current_file = None
         self.cfg = None  # BuildConfig
+        self.cancelamento = None  # Cancelamento da compilação/upload em andamento
+        self.aquecimento = None  # Cancelamento do pré-aquecimento da toolchain
+        self.previa_agendada = None  # after() pendente da prévia do C++
+        self.previa_ino = None  # último .ino mostrado na prévia
+        self.previa_linhas = {}  # linha do .ptn -> linhas do .ino (para destacar o trecho atual)
 
         self.config = self._carregar_config()
 
@@ -308,7 +468,8 @@ class PortuinoIDE:
         self._bind_shortcuts()
 
         self._load_default_template()
-        self._auto_detect_board_port()
+        # Depois que a janela aparece: arduino-cli, core da placa e core.a em segundo plano
+        self.root.after(200, self._aquecer_toolchain)
 
     def _regerar_manual(self, widget_text):
         try:
@@ -386,6 +547,16 @@ class PortuinoIDE:
             "icon_size": 24,
             "editor_font_family": "Consolas",
             "editor_font_size": 12,
+            # URL do servidor de compilação da sala (vazio = compila neste PC)
+            "servidor_compilacao": "",
+            # esperar() sem travar a placa: cada "enquanto (verdadeiro)" vira uma tarefa
+            "nao_bloqueante": False,
+            # flags do compilador: padrao | tamanho | velocidade | depuracao
+            "perfil": "padrao",
+            # painel com o C++ gerado ao lado do editor (atualiza enquanto digita)
+            "mostrar_cpp": False,
+            # avisos de tamanho (% da flash/RAM e crescimento em bytes entre compilações)
+            "orcamento": asdict(Orcamento()),
         }
         if os.path.exists(CONFIG_FILE):
             try:
@@ -456,6 +627,17 @@ class PortuinoIDE:
         self._btn(self.ico_upload, self.upload, "Enviar (Upload)").pack(
             side=tk.LEFT, padx=2, pady=2
         )
+        self.btn_cancelar = tk.Button(
+            self.toolbar,
+            text="Cancelar",
+            command=self.cancelar,
+            bg="#0B6E75",
+            fg="white",
+            activebackground="#0B6E75",
+            bd=0,
+            state="disabled",
+        )
+        self.btn_cancelar.pack(side=tk.LEFT, padx=6, pady=2)
 
         # Info placa/porta
         self.info = tk.Label(
@@ -463,18 +645,34 @@ class PortuinoIDE:
         )
         self.info.pack(side=tk.RIGHT, padx=10)
 
-        # Editor + Console (split)
+        # Editor (+ C++ gerado) + Console (split)
         self.paned = ttk.Panedwindow(self.root, orient=tk.VERTICAL)
         self.paned.pack(fill="both", expand=True, padx=8, pady=6)
 
-        self.editor_frame = ttk.LabelFrame(self.paned, text="Editor Portuino")
+        self.paned_codigo = ttk.Panedwindow(self.paned, orient=tk.HORIZONTAL)
+        self.editor_frame = ttk.LabelFrame(self.paned_codigo, text="Editor Portuino")
         font_family = self.config.get("editor_font_family", "Consolas")
         font_size = int(self.config.get("editor_font_size", 12))
         self.editor = scrolledtext.ScrolledText(
             self.editor_frame, font=(font_family, font_size), wrap=tk.WORD, undo=True
         )
         self.editor.pack(fill="both", expand=True)
-        self.paned.add(self.editor_frame, weight=4)
+        self.editor.tag_config("erro", background="#FFCDD2")  # vermelho claro
+        self.editor.tag_config("aviso", background="#FFF3C4")  # amarelo claro
+        self.editor.bind("<<Modified>>", self._editor_modificado)
+        self.editor.bind("<KeyRelease>", self._sincronizar_previa, add="+")
+        self.editor.bind("<ButtonRelease-1>", self._sincronizar_previa, add="+")
+        self.paned_codigo.add(self.editor_frame, weight=3)
+
+        self.cpp_frame = ttk.LabelFrame(self.paned_codigo, text="C++ gerado")
+        self.cpp = scrolledtext.ScrolledText(
+            self.cpp_frame, font=("Consolas", 10), wrap=tk.NONE, state="disabled"
+        )
+        self.cpp.pack(fill="both", expand=True)
+        self.cpp.tag_config("atual", background="#E0F2F1")  # linhas da instrução sob o cursor
+        if self.config.get("mostrar_cpp"):
+            self.paned_codigo.add(self.cpp_frame, weight=2)
+        self.paned.add(self.paned_codigo, weight=4)
 
         self.console_frame = ttk.LabelFrame(self.paned, text="Saída / Console")
         self.console = scrolledtext.ScrolledText(
@@ -572,6 +770,17 @@ class PortuinoIDE:
         m.add_command(
             label="Enviar (Upload)", accelerator="Ctrl+U", command=self.upload
         )
+        m.add_separator()
+        self.mostrar_cpp_var = tk.BooleanVar(value=bool(self.config.get("mostrar_cpp", False)))
+        m.add_checkbutton(
+            label="Mostrar C++ gerado",
+            accelerator="Ctrl+G",
+            variable=self.mostrar_cpp_var,
+            command=self.alternar_previa,
+        )
+        m.add_command(label="Estimar tempo...", accelerator="Ctrl+E", command=self.estimar_tempo)
+        m.add_separator()
+        m.add_command(label="Cancelar", accelerator="Esc", command=self.cancelar)
         self.menu.add_cascade(label="Sketch", menu=m)
 
     def _menu_ferramentas(self):
@@ -606,6 +815,13 @@ class PortuinoIDE:
         m.add_command(
             label="Listar placas/portas (arduino-cli)", command=self.show_board_list
         )
+        m.add_separator()
+        m.add_command(
+            label="Exportar toolchain (offline)...", command=self.exportar_toolchain
+        )
+        m.add_command(
+            label="Importar toolchain (offline)...", command=self.importar_toolchain
+        )
 
         self.menu.add_cascade(label="Ferramentas", menu=m)
 
@@ -635,10 +851,217 @@ class PortuinoIDE:
     def set_status(self, txt: str):
         self.status.config(text=txt)
 
+    def _inicio_operacao(self):
+        """
+        Cancelamento da nova compilação/upload; None se já há uma em andamento (uma de cada
+        vez: o botão Cancelar sempre para a operação que está rodando).
+        """
+        if self.cancelamento is not None:
+            self.set_status("Aguarde: já há uma compilação/upload em andamento (ou clique em Cancelar).")
+            return None
+        if self.aquecimento:
+            # A compilação do aluno tem prioridade; ela mesma gera o core.a se faltar.
+            self.aquecimento.cancelar()
+        self._marcar_diagnosticos([])
+        self.cancelamento = Cancelamento()
+        self.btn_cancelar.config(state="normal")
+        return self.cancelamento
+
+    def _fim_operacao(self, cancel):
+        if self.cancelamento is cancel:
+            self.cancelamento = None
+            self.btn_cancelar.config(state="disabled")
+
+    def cancelar(self):
+        if self.cancelamento:
+            self.cancelamento.cancelar()
+            self.set_status("Cancelando...")
+
+    def _log_erro(self, e: Exception):
+        # A saída do arduino-cli já apareceu linha a linha; aqui só o título do erro.
+        if isinstance(e, ErroArduinoCli):
+            self.log(e.titulo)
+        else:
+            self.log(str(e))
+        if isinstance(e, ErroCompilacao):
+            self._marcar_diagnosticos(e.diagnosticos)
+
+    def _status_tamanho(self, prefixo, tamanho):
+        """Flash/RAM na barra de status + avisos de orçamento/crescimento no console."""
+        if not tamanho:
+            self.set_status(prefixo)
+            return
+        avisos = []
+        try:
+            orcamento = Orcamento(**self.config.get("orcamento", {}))
+            if self.current_file:
+                avisos = registrar_tamanho(
+                    self.current_file, self.cfg.fqbn, tamanho, orcamento, self.cfg.perfil
+                )
+            else:
+                # Sem nome não há histórico (misturaria todos os esboços não salvos): só o orçamento.
+                avisos = avaliar_tamanho(tamanho, None, orcamento)
+        except Exception as e:
+            self.log(f"(histórico de tamanho indisponível: {e})")
+        for a in avisos:
+            self.log(f"AVISO: {a}")
+        self.set_status(f"{prefixo} {tamanho.resumo()}" + (f" — {avisos[0]}" if avisos else ""))
+
+    # ---------------- Prévia do C++ ----------------
+    def _editor_modificado(self, event=None):
+        # <<Modified>> só dispara de novo depois que a flag é zerada
+        self.editor.edit_modified(False)
+        self._agendar_previa()
+
+    def _agendar_previa(self):
+        if self.previa_agendada:
+            self.root.after_cancel(self.previa_agendada)
+        self.previa_agendada = self.root.after(PREVIA_ATRASO_MS, self._atualizar_previa)
+
+    def _atualizar_previa(self):
+        self.previa_agendada = None
+        if not self.mostrar_cpp_var.get():
+            return
+        # mesmo texto e opções do verificar/enviar: a tradução sai do cache do tradutor
+        try:
+            sketch = traduzir(
+                self.editor.get("1.0", tk.END),
+                baud=int(self.config.get("default_baud", DEFAULT_BAUD)),
+                nao_bloqueante=bool(self.config.get("nao_bloqueante", False)),
+            )
+        except ErroTraducao as e:
+            # mantém o último C++ válido na tela
+            self.cpp_frame.config(text=f"C++ gerado (desatualizado: linha {e.linha}: {e.mensagem})")
+            return
+        self.cpp_frame.config(text="C++ gerado")
+        if sketch.ino == self.previa_ino:
+            return
+        # Só troca o trecho que mudou: a tradução refaz poucos blocos por edição
+        novas = sketch.ino.splitlines()
+        antigas = self.previa_ino.splitlines() if self.previa_ino else []
+        comum = min(len(novas), len(antigas))
+        ini = 0
+        while ini < comum and novas[ini] == antigas[ini]:
+            ini += 1
+        fim = 0
+        while fim < comum - ini and novas[-1 - fim] == antigas[-1 - fim]:
+            fim += 1
+        self.cpp.config(state="normal")
+        self.cpp.delete(f"{ini + 1}.0", f"{len(antigas) - fim + 1}.0")
+        self.cpp.insert(f"{ini + 1}.0", "".join(ln + "\n" for ln in novas[ini:len(novas) - fim]))
+        self.cpp.config(state="disabled")
+
+        self.previa_ino = sketch.ino
+        self.previa_linhas = {}
+        for linha_ino, linha_ptn in sketch.mapa.items():
+            self.previa_linhas.setdefault(linha_ptn, []).append(linha_ino)
+        self._sincronizar_previa()
+
+    def _sincronizar_previa(self, event=None):
+        """Destaca (e mostra) o C++ gerado pela linha do cursor no editor."""
+        if not self.mostrar_cpp_var.get():
+            return
+        linha = int(self.editor.index(tk.INSERT).split(".")[0])
+        linhas_ino = self.previa_linhas.get(linha, [])
+        self.cpp.tag_remove("atual", "1.0", tk.END)
+        for n in linhas_ino:
+            self.cpp.tag_add("atual", f"{n}.0", f"{n}.0 lineend")
+        if linhas_ino:
+            self.cpp.see(f"{linhas_ino[0]}.0")
+
+    def alternar_previa(self):
+        mostrar = bool(self.mostrar_cpp_var.get())
+        if mostrar and str(self.cpp_frame) not in map(str, self.paned_codigo.panes()):
+            self.paned_codigo.add(self.cpp_frame, weight=2)
+            self._atualizar_previa()
+        elif not mostrar and str(self.cpp_frame) in map(str, self.paned_codigo.panes()):
+            self.paned_codigo.forget(self.cpp_frame)
+        self.config["mostrar_cpp"] = mostrar
+        self._salvar_config()
+
+    def _marcar_diagnosticos(self, diagnosticos):
+        """Destaca no editor as linhas Portuino com erro/aviso do compilador."""
+        self.editor.tag_remove("erro", "1.0", tk.END)
+        self.editor.tag_remove("aviso", "1.0", tk.END)
+        for d in diagnosticos:
+            if d.tipo in ("erro", "aviso"):
+                self.editor.tag_add(d.tipo, f"{d.linha}.0", f"{d.linha}.end+1c")
+        erros = [d for d in diagnosticos if d.tipo == "erro"]
+        if erros:
+            self.editor.see(f"{erros[0].linha}.0")
+            self.editor.mark_set(tk.INSERT, f"{erros[0].linha}.0")
+
     # ---------------- Placa / Porta ----------------
+    def _progresso_download(self, baixados, total, redesenhar=True):
+        mb = baixados / 1e6
+        if total:
+            self.set_status(
+                f"Baixando arduino-cli: {100 * baixados // total}% ({mb:.1f}/{total / 1e6:.1f} MB)"
+            )
+        else:
+            self.set_status(f"Baixando arduino-cli: {mb:.1f} MB")
+        if redesenhar:
+            # Só na thread principal (download síncrono): o loop de eventos está parado.
+            self.root.update_idletasks()
+
+    def _aquecer_toolchain(self):
+        fqbn = self.config.get("default_fqbn", DEFAULT_FQBN)
+        perfil = self.config.get("perfil", "padrao")
+        self.aquecimento = cancel = Cancelamento()
+
+        def trabalho(postar):
+            try:
+                ensure_arduino_cli(progress=lambda b, t: postar(self._progresso_download, b, t, False))
+                postar(self._auto_detect_board_port)
+                aquecer_toolchain(
+                    fqbn, etapa=lambda txt: postar(self.set_status, txt), cancel=cancel, perfil=perfil
+                )
+                postar(self.set_status, "Pronto.")
+            except OperacaoCancelada:
+                pass
+            except Exception as e:
+                postar(self.set_status, "Pré-aquecimento falhou (a compilação tentará de novo).")
+                postar(self._log_erro, e)
+
+        def terminar():
+            if self.aquecimento is cancel:
+                self.aquecimento = None
+
+        self._em_segundo_plano(trabalho, terminar)
+
+    def _em_segundo_plano(self, trabalho, ao_terminar=None):
+        """
+        Roda trabalho(postar) numa thread que não toca em widgets: postar(funcao, *args) enfileira
+        a chamada e a thread principal drena a fila a cada 100 ms (root.after).
+        ao_terminar roda na thread principal depois da última chamada postada.
+        """
+        fila = queue.Queue()
+
+        def rodar():
+            try:
+                trabalho(lambda funcao, *args: fila.put((funcao, args)))
+            finally:
+                fila.put((None, ()))
+
+        def drenar():
+            while True:
+                try:
+                    funcao, args = fila.get_nowait()
+                except queue.Empty:
+                    break
+                if funcao is None:
+                    if ao_terminar:
+                        ao_terminar()
+                    return
+                funcao(*args)
+            self.root.after(100, drenar)
+
+        threading.Thread(target=rodar, daemon=True).start()
+        self.root.after(100, drenar)
+
     def _auto_detect_board_port(self):
         try:
-            ensure_arduino_cli()
+            ensure_arduino_cli(progress=self._progresso_download)
             prefer = self.config.get("default_fqbn", DEFAULT_FQBN)
             cfg = auto_detect_port_and_fqbn(prefer_fqbn=prefer)
             cfg.baud = int(self.config.get("default_baud", DEFAULT_BAUD))
@@ -649,6 +1072,59 @@ class PortuinoIDE:
             self.set_status("Falha ao detectar placa/porta.")
             messagebox.showerror("Detecção", str(e))
 
+    # ---------------- Toolchain offline ----------------
+    def _progresso_pacote(self, acao, postar):
+        def progresso(feitos, total):
+            if total:
+                postar(
+                    self.set_status, f"{acao} toolchain: {100 * feitos // total}% ({feitos}/{total} arquivos)"
+                )
+        return progresso
+
+    def exportar_toolchain(self):
+        destino = filedialog.asksaveasfilename(
+            title="Exportar toolchain",
+            defaultextension=".tar.gz",
+            initialfile="portuino-toolchain.tar.gz",
+            filetypes=[("Pacote Portuino", "*.tar.gz"), ("Todos", "*.*")],
+        )
+        if not destino:
+            return
+
+        def trabalho(postar):
+            try:
+                exportar_toolchain(destino, progress=self._progresso_pacote("Exportando", postar))
+                postar(self.set_status, "Toolchain exportada.")
+                postar(self.log, f"Toolchain exportada para: {destino}")
+            except Exception as e:
+                postar(self.set_status, "Falha ao exportar toolchain.")
+                postar(self.log, str(e))
+
+        self._em_segundo_plano(trabalho)
+
+    def importar_toolchain(self):
+        arquivo = filedialog.askopenfilename(
+            title="Importar toolchain",
+            filetypes=[("Pacote Portuino", "*.tar.gz"), ("Todos", "*.*")],
+        )
+        if not arquivo:
+            return
+
+        def trabalho(postar):
+            try:
+                info = importar_toolchain(arquivo, progress=self._progresso_pacote("Importando", postar))
+                postar(self.set_status, "Toolchain importada.")
+                postar(
+                    self.log,
+                    f"Toolchain importada (arduino-cli {info.get('cli_version') or '?'}, "
+                    f"{info.get('system') or '?'}).",
+                )
+            except Exception as e:
+                postar(self.set_status, "Falha ao importar toolchain.")
+                postar(self.log, str(e))
+
+        self._em_segundo_plano(trabalho)
+
     def atualizar_menu_portas(self):
         self.menu_porta.delete(0, tk.END)
 
@@ -693,60 +1169,75 @@ class PortuinoIDE:
         busca = ttk.Entry(top)
         busca.pack(side=tk.LEFT, fill="x", expand=True, padx=8)
 
-        lst = tk.Listbox(win)
-        lst.pack(fill="both", expand=True, padx=10, pady=8)
+        lista_frame = tk.Frame(win)
+        lista_frame.pack(fill="both", expand=True, padx=10, pady=8)
+        barra = ttk.Scrollbar(lista_frame, orient=tk.VERTICAL)
+        lst = tk.Listbox(lista_frame)
+        barra.pack(side=tk.RIGHT, fill="y")
+        lst.pack(side=tk.LEFT, fill="both", expand=True)
 
-        info = tk.Label(win, text="Carregando placas via arduino-cli...", anchor="w")
+        info = tk.Label(win, text="Carregando placas...", anchor="w")
         info.pack(fill="x", padx=10, pady=(0, 8))
 
-        boards = []
+        # Catálogo do disco: a janela abre já com a lista (sem esperar o arduino-cli)
+        _, placas = catalogo_em_disco()
+        estado = {"indice": IndiceCatalogo(placas), "resultado": [], "mostrados": 0, "agendado": None}
+
+        def mostrar_mais():
+            # Lista "virtual": insere uma página por vez, conforme a rolagem chega ao fim
+            indice, resultado = estado["indice"], estado["resultado"]
+            ini = estado["mostrados"]
+            fim = min(len(resultado), ini + BUSCA_PAGINA)
+            if fim > ini:
+                lst.insert(
+                    tk.END,
+                    *(f"  {indice.placas[i][1]}   |   {indice.placas[i][0]}" for i in resultado[ini:fim]),
+                )
+                estado["mostrados"] = fim
+            info.config(
+                text=f"{len(resultado)} de {len(indice)} placas. Selecione uma e clique em Aplicar."
+            )
+
+        def refresh():
+            estado["agendado"] = None
+            estado["resultado"] = estado["indice"].buscar(busca.get())
+            estado["mostrados"] = 0
+            lst.delete(0, tk.END)
+            mostrar_mais()
+
+        def on_change(_=None):
+            if estado["agendado"]:
+                win.after_cancel(estado["agendado"])
+            estado["agendado"] = win.after(BUSCA_ATRASO_MS, refresh)
+
+        def on_scroll(primeiro, ultimo):
+            barra.set(primeiro, ultimo)
+            if float(ultimo) > 0.9 and estado["mostrados"] < len(estado["resultado"]):
+                mostrar_mais()
+
+        lst.config(yscrollcommand=on_scroll)
+        barra.config(command=lst.yview)
+        busca.bind("<KeyRelease>", on_change)
+        if placas:
+            refresh()
+
+        def aplicar_catalogo(novas):
+            estado["indice"] = IndiceCatalogo(novas)
+            refresh()
 
         def carregar():
-            nonlocal boards
+            # Em segundo plano: só reconsulta `board listall` se os cores instalados mudaram
             try:
                 ensure_arduino_cli()
-                # Usamos board listall (lista grande, mas completa)
-                import subprocess
-
-                p = subprocess.run(
-                    ["arduino-cli", "board", "listall"], capture_output=True, text=True
-                )
-                out = (p.stdout or "") + (p.stderr or "")
-                if p.returncode != 0:
-                    raise RuntimeError(out)
-
-                # tenta extrair FQBN: padrão: "NAME  FQBN"
-                lines = [ln.strip() for ln in out.splitlines() if ln.strip()]
-                # pula cabeçalhos se existirem
-                # vamos pegar tudo que parece "algo:algo:algo"
-                fqbn = []
-                for ln in lines:
-                    m = __import__("re").search(
-                        r"\b([a-z0-9_]+:[a-z0-9_]+:[a-z0-9_]+)\b", ln
-                    )
-                    if m:
-                        fqbn.append((ln, m.group(1)))
-                boards = fqbn
-
-                def refresh(filter_text=""):
-                    lst.delete(0, tk.END)
-                    ft = filter_text.lower().strip()
-                    for label, f in boards:
-                        if not ft or ft in label.lower() or ft in f.lower():
-                            lst.insert(tk.END, f"  {f}   |   {label}")
-
-                def on_change(_=None):
-                    refresh(busca.get())
-
-                busca.bind("<KeyRelease>", on_change)
-                refresh("")
-                info.config(
-                    text=f"{len(boards)} placas encontradas. Selecione uma e clique em Aplicar."
-                )
-
+                novas, mudou = atualizar_catalogo()
+                if mudou or not placas:
+                    win.after(0, lambda: aplicar_catalogo(novas))
+            except tk.TclError:
+                pass  # janela fechada antes de terminar
             except Exception as e:
-                info.config(text="Falha ao listar placas.")
-                messagebox.showerror("Placa", f"Erro ao listar placas:\n{e}")
+                if not placas:
+                    info.config(text="Falha ao listar placas.")
+                    messagebox.showerror("Placa", f"Erro ao listar placas:\n{e}")
 
         def aplicar():
             sel = lst.curselection()
@@ -778,7 +1269,7 @@ class PortuinoIDE:
     def preferencias(self):
         win = Toplevel(self.root)
         win.title("Preferências")
-        win.geometry("520x320")
+        win.geometry("520x430")
 
         frm = tk.Frame(win)
         frm.pack(fill="both", expand=True, padx=12, pady=12)
@@ -797,12 +1288,22 @@ class PortuinoIDE:
         icon_var = tk.StringVar(value=str(self.config.get("icon_size", 24)))
         font_var = tk.StringVar(value=self.config.get("editor_font_family", "Consolas"))
         fontsize_var = tk.StringVar(value=str(self.config.get("editor_font_size", 12)))
+        servidor_var = tk.StringVar(value=self.config.get("servidor_compilacao", ""))
+        nao_bloq_var = tk.BooleanVar(value=bool(self.config.get("nao_bloqueante", False)))
+        perfil_var = tk.StringVar(value=self.config.get("perfil", "padrao"))
 
         row("FQBN padrão:", ttk.Entry(frm, textvariable=fqbn_var))
         row("Baud padrão:", ttk.Entry(frm, textvariable=baud_var))
         row("Tamanho ícone:", ttk.Entry(frm, textvariable=icon_var))
         row("Fonte editor:", ttk.Entry(frm, textvariable=font_var))
         row("Tam. fonte:", ttk.Entry(frm, textvariable=fontsize_var))
+        row("Servidor (URL):", ttk.Entry(frm, textvariable=servidor_var))
+        row("Tarefas:", ttk.Checkbutton(
+            frm, text="esperar() não bloqueante (laços em paralelo)", variable=nao_bloq_var
+        ))
+        row("Perfil compilação:", ttk.Combobox(
+            frm, textvariable=perfil_var, values=list(PERFIS), state="readonly"
+        ))
 
         def salvar():
             try:
@@ -811,8 +1312,12 @@ class PortuinoIDE:
                 self.config["icon_size"] = int(icon_var.get().strip())
                 self.config["editor_font_family"] = font_var.get().strip() or "Consolas"
                 self.config["editor_font_size"] = int(fontsize_var.get().strip())
+                self.config["servidor_compilacao"] = servidor_var.get().strip()
+                self.config["nao_bloqueante"] = bool(nao_bloq_var.get())
+                self.config["perfil"] = perfil_var.get() if perfil_var.get() in PERFIS else "padrao"
 
                 self._salvar_config()
+                self._agendar_previa()  # baud/tarefas mudam o C++ gerado
                 messagebox.showinfo(
                     "Preferências",
                     "Preferências salvas.\n(Reabra a IDE para aplicar ícones/fonte).",
@@ -827,6 +1332,41 @@ class PortuinoIDE:
         ttk.Button(b, text="Cancelar", command=win.destroy).pack(side=tk.RIGHT, padx=8)
 
     # ---------------- Ações básicas ----------------
+    def estimar_tempo(self):
+        """Período do laço, latência das entradas e pontos que bloqueiam, sem rodar nada."""
+        win = Toplevel(self.root)
+        win.title("Estimativa de tempo")
+        win.geometry("760x520")
+        txt = scrolledtext.ScrolledText(win, font=("Consolas", 10), wrap=tk.WORD)
+        txt.pack(fill="both", expand=True, padx=8, pady=(8, 0))
+
+        def atualizar():
+            fqbn = getattr(self.cfg, "fqbn", None) or self.config.get("default_fqbn", DEFAULT_FQBN)
+            try:
+                relatorios = estimar_alvos(
+                    self.editor.get("1.0", tk.END),
+                    fqbn=fqbn,
+                    baud=int(self.config.get("default_baud", DEFAULT_BAUD)),
+                    nao_bloqueante=bool(self.config.get("nao_bloqueante", False)),
+                )
+                conteudo = "\n\n".join(r.texto() for r in relatorios)
+            except ErroTraducao as e:
+                conteudo = f"Erro no programa Portuino:\nLinha {e.linha}: {e.mensagem}"
+            conteudo += (
+                "\n\n(Estimativa a partir de custos típicos de cada alvo; "
+                "o tempo real varia com a placa, a biblioteca e as entradas.)"
+            )
+            txt.config(state="normal")
+            txt.delete("1.0", tk.END)
+            txt.insert(tk.END, conteudo)
+            txt.config(state="disabled")
+
+        b = tk.Frame(win)
+        b.pack(fill="x", padx=8, pady=8)
+        ttk.Button(b, text="Fechar", command=win.destroy).pack(side=tk.RIGHT)
+        ttk.Button(b, text="Atualizar", command=atualizar).pack(side=tk.RIGHT, padx=8)
+        atualizar()
+
     def show_board_list(self):
         try:
             ensure_arduino_cli()
@@ -878,13 +1418,14 @@ class PortuinoIDE:
         indent = 0
 
         def is_close(s):
-            return s in ("fim_se", "fim_enquanto", "fim_para", "fim")
+            return s in ("fim_se", "fim_enquanto", "fim_para", "fim_procedimento", "fim_funcao", "fim_quando_mudar", "fim")
 
         def is_open(s):
             return (
                 (s.startswith("se ") and s.endswith(" entao"))
                 or s.startswith("enquanto ")
                 or s.startswith("para ")
+                or s.startswith(("procedimento ", "funcao ", "quando_mudar"))
                 or s == "inicio"
                 or s == "senao"
             )
@@ -914,6 +1455,10 @@ class PortuinoIDE:
         self.set_status("Auto formatação aplicada.")
 
     def verify_compile(self):
+        cancel = self._inicio_operacao()
+        if cancel is None:
+            return
+
         def work():
             try:
                 self.set_status("Verificando/compilando...")
@@ -927,18 +1472,41 @@ class PortuinoIDE:
                     if not getattr(self.cfg, "fqbn", None) or self.cfg.fqbn == "?":
                         self.cfg.fqbn = self.config.get("default_fqbn", DEFAULT_FQBN)
                     self.cfg.baud = int(self.config.get("default_baud", DEFAULT_BAUD))
+                    self.cfg.nao_bloqueante = bool(self.config.get("nao_bloqueante", False))
+                    self.cfg.perfil = self.config.get("perfil", "padrao")
 
                 code = self.editor.get("1.0", tk.END)
-                _, out = compile_sketch(code, self.cfg)
-                self.log(out.strip())
-                self.set_status("Compilação OK.")
+                servidor = self.config.get("servidor_compilacao", "").strip()
+                if servidor:
+                    self.log(f"(compilando no servidor {servidor})")
+                    # só o log e o tamanho interessam aqui: os binários baixados são descartados
+                    with tempfile.TemporaryDirectory(prefix="portuino_remoto_") as pasta:
+                        r = compilar_remoto(
+                            servidor, code, self.cfg, destino=pasta, on_line=self.log, cancel=cancel
+                        )
+                else:
+                    r = compile_sketch(code, self.cfg, on_line=self.log, cancel=cancel)
+                self._status_tamanho("Compilação OK.", r.tamanho)
+            except OperacaoCancelada:
+                self.log("Compilação cancelada pelo usuário.")
+                self.set_status("Compilação cancelada.")
             except Exception as e:
-                self.log(str(e))
-                self.set_status("Erro na compilação.")
+                self._log_erro(e)
+                erros = [d for d in getattr(e, "diagnosticos", []) if d.tipo == "erro"]
+                if erros:
+                    self.set_status(f"Erro na compilação (linha {erros[0].linha}: {erros[0].mensagem}).")
+                else:
+                    self.set_status("Erro na compilação.")
+            finally:
+                self._fim_operacao(cancel)
 
         threading.Thread(target=work, daemon=True).start()
 
     def upload(self):
+        cancel = self._inicio_operacao()
+        if cancel is None:
+            return
+
         def work():
             try:
                 self.set_status("Enviando para a placa (upload)...")
@@ -957,14 +1525,25 @@ class PortuinoIDE:
                     if not getattr(self.cfg, "fqbn", None) or self.cfg.fqbn == "?":
                         self.cfg.fqbn = self.config.get("default_fqbn", DEFAULT_FQBN)
                     self.cfg.baud = int(self.config.get("default_baud", DEFAULT_BAUD))
+                    self.cfg.nao_bloqueante = bool(self.config.get("nao_bloqueante", False))
+                    self.cfg.perfil = self.config.get("perfil", "padrao")
 
                 code = self.editor.get("1.0", tk.END)
-                out = upload_sketch(code, self.cfg)
-                self.log(out.strip())
-                self.set_status("Upload concluído.")
+                servidor = self.config.get("servidor_compilacao", "").strip()
+                if servidor:
+                    self.log(f"(compilando no servidor {servidor})")
+                    logs = upload_remoto(servidor, code, self.cfg, on_line=self.log, cancel=cancel)
+                else:
+                    logs = upload_sketch(code, self.cfg, on_line=self.log, cancel=cancel)
+                self._status_tamanho("Upload concluído.", tamanho_do_log(logs))
+            except OperacaoCancelada:
+                self.log("Upload cancelado pelo usuário.")
+                self.set_status("Upload cancelado.")
             except Exception as e:
-                self.log(str(e))
+                self._log_erro(e)
                 self.set_status("Erro no upload.")
+            finally:
+                self._fim_operacao(cancel)
 
         threading.Thread(target=work, daemon=True).start()
 
@@ -1094,7 +1673,11 @@ fim
         r.bind("<Control-r>", lambda e: self.verify_compile())
         r.bind("<Control-u>", lambda e: self.upload())
         r.bind("<Control-t>", lambda e: self.auto_formatar())
+        r.bind("<Control-e>", lambda e: self.estimar_tempo())
+        r.bind("<Control-g>", lambda e: (self.mostrar_cpp_var.set(not self.mostrar_cpp_var.get()),
+                                         self.alternar_previa()))
         r.bind("<Control-Shift-M>", lambda e: self.serial_monitor())
+        r.bind("<Escape>", lambda e: self.cancelar())
 
     def run(self):
         self.root.mainloop()
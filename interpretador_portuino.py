@@ -4,9 +4,16 @@
 
 from __future__ import annotations
 
+import io
 import re
+import array
+import ast
+import math
 import time
-from dataclasses import dataclass
+import struct
+import threading
+import contextlib
+from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional, Tuple
 
 # --- Arduino real (PyFirmata) ---
@@ -84,10 +91,124 @@ ARD = conectar_arduino_auto()
 # ===============================
 
 variaveis: Dict[str, Any] = {}
+tipos_variaveis: Dict[str, str] = {}     # {nome: "inteiro"/"real"/"logico"/"texto"/"inteiro[N]"} (1ª atribuição)
 pinos_configurados: Dict[int, str] = {}  # {pino: "saida"/"entrada"}
 pinos_sim: Dict[int, int] = {}           # simulação {pino: 0/1}
 
 
+@dataclass
+class Quadro:
+    """Variáveis de uma chamada de procedimento/funcao (parâmetros e as declaradas nela)."""
+    variaveis: Dict[str, Any] = field(default_factory=dict)
+    tipos: Dict[str, str] = field(default_factory=dict)
+
+
+_pilha: List[Quadro] = []  # chamadas em andamento (a última é a atual)
+
+
+def _lugar(nome: str, declarar: bool = False) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    (variáveis, tipos) onde `nome` vive. Dentro de uma chamada: declarar, parâmetros e nomes
+    que não são globais ficam no quadro; o resto é global (como as variáveis locais do C++).
+    """
+    if _pilha:
+        quadro = _pilha[-1]
+        if declarar or nome in quadro.variaveis or nome not in variaveis:
+            return quadro.variaveis, quadro.tipos
+    return variaveis, tipos_variaveis
+
+
+# ===============================
+# Relógio virtual (simulação sem esperar de verdade)
+# ===============================
+
+class FimSimulacao(Exception):
+    """Tempo virtual (ou limite de passos) esgotado."""
+
+
+class ErroVetor(RuntimeError):
+    """Índice fora do vetor (no Arduino isso corromperia a memória sem aviso)."""
+
+
+class ErroSubrotina(RuntimeError):
+    """Chamada inválida de procedimento/funcao (argumentos, 'retornar' fora, recursão sem fim)."""
+
+
+# vetor: array.array guarda os números lado a lado (sem um objeto Python por item)
+_CODIGOS_VETOR = {"inteiro": "q", "real": "f", "logico": "b"}  # "f": float de 32 bits, como no AVR
+
+
+class Vetor(array.array):
+    """Vetor de tamanho fixo: índice conferido a cada acesso."""
+
+    def _indice(self, i: Any) -> int:
+        if isinstance(i, bool) or not isinstance(i, int):
+            raise ErroVetor(f"Índice de vetor deve ser inteiro: {i!r}")
+        if not 0 <= i < len(self):
+            raise ErroVetor(f"Índice {i} fora do vetor (0 a {len(self) - 1}).")
+        return i
+
+    def __getitem__(self, i: Any) -> Any:
+        v = super().__getitem__(self._indice(i))
+        return bool(v) if self.typecode == "b" else v
+
+    def __setitem__(self, i: Any, v: Any) -> None:
+        super().__setitem__(self._indice(i), v)
+
+
+def _tamanho(v: Any) -> int:
+    if not isinstance(v, Vetor):
+        raise ErroVetor("tamanho() espera um vetor.")
+    return len(v)
+
+
+@dataclass
+class RelogioVirtual:
+    """
+    Tempo simulado em µs: esperar() só avança o contador.
+    Guarda o trace (t_us, tipo, pino, valor, texto) no mesmo formato do simulador_host
+    e aplica estímulos de entrada (t_us, "D"|"P", pino, valor) quando o tempo chega neles.
+    """
+    limite_us: int
+    estimulos: List[Tuple[int, str, int, int]] = field(default_factory=list)
+    max_passos: int = 200000
+    agora_us: int = 0
+    passos: int = 0
+    terminou: bool = False  # o programa chegou ao fim antes do limite
+    eventos: List[Tuple[int, str, Optional[int], Optional[int], str]] = field(default_factory=list)
+    pulsos: Dict[int, int] = field(default_factory=dict)  # duração (µs) devolvida ao medir distância
+    _proximo: int = 0
+
+    def avancar(self, us: int) -> None:
+        self.agora_us += int(us)
+        while self._proximo < len(self.estimulos) and self.estimulos[self._proximo][0] <= self.agora_us:
+            _t, tipo, pino, valor = self.estimulos[self._proximo]
+            self._proximo += 1
+            if tipo == "P":
+                self.pulsos[pino] = valor
+            else:
+                antes = pinos_sim.get(pino, 0)
+                pinos_sim[pino] = 1 if valor else 0
+                _borda(pino, antes, pinos_sim[pino])
+        if self.agora_us >= self.limite_us:
+            raise FimSimulacao("tempo")
+
+    def proximo_estimulo(self) -> Optional[int]:
+        """Tempo (µs) do próximo estímulo ainda não aplicado."""
+        return self.estimulos[self._proximo][0] if self._proximo < len(self.estimulos) else None
+
+    def passo(self) -> None:
+        self.passos += 1
+        if self.passos > self.max_passos:
+            raise FimSimulacao("passos")
+
+    def evento(self, tipo: str, pino: Optional[int] = None, valor: Optional[int] = None, texto: str = "") -> None:
+        self.eventos.append((self.agora_us, tipo, pino, valor, texto))
+
+
+RELOGIO: Optional[RelogioVirtual] = None  # ativo só dentro de simular_codigo()
+
+
 # ===============================
 # Funções "Portuino"
 # ===============================
@@ -115,6 +236,8 @@ def configurar_saida(pino: int) -> None:
         pinos_sim[pino] = pinos_sim.get(pino, 0)
 
     pinos_configurados[pino] = "saida"
+    if RELOGIO:
+        RELOGIO.evento("modo", pino, 1)
     _log_info(f"[CONFIG] PINO {pino} configurado como SAÍDA ({ARD.modo})")
 
 
@@ -134,6 +257,8 @@ def configurar_entrada(pino: int) -> None:
         pinos_sim[pino] = pinos_sim.get(pino, 0)
 
     pinos_configurados[pino] = "entrada"
+    if RELOGIO:
+        RELOGIO.evento("modo", pino, 0)
     _log_info(f"[CONFIG] PINO {pino} configurado como ENTRADA ({ARD.modo})")
 
 
@@ -144,6 +269,9 @@ def ligar(pino: int) -> None:
     else:
         pinos_sim[pino] = 1
     _log_info(f"[PIN {pino}] = ALTO (ligado) ({ARD.modo})")
+    if RELOGIO:
+        RELOGIO.evento("escrita", pino, 1)
+        RELOGIO.avancar(4)  # mesmo custo do digitalWrite no simulador_host
 
 
 def desligar(pino: int) -> None:
@@ -153,6 +281,9 @@ def desligar(pino: int) -> None:
     else:
         pinos_sim[pino] = 0
     _log_info(f"[PIN {pino}] = BAIXO (desligado) ({ARD.modo})")
+    if RELOGIO:
+        RELOGIO.evento("escrita", pino, 0)
+        RELOGIO.avancar(4)
 
 
 def ler(pino: int) -> int:
@@ -168,21 +299,37 @@ def ler(pino: int) -> int:
             return 0
         return 1 if bool(v) else 0
 
+    if RELOGIO:
+        RELOGIO.avancar(4)  # laço "enquanto (ler(p) == 0)" precisa de tempo para ver o estímulo
     return int(bool(pinos_sim.get(pino, 0)))
 
 
+def _medir_distancia_virtual(trig: int, echo: int) -> int:
+    """Mesmos passos do medir_distancia() gerado no .ino, com o eco vindo dos estímulos."""
+    for us, nivel in ((2, 0), (10, 1), (0, 0)):
+        pinos_sim[trig] = nivel
+        RELOGIO.evento("escrita", trig, nivel)
+        RELOGIO.avancar(4 + us)
+    dur = RELOGIO.pulsos.get(echo, 0)
+    if dur == 0 or dur > 30000:
+        RELOGIO.avancar(30000)  # sem eco: pulseIn espera o timeout inteiro
+        return 0
+    RELOGIO.avancar(dur)
+    return dur // 58
+
+
 def medir_distancia(trig: int, echo: int) -> int:
     """
     Ultrassom HC-SR04 via Firmata é LIMITADO.
     Funciona melhor no modo 'Upload' (gerando .ino). Aqui é uma tentativa por polling.
 
-    Retorna distância em cm (aprox). Em SIMULAÇÃO retorna 0.
+    Retorna distância em cm (aprox). Em SIMULAÇÃO retorna 0 (com relógio virtual, usa os estímulos).
     """
     trig = int(trig)
     echo = int(echo)
 
     if not _modo_real():
-        return 0
+        return _medir_distancia_virtual(trig, echo) if RELOGIO else 0
 
     # Garante modos
     configurar_saida(trig)
@@ -221,41 +368,111 @@ def medir_distancia(trig: int, echo: int) -> int:
 # ===============================
 # Avaliador de expressões
 # ===============================
+# Mesma semântica do sketch gerado (portuino_to_ino), para a simulação bater com a placa:
+# - "texto" + x concatena da esquerda para a direita (1 + 2 + "a" -> "3a")
+# - inteiro / inteiro é divisão inteira (trunca para zero); % como em C
+# - ao escrever, logico vira verdadeiro/falso e real sai com 2 casas
+# - &&, || e ! valem como and, or e not
 
-def _split_plus_outside_quotes(expr: str) -> List[str]:
-    """
-    Divide por '+' ignorando '+' dentro de aspas.
-    Simples e suficiente para o uso educacional.
-    """
-    parts = []
-    cur = []
-    in_str = False
-    esc = False
-
-    for ch in expr:
-        if esc:
-            cur.append(ch)
-            esc = False
-            continue
+def _f32(x: float) -> float:
+    return struct.unpack("f", struct.pack("f", x))[0]
 
-        if ch == "\\":
-            cur.append(ch)
-            esc = True
-            continue
 
-        if ch == '"':
-            in_str = not in_str
-            cur.append(ch)
-            continue
+def _real_texto(v: float) -> str:
+    """Como Serial.print(float) do core AVR (float de 32 bits, 2 casas)."""
+    if math.isnan(v):
+        return "nan"
+    if math.isinf(v):
+        return "inf"
+    if abs(v) > 4294967040.0:
+        return "ovf"
+    sinal = "-" if v < 0 else ""
+    n = _f32(_f32(abs(v)) + _f32(_f32(0.5 / 10) / 10))
+    inteiro = int(n)
+    resto = _f32(n - inteiro)
+    casas = ""
+    for _ in range(2):
+        resto = _f32(resto * 10)
+        d = int(resto)
+        casas += str(d)
+        resto = _f32(resto - d)
+    return f"{sinal}{inteiro}.{casas}"
+
+
+def _texto(v: Any) -> str:
+    """Valor como a placa escreve (Serial.print)."""
+    if isinstance(v, bool):
+        return "verdadeiro" if v else "falso"
+    if isinstance(v, float):
+        return _real_texto(v)
+    return str(v)
+
+
+def _string_arduino(v: Any) -> str:
+    """str(x) do Portuino é String(x) do Arduino: logico vira 1/0."""
+    if isinstance(v, bool):
+        return "1" if v else "0"
+    if isinstance(v, float):
+        return _real_texto(v)
+    return str(v)
+
+
+def _soma(a: Any, b: Any) -> Any:
+    if isinstance(a, str) or isinstance(b, str):
+        return _texto(a) + _texto(b)
+    return a + b
+
+
+def _div(a: Any, b: Any) -> Any:
+    if isinstance(a, int) and isinstance(b, int):
+        q = abs(a) // abs(b)
+        return q if (a < 0) == (b < 0) else -q
+    return a / b
 
-        if ch == "+" and not in_str:
-            parts.append("".join(cur).strip())
-            cur = []
-        else:
-            cur.append(ch)
 
-    parts.append("".join(cur).strip())
-    return parts
+def _mod(a: Any, b: Any) -> Any:
+    if isinstance(a, int) and isinstance(b, int):
+        return a - b * _div(a, b)
+    return math.fmod(a, b)
+
+
+def _round(x: Any) -> int:
+    """Macro round() do Arduino: metade para longe do zero."""
+    return int(x + 0.5) if x >= 0 else int(x - 0.5)
+
+
+_OPERADORES_C = re.compile(r'"(?:\\.|[^"\\])*"|&&|\|\||!(?!=)')
+_PYTHON = {"&&": " and ", "||": " or ", "!": " not "}
+
+
+def _chamada(nome: str, args: List[ast.expr], no: ast.AST) -> ast.AST:
+    return ast.copy_location(ast.Call(func=ast.Name(id=nome, ctx=ast.Load()), args=args, keywords=[]), no)
+
+
+class _SemanticaC(ast.NodeTransformer):
+    """a + b, a / b e a % b viram _soma/_div/_mod; and/or dão logico (como && e || em C)."""
+    _FUNCOES = {ast.Add: "_soma", ast.Div: "_div", ast.Mod: "_mod"}
+
+    def visit_BinOp(self, no: ast.BinOp) -> ast.AST:
+        self.generic_visit(no)
+        nome = self._FUNCOES.get(type(no.op))
+        return _chamada(nome, [no.left, no.right], no) if nome else no
+
+    def visit_BoolOp(self, no: ast.BoolOp) -> ast.AST:
+        self.generic_visit(no)
+        return _chamada("_logico", [no], no)
+
+
+_COMPILADAS: Dict[str, Any] = {}  # expressão -> código (laços não recompilam a cada volta)
+
+
+def _compilar(expr: str) -> Any:
+    codigo = _COMPILADAS.get(expr)
+    if codigo is None:
+        py = _OPERADORES_C.sub(lambda m: _PYTHON.get(m.group(0), m.group(0)), expr)
+        arvore = _SemanticaC().visit(ast.parse(py.strip(), mode="eval"))
+        codigo = _COMPILADAS[expr] = compile(ast.fix_missing_locations(arvore), "<portuino>", "eval")
+    return codigo
 
 
 def _eval_puro(expr: str) -> Any:
@@ -271,13 +488,22 @@ def _eval_puro(expr: str) -> Any:
         # Funções úteis (educacional)
         "int": int,
         "float": float,
-        "str": str,
+        "str": _string_arduino,
         "abs": abs,
         "min": min,
         "max": max,
-        "round": round,
+        "round": _round,
+        "tamanho": _tamanho,
+        # Operadores com a semântica do sketch gerado
+        "_soma": _soma,
+        "_div": _div,
+        "_mod": _mod,
+        "_logico": bool,
     }
-    return eval(expr, {"__builtins__": {}}, {**env, **variaveis})
+    nomes = {**env, **_chamadas, **variaveis}
+    if _pilha:
+        nomes.update(_pilha[-1].variaveis)
+    return eval(_compilar(expr), {"__builtins__": {}}, nomes)
 
 
 def avaliar_expressao(expr: str) -> Any:
@@ -286,19 +512,10 @@ def avaliar_expressao(expr: str) -> Any:
     # Troca palavras booleanas do Portuino para Python (também aceitamos verdadeiro/falso direto no env)
     expr = expr.replace("VERDADEIRO", "verdadeiro").replace("FALSO", "falso")
 
-    # Concat amigável: "texto" + numero
-    # Se houver aspas, tratamos '+' como concatenação por string
-    if '"' in expr and "+" in expr:
-        parts = _split_plus_outside_quotes(expr)
-        vals = []
-        for p in parts:
-            v = _eval_puro(p)
-            vals.append(str(v))
-        return "".join(vals)
-
-    # Caso geral
     try:
         return _eval_puro(expr)
+    except (FimSimulacao, ErroVetor, ErroSubrotina):
+        raise
     except NameError:
         # Se for só um nome de variável
         return variaveis.get(expr, expr)
@@ -307,42 +524,168 @@ def avaliar_expressao(expr: str) -> Any:
         return variaveis.get(expr, expr)
 
 
+def _tipo_de(v: Any) -> str:
+    if isinstance(v, bool):
+        return "logico"
+    if isinstance(v, int):
+        return "inteiro"
+    if isinstance(v, float):
+        return "real"
+    return "texto"
+
+
+def _converter(v: Any, tipo: str) -> Any:
+    """Valor guardado numa variável do tipo (como a atribuição no sketch gerado)."""
+    try:
+        if tipo == "inteiro" and isinstance(v, (bool, float)):
+            return int(v)
+        if tipo == "real" and isinstance(v, (int, float)):
+            return _f32(float(v))  # float do AVR tem 32 bits
+        if tipo == "logico" and isinstance(v, (int, float)):
+            return bool(v)
+        if tipo == "texto" and not isinstance(v, str):
+            return _texto(v)
+    except (ValueError, OverflowError):
+        pass
+    return v
+
+
+def _atribuir(nome: str, valor: Any, tipo: Optional[str] = None) -> None:
+    """A variável fica com o tipo da declaração (ou da 1ª atribuição), como no C++."""
+    destino, tipos = _lugar(nome, declarar=tipo is not None)
+    tipo = tipos.setdefault(nome, tipo or _tipo_de(valor))
+    destino[nome] = _converter(valor, tipo)
+
+
+def _sem_comentario(s: str) -> str:
+    """Remove '// comentário' no fim da linha (fora de aspas)."""
+    aspas = False
+    i = 0
+    while i < len(s):
+        ch = s[i]
+        if ch == "\\" and aspas:
+            i += 2
+            continue
+        if ch == '"':
+            aspas = not aspas
+        elif not aspas and s.startswith("//", i):
+            return s[:i].rstrip()
+        i += 1
+    return s
+
+
 # ===============================
 # Parser/Executor de blocos
 # ===============================
 
+def _fim_esperado(linha: str) -> Optional[str]:
+    """Token que fecha o bloco aberto por esta linha (None se não abre bloco)."""
+    if re.match(r"^se\s*\(", linha):
+        return "fim_se"
+    if re.match(r"^enquanto\s*\(", linha):
+        return "fim_enquanto"
+    if re.match(r"^para\s", linha):
+        return "fim_para"
+    return None
+
+
 def _extrair_bloco(linhas: List[str], i: int, fim_token: str) -> Tuple[List[str], int]:
+    """Linhas até o fim_token do mesmo nível (blocos aninhados, mesmo do mesmo tipo, ficam dentro)."""
     bloco = []
+    abertos: List[str] = []
     i += 1
-    while i < len(linhas) and linhas[i].strip() != fim_token:
+    while i < len(linhas):
+        s = linhas[i].strip()
+        if not abertos and s == fim_token:
+            break
+        fim = _fim_esperado(s)
+        if fim:
+            abertos.append(fim)
+        elif abertos and s == abertos[-1]:
+            abertos.pop()
         bloco.append(linhas[i])
         i += 1
     return bloco, i  # i aponta para o fim_token
 
 
+def _dividir_senao(bloco: List[str]) -> Tuple[List[str], List[str]]:
+    """(então, senão) pelo 'senao' do nível do próprio se."""
+    abertos: List[str] = []
+    for k, ln in enumerate(bloco):
+        s = ln.strip()
+        if not abertos and s == "senao":
+            return bloco[:k], bloco[k + 1:]
+        fim = _fim_esperado(s)
+        if fim:
+            abertos.append(fim)
+        elif abertos and s == abertos[-1]:
+            abertos.pop()
+    return bloco, []
+
+
 def interpretar_linha(linha: str) -> None:
     linha = linha.strip()
 
     if not linha or linha.startswith("//"):
         return
 
+    # vetor (inteiro|real|logico) v[N]  (declarar de novo zera o vetor)
+    m = re.match(r"^vetor\s+(\w+)\s+(\w+)\s*\[\s*(\d+)\s*\]$", linha)
+    if m:
+        tipo, nome, n = m.group(1), m.group(2), int(m.group(3))
+        if tipo not in _CODIGOS_VETOR or n < 1:
+            raise ValueError(f"Vetor inválido: {linha}")
+        destino, tipos = _lugar(nome, declarar=True)
+        destino[nome] = Vetor(_CODIGOS_VETOR[tipo], [0] * n)
+        tipos[nome] = f"{tipo}[{n}]"
+        return
+
+    # item de vetor: v[i] <- expr
+    m = re.match(r"^(\w+)\s*\[(.*)\]\s*<-\s*(.+)$", linha)
+    if m:
+        nome, indice, valor = m.groups()
+        lugar, tipos = _lugar(nome)
+        vetor = lugar.get(nome)
+        if not isinstance(vetor, Vetor):
+            raise ErroVetor(f"'{nome}' não é vetor.")
+        tipo = tipos[nome].split("[")[0]
+        i = avaliar_expressao(indice)
+        vetor[i] = _converter(avaliar_expressao(valor), tipo)
+        return
+
+    # retornar [expr] (sai do procedimento/funcao em andamento)
+    m = re.match(r"^retornar\b\s*(.*)$", linha)
+    if m:
+        if not _pilha:
+            raise ErroSubrotina("'retornar' só pode ser usado dentro de procedimento ou funcao.")
+        raise _Retorno(avaliar_expressao(m.group(1)) if m.group(1).strip() else None)
+
     # declaração/atribuição: (inteiro|real|logico|texto)? var <- expr
     m = re.match(r"^(inteiro|real|logico|texto)?\s*(\w+)\s*<-\s*(.+)$", linha)
     if m:
-        _tipo, nome, valor = m.groups()
-        variaveis[nome] = avaliar_expressao(valor)
+        tipo, nome, valor = m.groups()
+        _atribuir(nome, avaliar_expressao(valor), tipo)
         return
 
     # escrever(...)
     if linha.startswith("escrever("):
         conteudo = re.findall(r"^escrever\((.*)\)$", linha)[0]
-        print(avaliar_expressao(conteudo))
+        texto = _texto(avaliar_expressao(conteudo))
+        print(texto)
+        if RELOGIO:
+            for parte in texto.split("\n"):
+                RELOGIO.evento("serial", texto=parte)
         return
 
     # esperar(ms)
     if linha.startswith("esperar("):
         ms = int(avaliar_expressao(re.findall(r"^esperar\((.*)\)$", linha)[0]))
-        time.sleep(ms / 1000.0)
+        if quandos:
+            _esperar_atendendo(ms)
+        elif RELOGIO:
+            RELOGIO.avancar(ms * 1000)
+        else:
+            time.sleep(ms / 1000.0)
         return
 
     # configurar_saida(pino)
@@ -390,74 +733,300 @@ def interpretar_bloco(linhas: List[str]) -> None:
             i += 1
             continue
 
-        # se (...) entao
-        if linha.startswith("se"):
-            cond = re.findall(r"^se\s*\((.*)\)\s*entao$", linha)[0]
-            bloco_se = []
-            bloco_senao = []
-
-            i += 1
-            em_senao = False
-            while i < len(linhas) and linhas[i].strip() != "fim_se":
-                if linhas[i].strip() == "senao":
-                    em_senao = True
-                else:
-                    (bloco_senao if em_senao else bloco_se).append(linhas[i])
-                i += 1
+        # se (...) entao   ("entao" opcional)
+        if re.match(r"^se\s*\(", linha):
+            cond = re.findall(r"^se\s*\((.*)\)\s*(?:entao)?$", linha)[0]
+            bloco, fim_i = _extrair_bloco(linhas, i, "fim_se")
+            bloco_se, bloco_senao = _dividir_senao(bloco)
 
             if bool(avaliar_expressao(cond)):
                 interpretar_bloco(bloco_se)
             else:
                 interpretar_bloco(bloco_senao)
 
-            i += 1  # pula fim_se
+            i = fim_i + 1  # pula fim_se
             continue
 
-        # enquanto (...) faca
-        if linha.startswith("enquanto"):
-            cond = re.findall(r"^enquanto\s*\((.*)\)\s*faca$", linha)[0]
+        # enquanto (...) faca   ("faca" opcional)
+        if re.match(r"^enquanto\s*\(", linha):
+            cond = re.findall(r"^enquanto\s*\((.*)\)\s*(?:faca)?$", linha)[0]
             bloco, fim_i = _extrair_bloco(linhas, i, "fim_enquanto")
             while bool(avaliar_expressao(cond)):
+                if RELOGIO:
+                    RELOGIO.passo()
+                _atender_eventos()
                 interpretar_bloco(bloco)
             i = fim_i + 1
             continue
 
         # para i de A ate B passo P
-        if linha.startswith("para"):
+        if re.match(r"^para\s", linha):
             m = re.match(r"^para\s+(\w+)\s+de\s+(.*)\s+ate\s+(.*)\s+passo\s+(.*)$", linha)
             if not m:
                 raise ValueError(f"Sintaxe inválida em PARA: {linha}")
             var, inicio, fim, passo = m.groups()
             bloco, fim_i = _extrair_bloco(linhas, i, "fim_para")
 
-            inicio_val = int(avaliar_expressao(inicio))
-            fim_val = int(avaliar_expressao(fim))
             passo_val = int(avaliar_expressao(passo))
             if passo_val == 0:
                 raise ValueError("PASSO não pode ser 0.")
 
-            # Inclusivo (estilo Visualg): até B inclusive
-            if passo_val > 0:
-                rng = range(inicio_val, fim_val + 1, passo_val)
-            else:
-                rng = range(inicio_val, fim_val - 1, passo_val)
-
-            for v in rng:
-                variaveis[var] = v
+            # Inclusivo (estilo Visualg): até B inclusive.
+            # Como o for do sketch gerado, limite e passo são reavaliados a cada volta.
+            _atribuir(var, int(avaliar_expressao(inicio)), "inteiro")
+            while True:
+                fim_val = avaliar_expressao(fim)
+                v = _lugar(var)[0][var]
+                if (v > fim_val) if passo_val > 0 else (v < fim_val):
+                    break
+                if RELOGIO:
+                    RELOGIO.passo()
                 interpretar_bloco(bloco)
+                passo_val = int(avaliar_expressao(passo))
+                _atribuir(var, _lugar(var)[0][var] + passo_val)
 
             i = fim_i + 1
             continue
 
         # linha comum
+        if RELOGIO:
+            RELOGIO.passo()
         interpretar_linha(linha)
         i += 1
 
 
+# ===============================
+# Procedimentos e funções
+# ===============================
+
+@dataclass
+class Subrotina:
+    nome: str
+    retorno: Optional[str]          # tipo da funcao; None = procedimento
+    params: List[Tuple[str, str]]   # (tipo, nome), passados por valor
+    corpo: List[str]
+    locais: List[Tuple[str, str]] = field(default_factory=list)  # (tipo, nome) declaradas no corpo
+
+
+class _Retorno(Exception):
+    """'retornar': sai do corpo até a chamada (que pega o valor)."""
+    def __init__(self, valor: Any):
+        super().__init__()
+        self.valor = valor
+
+
+subrotinas: Dict[str, Subrotina] = {}
+_chamadas: Dict[str, Any] = {}  # nome -> função Python chamável nas expressões
+PROFUNDIDADE_MAX = 64           # chamadas aninhadas (a pilha do Uno é bem menor que isso)
+_ZEROS = {"inteiro": 0, "real": 0.0, "logico": False, "texto": ""}
+_FIM_SUB = {"procedimento": "fim_procedimento", "funcao": "fim_funcao", "quando_mudar": "fim_quando_mudar"}
+
+
+def _chamar(sub: Subrotina, args: Tuple[Any, ...]) -> Any:
+    """Roda o corpo num quadro novo; a funcao que chega ao fim devolve o zero do tipo."""
+    if len(args) != len(sub.params):
+        raise ErroSubrotina(f"'{sub.nome}' espera {len(sub.params)} argumento(s), recebeu {len(args)}.")
+    if len(_pilha) >= PROFUNDIDADE_MAX:
+        raise ErroSubrotina(f"'{sub.nome}': mais de {PROFUNDIDADE_MAX} chamadas aninhadas (recursão sem fim?).")
+    quadro = Quadro()
+    for (tipo, nome), v in zip(sub.params, args):
+        quadro.tipos[nome] = tipo
+        quadro.variaveis[nome] = _converter(v, tipo)
+    # As declaradas no corpo valem (zeradas) desde o começo da chamada, como no C++
+    for tipo, nome in sub.locais:
+        if nome not in quadro.tipos:
+            quadro.tipos[nome] = tipo
+            m = re.match(r"^(\w+)\[(\d+)\]$", tipo)
+            quadro.variaveis[nome] = Vetor(_CODIGOS_VETOR[m.group(1)], [0] * int(m.group(2))) if m else _ZEROS[tipo]
+    valor = None
+    _pilha.append(quadro)
+    try:
+        interpretar_bloco(sub.corpo)
+    except _Retorno as r:
+        valor = r.valor
+    finally:
+        _pilha.pop()
+    if sub.retorno is None:
+        return None
+    return _converter(_ZEROS[sub.retorno] if valor is None else valor, sub.retorno)
+
+
+def _locais(corpo: List[str]) -> List[Tuple[str, str]]:
+    """(tipo, nome) das variáveis declaradas no corpo de uma sub-rotina."""
+    locais = []
+    for ln in corpo:
+        d = re.match(r"^(inteiro|real|logico|texto)\s+(\w+)\s*<-", ln.strip())
+        v = re.match(r"^vetor\s+(\w+)\s+(\w+)\s*\[\s*(\d+)\s*\]$", ln.strip())
+        if d:
+            locais.append((d.group(1), d.group(2)))
+        elif v:
+            locais.append((f"{v.group(1)}[{v.group(3)}]", v.group(2)))
+    return locais
+
+
+def definir_subrotinas(linhas: List[str]) -> None:
+    """Registra procedimentos/funções e quando_mudar (escritos antes de 'inicio'); outras linhas são ignoradas."""
+    subrotinas.clear()
+    _chamadas.clear()
+    quandos.clear()
+    i = 0
+    while i < len(linhas):
+        s = linhas[i].strip()
+        if s.startswith("quando_mudar"):
+            m = re.match(r"^quando_mudar\s*\(\s*(\d+)\s*,\s*(subida|descida|mudanca)\s*\)$", s)
+            if not m:
+                raise ValueError(f"Sintaxe inválida em quando_mudar (ex.: quando_mudar(2, subida)): {s}")
+            pino = int(m.group(1))
+            if any(q.pino == pino for q in quandos):
+                raise ValueError(f"O pino {pino} já tem quando_mudar.")
+            corpo, i = _extrair_bloco(linhas, i, "fim_quando_mudar")
+            sub = Subrotina(f"quando_mudar({pino}, {m.group(2)})", None, [], corpo, _locais(corpo))
+            quandos.append(QuandoMudar(pino, m.group(2), sub))
+            i += 1
+            continue
+        if not re.match(r"^(procedimento|funcao)\b", s):
+            i += 1
+            continue
+        m = re.match(r"^(procedimento|funcao)\s+(?:(inteiro|real|logico|texto)\s+)?(\w+)\s*\((.*)\)$", s)
+        if not m:
+            raise ValueError(f"Sintaxe inválida em procedimento/funcao: {s}")
+        palavra, retorno, nome, lista = m.groups()
+        params = []
+        for p in filter(None, (x.strip() for x in lista.split(","))):
+            mp = re.match(r"^(inteiro|real|logico|texto)\s+(\w+)$", p)
+            if not mp:
+                raise ValueError(f"Parâmetro inválido em {nome}: {p}")
+            params.append((mp.group(1), mp.group(2)))
+        corpo, i = _extrair_bloco(linhas, i, _FIM_SUB[palavra])
+        sub = subrotinas[nome] = Subrotina(nome, retorno, params, corpo, _locais(corpo))
+        _chamadas[nome] = lambda *args, sub=sub: _chamar(sub, args)
+        i += 1
+
+
+# ===============================
+# quando_mudar (mudanças de pino)
+# ===============================
+# Como no sketch gerado: a borda só é contada quando acontece (estímulo do relógio virtual
+# ou mensagem digital do Firmata, que chega na thread do Iterator); o corpo roda depois,
+# no esperar() e a cada volta de 'enquanto', nunca no meio de outra instrução.
+
+@dataclass
+class QuandoMudar:
+    pino: int
+    borda: str          # subida | descida | mudanca
+    sub: Subrotina      # corpo, rodado como procedimento sem parâmetros
+    pendentes: int = 0  # bordas ainda não atendidas
+
+
+quandos: List[QuandoMudar] = []
+BORDAS_MAX = 255            # como o contador uint8_t do sketch
+ESPERA_FATIA_S = 0.002      # esperar() na placa real: de quanto em quanto tempo atende as bordas
+_bordas_lock = threading.Lock()
+_atendendo = False          # esperar() dentro de um quando_mudar não atende de novo
+_callback_firmata = False   # bordas chegam pelo Firmata (senão, comparação de leituras)
+_niveis_lidos: Dict[int, int] = {}
+
+
+def _borda(pino: int, antes: int, agora: int) -> None:
+    """Conta a borda nos quando_mudar do pino (o papel da ISR no sketch)."""
+    if antes == agora:
+        return
+    with _bordas_lock:
+        for q in quandos:
+            if q.pino == pino and (q.borda == "mudanca" or (q.borda == "subida") == bool(agora)):
+                q.pendentes = min(q.pendentes + 1, BORDAS_MAX)
+
+
+def _tirar(q: QuandoMudar) -> bool:
+    with _bordas_lock:
+        if q.pendentes <= 0:
+            return False
+        q.pendentes -= 1
+        return True
+
+
+def _atender_eventos() -> None:
+    """Roda o corpo de cada quando_mudar uma vez por borda pendente, na ordem do programa."""
+    global _atendendo
+    if not quandos or _atendendo:
+        return
+    if _modo_real() and not _callback_firmata:
+        for q in quandos:
+            v = ARD.board.digital[q.pino].read()
+            if v is not None:
+                v = 1 if v else 0
+                _borda(q.pino, _niveis_lidos.get(q.pino, v), v)
+                _niveis_lidos[q.pino] = v
+    _atendendo = True
+    try:
+        for q in quandos:
+            while _tirar(q):
+                _chamar(q.sub, ())
+    finally:
+        _atendendo = False
+
+
+def _esperar_atendendo(ms: int) -> None:
+    """esperar() com quando_mudar: o tempo passa atendendo as bordas (o corpo conta no tempo)."""
+    if RELOGIO:
+        fim = RELOGIO.agora_us + ms * 1000
+        while True:
+            _atender_eventos()
+            if RELOGIO.agora_us >= fim:
+                return
+            proximo = RELOGIO.proximo_estimulo()
+            RELOGIO.avancar((fim if proximo is None else min(fim, proximo)) - RELOGIO.agora_us)
+    fim_s = time.perf_counter() + ms / 1000.0
+    while True:
+        _atender_eventos()
+        resta = fim_s - time.perf_counter()
+        if resta <= 0:
+            return
+        time.sleep(min(resta, ESPERA_FATIA_S))
+
+
+def _ligar_firmata() -> None:
+    """
+    Placa real: as mensagens digitais do Firmata (reporting) passam por _borda antes de
+    atualizar os pinos. Sem isso (versão diferente do pyfirmata), compara leituras.
+    """
+    global _callback_firmata
+    _niveis_lidos.clear()
+    board = ARD.board
+    for q in quandos:
+        try:
+            board.digital[q.pino].enable_reporting()
+        except Exception:
+            pass
+    if getattr(board, "_portuino_bordas", False):
+        _callback_firmata = True
+        return
+    try:
+        from pyfirmata import DIGITAL_MESSAGE
+        original = board._command_handlers[DIGITAL_MESSAGE]
+
+        def mensagem_digital(*args):
+            antes = {q.pino: board.digital[q.pino].value for q in quandos}
+            original(*args)
+            for pino, v in antes.items():
+                agora = board.digital[pino].value
+                if v is not None and agora is not None:
+                    _borda(pino, 1 if v else 0, 1 if agora else 0)
+
+        mensagem_digital.bytes_needed = original.bytes_needed
+        board._command_handlers[DIGITAL_MESSAGE] = mensagem_digital
+        board._portuino_bordas = True
+        _callback_firmata = True
+    except Exception:
+        _callback_firmata = False
+        _log_info("[WARN] Firmata sem callback de mensagem digital: quando_mudar compara leituras.")
+
+
 def interpretar_codigo(codigo: str) -> None:
     """
     Executa um programa Portuino dentro de:
       inicio ... fim
+    (procedimentos e funções ficam antes de 'inicio')
     """
     if ARD.modo == "REAL":
         _log_info(f"[INFO] Arduino REAL conectado em {ARD.porta}")
@@ -468,14 +1037,65 @@ def interpretar_codigo(codigo: str) -> None:
 
     em_execucao = False
     bloco = []
+    antes = []
     for ln in linhas:
-        s = ln.strip()
+        s = _sem_comentario(ln.strip())
         if s == "inicio":
             em_execucao = True
             continue
         if s == "fim":
             break
         if em_execucao:
-            bloco.append(ln)
+            bloco.append(s)
+        else:
+            antes.append(s)
 
+    definir_subrotinas(antes)
+    if quandos and _modo_real():
+        _ligar_firmata()
     interpretar_bloco(bloco)
+
+
+def simular_codigo(
+    codigo: str,
+    limite_ms: float = 10000,
+    estimulos: Optional[List[Tuple[int, str, int, int]]] = None,
+    max_passos: int = 200000,
+) -> RelogioVirtual:
+    """
+    Executa em SIMULAÇÃO com relógio virtual (esperar() não espera de verdade) e devolve o
+    relógio com o trace. Reinicia o estado global; o texto do programa vai só para o trace.
+    estimulos: (t_us, "D" digital | "P" duração do eco, pino, valor).
+    """
+    global ARD, RELOGIO
+    variaveis.clear()
+    tipos_variaveis.clear()
+    _pilha.clear()
+    quandos.clear()
+    pinos_configurados.clear()
+    pinos_sim.clear()
+    relogio = RelogioVirtual(limite_us=int(limite_ms * 1000), estimulos=sorted(estimulos or []),
+                             max_passos=max_passos)
+    ard, ARD = ARD, ArduinoContext(modo="SIMULACAO")
+    RELOGIO = relogio
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            relogio.avancar(0)
+            interpretar_codigo(codigo)
+        relogio.terminou = True
+    except FimSimulacao:
+        pass
+    finally:
+        ARD, RELOGIO = ard, None
+    return relogio
+
+
+if __name__ == "__main__":
+    # Uso: python interpretador_portuino.py programa.ptn
+    import sys
+
+    if len(sys.argv) != 2:
+        print("Uso: python interpretador_portuino.py <arquivo.ptn>", file=sys.stderr)
+        sys.exit(2)
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        interpretar_codigo(f.read())
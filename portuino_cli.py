@@ -0,0 +1,355 @@
+# portuino_cli.py
+# Linha de comando "headless" da Portuino (sem tkinter/PIL): útil para automação de laboratório.
+#
+# Exemplos:
+#   python portuino_cli.py translate exemplos/*.ptn -o build/
+#   python portuino_cli.py --json compile "exemplos/*.ptn" --fqbn arduino:avr:uno
+#   python portuino_cli.py upload exemplos/buzzer.ptn --port /dev/ttyACM0
+#   python portuino_cli.py run exemplos/buzzer.ptn --timeout 30
+#   python portuino_cli.py run exemplos/buzzer.ptn --host --ate 5000
+#   python portuino_cli.py tempo exemplos/*.ptn --alvo todos
+#   python portuino_cli.py --json boards
+#   python portuino_cli.py toolchain export portuino-toolchain.tar.gz
+
+from __future__ import annotations
+
+import os
+import sys
+import glob
+import json
+import hashlib
+import argparse
+import shutil
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List
+
+import portuino_compiler as pc
+import historico_tamanho as ht
+import simulador_host as sh
+import analise_tempo as at
+
+DEFAULT_FQBN = "arduino:avr:uno"
+DEFAULT_BAUD = 9600
+
+# Códigos de saída
+EXIT_OK = 0           # tudo certo
+EXIT_FALHA = 1        # pelo menos um arquivo falhou
+EXIT_USO = 2          # argumentos inválidos / nenhum arquivo encontrado
+EXIT_TOOLCHAIN = 3    # arduino-cli indisponível
+
+
+def _expandir_arquivos(padroes: List[str]) -> List[str]:
+    """Expande globs (também no Windows, onde o shell não expande) mantendo a ordem."""
+    vistos = set()
+    arquivos: List[str] = []
+    for padrao in padroes:
+        encontrados = sorted(glob.glob(padrao, recursive=True)) if glob.has_magic(padrao) else [padrao]
+        for a in encontrados:
+            if os.path.isfile(a) and a not in vistos:
+                vistos.add(a)
+                arquivos.append(a)
+    return arquivos
+
+
+def _ler(arquivo: str) -> str:
+    with open(arquivo, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _nome_sketch(arquivo: str) -> str:
+    base = os.path.splitext(os.path.basename(arquivo))[0]
+    return "".join(c if (c.isalnum() or c == "_") else "_" for c in base) or "portuino_sketch"
+
+
+def _pastas_sketch(arquivos: List[str]) -> Dict[str, str]:
+    """
+    Nome da pasta (e do sketch) de cada arquivo. Nomes repetidos (a/x.ptn e b/x.ptn) ganham um
+    pedaço do hash do caminho: cada arquivo tem sua pasta, sem sobrescrever nem dividir o build.
+    """
+    nomes = {a: _nome_sketch(a) for a in arquivos}
+    contagem: Dict[str, int] = {}
+    for n in nomes.values():
+        contagem[n.lower()] = contagem.get(n.lower(), 0) + 1  # Windows/macOS não diferenciam maiúsculas
+    return {
+        a: n if contagem[n.lower()] == 1 else f"{n}_{hashlib.sha1(os.path.abspath(a).encode('utf-8')).hexdigest()[:8]}"
+        for a, n in nomes.items()
+    }
+
+
+def _paralelo(func: Callable[[str], Dict[str, Any]], arquivos: List[str], jobs: int) -> List[Dict[str, Any]]:
+    """Executa func(arquivo) em paralelo; exceções viram resultados com ok=False."""
+    def seguro(arquivo: str) -> Dict[str, Any]:
+        try:
+            r = func(arquivo)
+            r.setdefault("ok", True)
+        except Exception as e:
+            r = {"ok": False, "erro": str(e)}
+        r["arquivo"] = arquivo
+        return r
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+        return list(ex.map(seguro, arquivos))
+
+
+# ------------------ Subcomandos ------------------
+
+def cmd_translate(args) -> List[Dict[str, Any]]:
+    pastas = _pastas_sketch(args.arquivos)
+
+    def traduzir(arquivo: str) -> Dict[str, Any]:
+        ino = pc.portuino_to_ino(_ler(arquivo), baud=args.baud, nao_bloqueante=args.nao_bloqueante)
+        r: Dict[str, Any] = {}
+        if args.output:
+            destino = os.path.join(args.output, pastas[arquivo], pastas[arquivo] + ".ino")
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            with open(destino, "w", encoding="utf-8") as f:
+                f.write(ino)
+            r["ino"] = destino
+        else:
+            r["codigo"] = ino
+        return r
+
+    return _paralelo(traduzir, args.arquivos, args.jobs)
+
+
+def cmd_compile(args) -> List[Dict[str, Any]]:
+    cfg = pc.BuildConfig(
+        fqbn=args.fqbn, port="?", baud=args.baud, nao_bloqueante=args.nao_bloqueante, perfil=args.perfil
+    )
+    temporaria = not args.output
+    base = args.output or tempfile.mkdtemp(prefix="portuino_cli_")
+    orcamento = ht.Orcamento(flash_pct=args.orcamento_flash, ram_pct=args.orcamento_ram)
+    pastas = _pastas_sketch(args.arquivos)
+
+    def compilar(arquivo: str) -> Dict[str, Any]:
+        # Cada arquivo em sua própria pasta: compilações paralelas não colidem.
+        workdir = os.path.join(base, pastas[arquivo])
+        if temporaria:
+            # Pasta nova a cada execução: os binários vão para o workdir e a pasta de build
+            # (chaveada pelo caminho, nunca reusada) é apagada.
+            try:
+                res = pc.compile_sketch(_ler(arquivo), cfg, workdir=workdir, output_dir=workdir)
+            finally:
+                pc.limpar_build(workdir, cfg.perfil)
+        else:
+            res = pc.compile_sketch(_ler(arquivo), cfg, workdir=workdir)
+        r: Dict[str, Any] = {"build_dir": res.build_dir, "log": res.log}
+        if res.tamanho:
+            r["tamanho"] = asdict(res.tamanho)
+            r["avisos"] = ht.registrar(arquivo, cfg.fqbn, res.tamanho, orcamento, cfg.perfil)
+        return r
+
+    return _paralelo(compilar, args.arquivos, args.jobs)
+
+
+def cmd_upload(args) -> List[Dict[str, Any]]:
+    if args.port:
+        cfg = pc.BuildConfig(
+            fqbn=args.fqbn or DEFAULT_FQBN, port=args.port, baud=args.baud,
+            nao_bloqueante=args.nao_bloqueante, perfil=args.perfil,
+        )
+    else:
+        cfg = pc.auto_detect_port_and_fqbn(prefer_fqbn=args.fqbn or DEFAULT_FQBN)
+        if args.fqbn:
+            cfg.fqbn = args.fqbn
+        cfg.baud = args.baud
+        cfg.nao_bloqueante = args.nao_bloqueante
+        cfg.perfil = args.perfil
+    base = tempfile.mkdtemp(prefix="portuino_cli_")
+    pastas = _pastas_sketch(args.arquivos)
+
+    def enviar(arquivo: str) -> Dict[str, Any]:
+        workdir = os.path.join(base, pastas[arquivo])
+        logs = pc.upload_sketch(_ler(arquivo), cfg, workdir=workdir)
+        return {"porta": cfg.port, "fqbn": cfg.fqbn, "log": logs}
+
+    # Uma placa só: uploads são sempre sequenciais.
+    try:
+        return _paralelo(enviar, args.arquivos, 1)
+    finally:
+        for arquivo in args.arquivos:
+            pc.limpar_build(os.path.join(base, pastas[arquivo]), cfg.perfil)
+        shutil.rmtree(base, ignore_errors=True)
+
+
+def cmd_run(args) -> List[Dict[str, Any]]:
+    if args.host:
+        return _run_host(args)
+    interpretador = os.path.join(os.path.dirname(os.path.abspath(__file__)), "interpretador_portuino.py")
+
+    def executar(arquivo: str) -> Dict[str, Any]:
+        # Processo separado: o interpretador usa estado global e pode rodar para sempre.
+        cmd = [sys.executable, "-u", interpretador, arquivo]
+        try:
+            p = subprocess.run(cmd, capture_output=True, text=True, timeout=args.timeout)
+        except subprocess.TimeoutExpired as e:
+            saida = e.stdout.decode(errors="replace") if isinstance(e.stdout, bytes) else (e.stdout or "")
+            return {"ok": args.allow_timeout, "tempo_esgotado": True, "saida": saida}
+        r: Dict[str, Any] = {"ok": p.returncode == 0, "codigo_saida": p.returncode, "saida": p.stdout}
+        if p.returncode != 0:
+            r["erro"] = p.stderr.strip()
+        return r
+
+    return _paralelo(executar, args.arquivos, args.jobs)
+
+
+def _run_host(args) -> List[Dict[str, Any]]:
+    """Sketch gerado compilado para o PC (simulador_host): relógio virtual, sem placa."""
+    estimulos = sh.ler_estimulos(args.entradas) if args.entradas else []
+
+    def executar(arquivo: str) -> Dict[str, Any]:
+        r = sh.simular(
+            _ler(arquivo), limite_ms=args.ate, estimulos=estimulos,
+            nao_bloqueante=args.nao_bloqueante, timeout=args.timeout,
+        )
+        return {"saida": sh.formatar(r.eventos), "tempo_virtual_ms": r.tempo_us / 1000}
+
+    return _paralelo(executar, args.arquivos, args.jobs)
+
+
+def cmd_tempo(args) -> List[Dict[str, Any]]:
+    """Estimativa estática de tempo (analise_tempo), sem placa nem compilação."""
+    alvos = list(at.ALVOS) if args.alvo == "todos" else [args.alvo]
+
+    def estimar(arquivo: str) -> Dict[str, Any]:
+        codigo = _ler(arquivo)
+        relatorios = [at.estimar(codigo, a, baud=args.baud, nao_bloqueante=args.nao_bloqueante) for a in alvos]
+        return {
+            "saida": "\n\n".join(r.texto() for r in relatorios),
+            "relatorios": [asdict(r) for r in relatorios],
+        }
+
+    return _paralelo(estimar, args.arquivos, args.jobs)
+
+
+def cmd_toolchain(args) -> List[Dict[str, Any]]:
+    if args.acao == "export":
+        return [{"ok": True, "arquivo": pc.exportar_toolchain(args.pacote)}]
+    info = pc.importar_toolchain(args.pacote)
+    return [{"ok": True, "arquivo": args.pacote, "pacote": info}]
+
+
+def cmd_boards(args) -> List[Dict[str, Any]]:
+    placas = pc.listar_todas_placas() if args.all else pc.listar_placas()
+    return [{"ok": True, "placas": [asdict(p) for p in placas]}]
+
+
+# ------------------ Saída ------------------
+
+def _imprimir(comando: str, resultados: List[Dict[str, Any]], como_json: bool) -> None:
+    if como_json:
+        doc = {"comando": comando, "ok": all(r.get("ok") for r in resultados), "resultados": resultados}
+        json.dump(doc, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+        return
+
+    for r in resultados:
+        titulo = r.get("arquivo", comando)
+        estado = "OK" if r.get("ok") else "ERRO"
+        print(f"[{estado}] {titulo}")
+        for chave in ("ino", "build_dir", "porta"):
+            if chave in r:
+                print(f"  {chave}: {r[chave]}")
+        for chave in ("codigo", "saida", "log", "erro"):
+            if r.get(chave):
+                print(r[chave].rstrip())
+        if r.get("tamanho"):
+            print(f"  {pc.Tamanho(**r['tamanho']).resumo()}")
+        for aviso in r.get("avisos", []):
+            print(f"  AVISO: {aviso}")
+        if "placas" in r:
+            print(json.dumps(r["placas"], ensure_ascii=False, indent=2))
+
+
+def _parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="portuino", description="Portuino em linha de comando (sem interface gráfica).")
+    ap.add_argument("--json", action="store_true", help="saída em JSON (para automação)")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="arquivos processados em paralelo")
+    sub = ap.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("translate", help="traduz .ptn para .ino")
+    p.add_argument("arquivos", nargs="+", help="arquivos .ptn ou globs (ex.: 'exemplos/*.ptn')")
+    p.add_argument("-o", "--output", help="pasta de saída (um sketch por arquivo)")
+    p.add_argument("--baud", type=int, default=DEFAULT_BAUD)
+    p.add_argument("--nao-bloqueante", action="store_true", help="esperar() com millis(); laços infinitos em paralelo")
+    p.set_defaults(func=cmd_translate, precisa_cli=False)
+
+    p = sub.add_parser("compile", help="traduz e compila com arduino-cli")
+    p.add_argument("arquivos", nargs="+")
+    p.add_argument("--fqbn", default=DEFAULT_FQBN)
+    p.add_argument("--baud", type=int, default=DEFAULT_BAUD)
+    p.add_argument("--nao-bloqueante", action="store_true", help="esperar() com millis(); laços infinitos em paralelo")
+    p.add_argument("--perfil", choices=list(pc.PERFIS), default="padrao", help="flags do compilador")
+    p.add_argument("-o", "--output", help="pasta base dos sketches gerados")
+    p.add_argument("--orcamento-flash", type=float, default=ht.Orcamento.flash_pct, help="aviso acima de X%% da flash")
+    p.add_argument("--orcamento-ram", type=float, default=ht.Orcamento.ram_pct, help="aviso acima de X%% da RAM")
+    p.set_defaults(func=cmd_compile, precisa_cli=True)
+
+    p = sub.add_parser("upload", help="compila e envia para a placa")
+    p.add_argument("arquivos", nargs="+")
+    p.add_argument("--port", help="porta (padrão: detecção automática)")
+    p.add_argument("--fqbn")
+    p.add_argument("--baud", type=int, default=DEFAULT_BAUD)
+    p.add_argument("--nao-bloqueante", action="store_true", help="esperar() com millis(); laços infinitos em paralelo")
+    p.add_argument("--perfil", choices=list(pc.PERFIS), default="padrao", help="flags do compilador")
+    p.set_defaults(func=cmd_upload, precisa_cli=True)
+
+    p = sub.add_parser("run", help="executa no interpretador (Firmata ou simulação)")
+    p.add_argument("arquivos", nargs="+")
+    p.add_argument("--timeout", type=float, default=60.0, help="segundos por arquivo")
+    p.add_argument("--allow-timeout", action="store_true", help="tempo esgotado não conta como falha")
+    p.add_argument("--host", action="store_true", help="compila o sketch gerado para o PC (g++) em vez do interpretador")
+    p.add_argument("--ate", type=int, default=10000, help="com --host: tempo virtual simulado (ms)")
+    p.add_argument("--entradas", help="com --host: arquivo de estímulos ('t_ms pino valor' por linha)")
+    p.add_argument("--nao-bloqueante", action="store_true", help="com --host: esperar() com millis()")
+    p.set_defaults(func=cmd_run, precisa_cli=False)
+
+    p = sub.add_parser("tempo", help="estima período do laço, latência e pontos que bloqueiam (sem rodar)")
+    p.add_argument("arquivos", nargs="+")
+    p.add_argument("--alvo", choices=list(at.ALVOS) + ["todos"], default="avr", help="modelo de custo")
+    p.add_argument("--baud", type=int, default=DEFAULT_BAUD)
+    p.add_argument("--nao-bloqueante", action="store_true", help="esperar() com millis(); laços infinitos em paralelo")
+    p.set_defaults(func=cmd_tempo, precisa_cli=False)
+
+    p = sub.add_parser("boards", help="lista placas conectadas (ou todas, com --all)")
+    p.add_argument("--all", action="store_true")
+    p.set_defaults(func=cmd_boards, precisa_cli=True, arquivos=None)
+
+    p = sub.add_parser("toolchain", help="exporta/importa arduino-cli + cores (uso offline)")
+    p.add_argument("acao", choices=["export", "import"])
+    p.add_argument("pacote", help="arquivo .tar.gz")
+    p.set_defaults(func=cmd_toolchain, precisa_cli=False, arquivos=None)
+
+    return ap
+
+
+def main(argv=None) -> int:
+    args = _parser().parse_args(argv)
+
+    if args.arquivos is not None:
+        padroes = args.arquivos
+        args.arquivos = _expandir_arquivos(padroes)
+        if not args.arquivos:
+            print(f"Nenhum arquivo encontrado: {' '.join(padroes)}", file=sys.stderr)
+            return EXIT_USO
+
+    if args.precisa_cli:
+        try:
+            pc.ensure_arduino_cli()
+        except Exception as e:
+            _imprimir(args.comando, [{"ok": False, "erro": str(e)}], args.json)
+            return EXIT_TOOLCHAIN
+
+    try:
+        resultados = args.func(args)
+    except Exception as e:
+        resultados = [{"ok": False, "erro": str(e)}]
+    _imprimir(args.comando, resultados, args.json)
+    return EXIT_OK if all(r.get("ok") for r in resultados) else EXIT_FALHA
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,31 @@
 import os
 import re
-import sys
 import json
-import stat
 import shutil
+import signal
+import hashlib
 import subprocess
 import tempfile
 import platform
-import zipfile
-import tarfile
-import urllib.request
+import threading
+import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Optional, Tuple, List
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, List
+
+import arduino_cli_manager as acm
+from tradutor_portuino import ErroTraducao, SketchGerado, traduzir, portuino_to_ino  # noqa: F401 (API pública)
 
 # ======================================================================================
 # Arduino CLI bootstrap
 # Objetivo: o usuário NÃO precisa instalar o arduino-cli previamente.
-# Estratégia:
+# Estratégia (implementada em arduino_cli_manager.ensure_cli):
 # 1) Se existir um arduino-cli "embutido" (empacotado junto do executável), usa ele.
 # 2) Senão, tenta encontrar no PATH.
 # 3) Senão, baixa automaticamente o binário (1ª execução) para um cache do usuário.
+# A escolha (caminho, versão, mtime) fica num manifesto em disco: nas próximas execuções
+# basta um stat para validá-la, sem sondar caminhos nem acessar a rede.
 #
 # Observação:
 # - Para compilar/enviar para a placa, o Arduino CLI pode precisar baixar o "core" (ex: arduino:avr).
@@ -29,428 +35,528 @@ from typing import Optional, Tuple, List
 def _is_windows() -> bool:
     return platform.system().lower().startswith("win")
 
-def _cache_dir() -> str:
+def _cache_base() -> str:
     if _is_windows():
         base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
     else:
         base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
-    d = os.path.join(base, "Portuino", "tools")
+    d = os.path.join(base, "Portuino")
     os.makedirs(d, exist_ok=True)
     return d
 
-def _candidate_bundled_paths() -> List[str]:
-    exe_name = "arduino-cli.exe" if _is_windows() else "arduino-cli"
-    candidates: List[str] = []
-
-    # PyInstaller: onefile/onefolder expõe sys._MEIPASS
-    meipass = getattr(sys, "_MEIPASS", None)
-    if meipass:
-        candidates.append(os.path.join(meipass, "tools", "arduino-cli", exe_name))
-        candidates.append(os.path.join(meipass, exe_name))
-
-    # Ao lado do executável (onefolder)
-    exe_dir = os.path.dirname(getattr(sys, "executable", "") or "")
-    if exe_dir:
-        candidates.append(os.path.join(exe_dir, "tools", "arduino-cli", exe_name))
-        candidates.append(os.path.join(exe_dir, exe_name))
-
-    # Em modo "python puro", ao lado deste arquivo
-    here = os.path.dirname(os.path.abspath(__file__))
-    candidates.append(os.path.join(here, "tools", "arduino-cli", exe_name))
-    candidates.append(os.path.join(here, exe_name))
-
-    return candidates
-
-def _ensure_executable(path: str) -> None:
-    if _is_windows():
-        return
-    try:
-        st = os.stat(path)
-        os.chmod(path, st.st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
-    except Exception:
-        pass
-
-def _download(url: str, dst: str) -> None:
-    os.makedirs(os.path.dirname(dst), exist_ok=True)
-    req = urllib.request.Request(
-        url,
-        headers={"User-Agent": "PortuinoIDE/1.0 (arduino-cli bootstrap)"},
-    )
-    with urllib.request.urlopen(req) as r, open(dst, "wb") as f:
-        f.write(r.read())
-
-def _select_asset_url(release_json: dict) -> Tuple[str, str]:
-    """Retorna (url, filename) do asset do arduino-cli compatível com o SO."""
-    assets = release_json.get("assets") or []
-    sysname = platform.system().lower()
-    arch = platform.machine().lower()
-
-    # Normaliza arch mais comum
-    arch64 = arch in ("amd64", "x86_64", "x64")
-
-    if sysname.startswith("win"):
-        patterns = ["Windows_64bit.zip", "windows_amd64.zip", "windows_x86_64.zip"]
-    elif sysname.startswith("linux"):
-        patterns = ["Linux_64bit.tar.gz", "linux_amd64.tar.gz", "linux_x86_64.tar.gz"]
-    else:
-        raise RuntimeError(f"Sistema operacional não suportado para bootstrap automático: {platform.system()}")
-
-    if not arch64:
-        raise RuntimeError(f"Arquitetura não suportada para bootstrap automático: {platform.machine()}")
-
-    for a in assets:
-        name = a.get("name", "")
-        for p in patterns:
-            if p.lower() in name.lower():
-                return a.get("browser_download_url", ""), name
-
-    # fallback: tenta qualquer asset que contenha Windows/Linux e 64bit
-    for a in assets:
-        name = (a.get("name") or "").lower()
-        if ("windows" in name or "linux" in name) and ("64" in name) and (name.endswith(".zip") or name.endswith(".tar.gz")):
-            return a.get("browser_download_url", ""), a.get("name", "")
-
-    raise RuntimeError("Não encontrei um asset compatível do Arduino CLI no release latest.")
-
-def _download_and_extract_arduino_cli() -> str:
-    cache = _cache_dir()
-    api_url = "https://api.github.com/repos/arduino/arduino-cli/releases/latest"
-
-    req = urllib.request.Request(api_url, headers={"User-Agent": "PortuinoIDE/1.0"})
-    with urllib.request.urlopen(req) as r:
-        release = json.loads(r.read().decode("utf-8"))
-
-    url, fname = _select_asset_url(release)
-    if not url:
-        raise RuntimeError("Release latest encontrado, mas URL de download vazia.")
-
-    pkg_path = os.path.join(cache, fname)
-    if not os.path.exists(pkg_path):
-        _download(url, pkg_path)
-
-    extract_dir = os.path.join(cache, "arduino-cli")
-    os.makedirs(extract_dir, exist_ok=True)
-
-    if fname.lower().endswith(".zip"):
-        with zipfile.ZipFile(pkg_path, "r") as z:
-            z.extractall(extract_dir)
-    elif fname.lower().endswith(".tar.gz"):
-        with tarfile.open(pkg_path, "r:gz") as t:
-            t.extractall(extract_dir)
-    else:
-        raise RuntimeError(f"Formato de pacote não suportado: {fname}")
-
-    exe_name = "arduino-cli.exe" if _is_windows() else "arduino-cli"
-
-    # Procura o executável extraído em subpastas
-    for root, _, files in os.walk(extract_dir):
-        if exe_name in files:
-            cli = os.path.join(root, exe_name)
-            _ensure_executable(cli)
-            return cli
-
-    raise RuntimeError("Baixei e extraí o Arduino CLI, mas não encontrei o executável.")
-
 _ARDUINO_CLI_PATH: Optional[str] = None
 
-def ensure_arduino_cli() -> str:
-    """Garante um caminho executável para arduino-cli e retorna esse caminho."""
+def ensure_arduino_cli(progress: Optional[acm.Progress] = None) -> str:
+    """
+    Garante um caminho executável para arduino-cli e retorna esse caminho.
+    A resolução (e o manifesto em disco que a memoriza entre execuções) fica em
+    arduino_cli_manager.ensure_cli. progress(baixados, total) acompanha o download da 1ª execução.
+    """
     global _ARDUINO_CLI_PATH
     if _ARDUINO_CLI_PATH and os.path.exists(_ARDUINO_CLI_PATH):
         return _ARDUINO_CLI_PATH
 
-    # 0) override explícito (útil em depuração)
-    override = os.environ.get("PORTUINO_ARDUINO_CLI")
-    if override and os.path.exists(override):
-        _ensure_executable(override)
-        _ARDUINO_CLI_PATH = override
-        return override
-
-    # 1) embutido (no bundle)
-    for p in _candidate_bundled_paths():
-        if os.path.exists(p):
-            _ensure_executable(p)
-            _ARDUINO_CLI_PATH = p
-            return p
-
-    # 2) PATH
-    which = shutil.which("arduino-cli")
-    if which:
-        _ARDUINO_CLI_PATH = which
-        return which
-
-    # 3) download 1ª execução
     try:
-        _ARDUINO_CLI_PATH = _download_and_extract_arduino_cli()
+        _ARDUINO_CLI_PATH = str(acm.ensure_cli(progress=progress))
         return _ARDUINO_CLI_PATH
     except Exception as e:
         raise RuntimeError(
-            "Não encontrei o Arduino CLI.
-"
-            "Tentei: (1) embutido no executável, (2) PATH, (3) download automático.
-
-"
-            f"Falha no download automático: {e}
-
-"
-            "Alternativas:
-"
-            "- Instale o Arduino CLI manualmente e reabra a Portuino IDE.
-"
+            "Não encontrei o Arduino CLI.\n"
+            "Tentei: (1) embutido no executável, (2) PATH, (3) download automático.\n\n"
+            f"Falha no download automático: {e}\n\n"
+            "Alternativas:\n"
+            "- Instale o Arduino CLI manualmente e reabra a Portuino IDE.\n"
             "- Ou defina a variável de ambiente PORTUINO_ARDUINO_CLI apontando para o executável."
         )
 
-def _run(cmd: List[str]) -> Tuple[int, str]:
-    """Executa comando retornando (code, stdout+stderr). Substitui arduino-cli pelo caminho detectado."""
-    if cmd and cmd[0] == "arduino-cli":
-        cmd = [ensure_arduino_cli()] + cmd[1:]
+_CONFIG_FILE: Optional[str] = None
+
+def _config_file() -> str:
+    """arduino-cli.yaml isolado da Portuino (pastas data/downloads/user próprias)."""
+    global _CONFIG_FILE
+    if not _CONFIG_FILE:
+        _CONFIG_FILE = str(acm.ensure_cli_config())
+    return _CONFIG_FILE
+
+# Quantas linhas de saída guardamos para mensagens de erro (o resto já foi transmitido via on_line)
+_MAX_LINHAS_LOG = 2000
+
+class OperacaoCancelada(RuntimeError):
+    pass
+
+class ErroArduinoCli(RuntimeError):
+    """Falha do arduino-cli. `saida` guarda o log (que pode já ter sido exibido linha a linha)."""
+    def __init__(self, titulo: str, saida: str):
+        super().__init__(titulo + "\n" + saida)
+        self.titulo = titulo
+        self.saida = saida
+
+class Cancelamento:
+    """Permite que outra thread (ex.: botão Cancelar da IDE) termine o processo em andamento."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+        self.cancelado = False
+
+    def cancelar(self) -> None:
+        with self._lock:
+            self.cancelado = True
+            if self._proc and self._proc.poll() is None:
+                _terminar_arvore(self._proc)
+
+    def _registrar(self, proc: Optional[subprocess.Popen]) -> None:
+        with self._lock:
+            self._proc = proc
+            if proc and self.cancelado:
+                _terminar_arvore(proc)
+
+def _terminar_arvore(proc: subprocess.Popen) -> None:
+    """Termina o processo e seus filhos (arduino-cli dispara gcc/avrdude que seguram o pipe)."""
+    try:
+        if _is_windows():
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)], capture_output=True)
+        else:
+            os.killpg(proc.pid, signal.SIGTERM)
+    except Exception:
+        proc.terminate()
+
+def _run(
+    cmd: List[str],
+    on_line: Optional[Callable[[str], None]] = None,
+    cancel: Optional[Cancelamento] = None,
+) -> Tuple[int, str]:
+    """
+    Executa comando retornando (code, stdout+stderr). Substitui arduino-cli pelo caminho detectado.
 
-    p = subprocess.run(cmd, capture_output=True, text=True, shell=False)
-    out = (p.stdout or "") + (p.stderr or "")
-    return p.returncode, out
+    A saída é lida linha a linha: on_line recebe cada linha com o tempo decorrido
+    (ex.: "[  12.3s] Compiling core...") assim que ela é produzida.
+    """
+    if cmd and cmd[0] == "arduino-cli":
+        cmd = [ensure_arduino_cli(), "--config-file", _config_file()] + cmd[1:]
+    if cancel and cancel.cancelado:
+        raise OperacaoCancelada("Operação cancelada.")
+
+    t0 = time.monotonic()
+    linhas: deque = deque(maxlen=_MAX_LINHAS_LOG)
+    p = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        bufsize=1,
+        shell=False,
+        # grupo próprio: o cancelamento alcança os processos filhos
+        start_new_session=not _is_windows(),
+    )
+    if cancel:
+        cancel._registrar(p)
+    try:
+        for linha in p.stdout:
+            linha = linha.rstrip("\r\n")
+            linhas.append(linha)
+            if on_line:
+                on_line(f"[{time.monotonic() - t0:7.1f}s] {linha}")
+        code = p.wait()
+    finally:
+        if p.stdout:
+            p.stdout.close()
+        if cancel:
+            cancel._registrar(None)
+
+    if cancel and cancel.cancelado:
+        raise OperacaoCancelada("Operação cancelada.")
+    return code, "\n".join(linhas)
 
 @dataclass
 class BuildConfig:
     fqbn: str               # ex: "arduino:avr:uno"
     port: str               # ex: "COM3" ou "/dev/ttyACM0"
     baud: int = 9600
+    nao_bloqueante: bool = False  # esperar() com millis(); cada "enquanto (verdadeiro)" vira tarefa
+    perfil: str = "padrao"        # veja PERFIS
+    estrito: bool = False         # recusa C++ direto/#include (servidor de compilação)
+
+# ------------------ Perfis de compilação ------------------
+# Flags extras do GCC passadas com --build-property. Nos cores (platform.txt) os
+# *.extra_flags vêm depois das flags padrão, então o -O do perfil prevalece.
+# Boards que já definem compiler.*.extra_flags perdem esse valor com perfis != "padrao".
+
+PERFIS: Dict[str, Dict[str, str]] = {
+    "padrao": {},                                  # o que o core define (AVR: -Os)
+    "tamanho": {"compiler.c.extra_flags": "-Os", "compiler.cpp.extra_flags": "-Os",
+                "compiler.c.elf.extra_flags": "-Os"},
+    "velocidade": {"compiler.c.extra_flags": "-O2", "compiler.cpp.extra_flags": "-O2",
+                   "compiler.c.elf.extra_flags": "-O2"},
+    "depuracao": {"compiler.c.extra_flags": "-Og -g", "compiler.cpp.extra_flags": "-Og -g",
+                  "compiler.c.elf.extra_flags": "-Og -g"},
+}
+
+def _args_perfil(perfil: str) -> List[str]:
+    if perfil not in PERFIS:
+        raise ErroArduinoCli("Perfil de compilação desconhecido:", f"{perfil} (use: {', '.join(PERFIS)})")
+    args: List[str] = []
+    for prop, valor in PERFIS[perfil].items():
+        args += ["--build-property", f"{prop}={valor}"]
+    return args
+
+def _pasta_build(workdir: str, perfil: str) -> str:
+    """
+    Pasta de build por sketch e perfil: trocar de perfil não invalida os objetos do outro
+    (o arduino-cli recompila tudo quando as opções de build mudam na mesma pasta).
+    """
+    h = hashlib.sha1(os.path.abspath(workdir).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(_cache_base(), "build", perfil, h)
+
+def limpar_build(workdir: str, perfil: str = "padrao") -> None:
+    """
+    Apaga a pasta de build do sketch em workdir. Quem compila em pastas temporárias
+    (servidor, CLI) chama isto ao apagar a pasta: a chave é o caminho, que não se repete.
+    """
+    shutil.rmtree(_pasta_build(workdir, perfil), ignore_errors=True)
+
+# ------------------ Placas e portas (arduino-cli --format json) ------------------
+
+@dataclass
+class PlacaDetectada:
+    port: str               # ex: "COM3" ou "/dev/ttyACM0"
+    protocol: str = ""      # ex: "serial", "network"
+    fqbn: str = ""          # vazio se o arduino-cli não reconheceu a placa
+    name: str = ""
+    vid: str = ""           # ex: "0x2341"
+    pid: str = ""
+    label: str = ""
+
+@dataclass
+class PlacaCatalogo:
+    name: str
+    fqbn: str
+
+# Cache das consultas ao arduino-cli: {args: (instante, resultado)}
+_CACHE_CLI: Dict[Tuple[str, ...], Tuple[float, Any]] = {}
+_CACHE_LOCKS: Dict[Tuple[str, ...], threading.Lock] = {}
+_CACHE_LOCK = threading.Lock()
+
+TTL_PORTAS = 3.0        # portas mudam quando a placa é (des)conectada
+TTL_CATALOGO = 300.0    # catálogo só muda quando um core é instalado
+
+def _run_json(args: List[str], ttl: float) -> Any:
+    """
+    Executa `arduino-cli <args> --format json` e devolve o JSON.
+    Chamadas simultâneas com os mesmos args esperam a mesma execução (um único processo).
+    """
+    chave = tuple(args)
+    with _CACHE_LOCK:
+        lock = _CACHE_LOCKS.setdefault(chave, threading.Lock())
+    with lock:
+        hit = _CACHE_CLI.get(chave)
+        if hit and (time.monotonic() - hit[0]) < ttl:
+            return hit[1]
+        code, out = _run(["arduino-cli"] + list(args) + ["--format", "json"])
+        if code != 0:
+            raise RuntimeError(f"Falha em `arduino-cli {' '.join(args)}`:\n" + out)
+        try:
+            doc = json.loads(out)
+        except ValueError:
+            raise RuntimeError(f"Resposta inesperada de `arduino-cli {' '.join(args)}`:\n" + out)
+        _CACHE_CLI[chave] = (time.monotonic(), doc)
+        return doc
+
+def invalidar_cache_placas() -> None:
+    with _CACHE_LOCK:
+        _CACHE_CLI.clear()
+
+
+# ------------------ Core da placa / aquecimento ------------------
+
+_CORES_OK: set = set()              # plataformas já confirmadas nesta execução
+_CORE_LOCK = threading.Lock()       # uma instalação de core por vez
+
+def _plataforma(fqbn: str) -> str:
+    """'arduino:avr:uno' -> 'arduino:avr'."""
+    partes = fqbn.split(":")
+    if len(partes) < 3 or not all(partes[:2]):
+        raise RuntimeError(f"FQBN inválido: {fqbn!r} (esperado fabricante:arquitetura:placa)")
+    return ":".join(partes[:2])
+
+def garantir_core(
+    fqbn: str,
+    on_line: Optional[Callable[[str], None]] = None,
+    etapa: Optional[Callable[[str], None]] = None,
+    cancel: Optional[Cancelamento] = None,
+) -> None:
+    """
+    Instala o core da placa (ex.: arduino:avr) se ainda não estiver instalado.
+    Chamadas simultâneas esperam a mesma instalação. cancel interrompe o download.
+    """
+    plataforma = _plataforma(fqbn)
+    if plataforma in _CORES_OK:
+        return
+    with _CORE_LOCK:
+        if plataforma in _CORES_OK:
+            return
+        doc = _run_json(["core", "list"], TTL_CATALOGO)
+        plataformas = doc.get("platforms", []) if isinstance(doc, dict) else (doc or [])
+        if not any(p.get("id") == plataforma for p in plataformas):
+            if etapa:
+                etapa("Atualizando índice de placas...")
+            code, out = _run(["arduino-cli", "core", "update-index"], on_line=on_line, cancel=cancel)
+            if code != 0:
+                raise ErroArduinoCli("Erro ao atualizar o índice de placas:", out)
+            if etapa:
+                etapa(f"Instalando core {plataforma} (só na primeira vez)...")
+            code, out = _run(["arduino-cli", "core", "install", plataforma], on_line=on_line, cancel=cancel)
+            if code != 0:
+                raise ErroArduinoCli(f"Erro ao instalar o core {plataforma}:", out)
+            invalidar_cache_placas()  # catálogo de placas mudou
+        _CORES_OK.add(plataforma)
+
+def aquecer_toolchain(
+    fqbn: str,
+    etapa: Optional[Callable[[str], None]] = None,
+    cancel: Optional[Cancelamento] = None,
+    perfil: str = "padrao",
+) -> None:
+    """
+    Deixa a 1ª compilação do aluno tão rápida quanto as seguintes:
+    resolve o arduino-cli, garante o core da placa e compila um sketch vazio,
+    o que grava o core.a da placa no cache compartilhado (build_cache).
+    """
+    if etapa:
+        etapa("Preparando arduino-cli...")
+    ensure_arduino_cli()
+    garantir_core(fqbn, etapa=etapa, cancel=cancel)
+    if etapa:
+        etapa(f"Pré-compilando o core de {fqbn}...")
+    workdir = os.path.join(_cache_base(), "aquecimento", "portuino_aquecimento")
+    compile_sketch("inicio\nfim\n", BuildConfig(fqbn=fqbn, port="?", perfil=perfil), workdir=workdir, cancel=cancel)
+
+
+# ------------------ Toolchain offline ------------------
+
+def exportar_toolchain(destino: str, progress: Optional[acm.Progress] = None) -> str:
+    """Empacota arduino-cli + cores instalados (pasta isolada) em um .tar.gz."""
+    return str(acm.export_toolchain_bundle(Path(destino), progress=progress))
+
+
+def importar_toolchain(arquivo: str, progress: Optional[acm.Progress] = None) -> dict:
+    """Provisiona este PC a partir de um pacote exportado, sem internet."""
+    global _ARDUINO_CLI_PATH
+    info = acm.import_toolchain_bundle(Path(arquivo), progress=progress)
+    _ARDUINO_CLI_PATH = None  # o pacote pode ter trazido outro arduino-cli
+    _CORES_OK.clear()
+    invalidar_cache_placas()
+    return info
+
+def listar_placas(ttl: float = TTL_PORTAS) -> List[PlacaDetectada]:
+    """Todas as portas detectadas (uma entrada por placa reconhecida; porta sem placa vem com fqbn vazio)."""
+    doc = _run_json(["board", "list"], ttl)
+    # arduino-cli >= 0.35: {"detected_ports": [...]}; versões antigas: lista direta
+    itens = doc.get("detected_ports", []) if isinstance(doc, dict) else (doc or [])
+
+    placas: List[PlacaDetectada] = []
+    for item in itens:
+        porta = item.get("port") or {}
+        props = porta.get("properties") or {}
+        base = dict(
+            port=porta.get("address", ""),
+            protocol=porta.get("protocol", ""),
+            vid=props.get("vid", ""),
+            pid=props.get("pid", ""),
+            label=porta.get("label", ""),
+        )
+        if not base["port"]:
+            continue
+        boards = item.get("matching_boards") or item.get("boards") or []
+        if not boards:
+            placas.append(PlacaDetectada(**base))
+        for b in boards:
+            placas.append(PlacaDetectada(fqbn=b.get("fqbn", ""), name=b.get("name", ""), **base))
+    return placas
+
+def listar_todas_placas(ttl: float = TTL_CATALOGO) -> List[PlacaCatalogo]:
+    """Catálogo completo (`board listall`) dos cores instalados."""
+    doc = _run_json(["board", "listall"], ttl)
+    boards = doc.get("boards", []) if isinstance(doc, dict) else (doc or [])
+    return [PlacaCatalogo(name=b.get("name", ""), fqbn=b.get("fqbn", "")) for b in boards if b.get("fqbn")]
 
 def list_ports_cli() -> str:
-    code, out = _run(["arduino-cli", "board", "list"])
-    return out
+    """Tabela legível das portas/placas detectadas."""
+    placas = listar_placas()
+    if not placas:
+        return "Nenhuma porta detectada."
+    linhas = []
+    for p in placas:
+        usb = f" [{p.vid}:{p.pid}]" if p.vid else ""
+        linhas.append(f"{p.port} ({p.protocol}){usb}  {p.name or 'Desconhecida'}  {p.fqbn}".rstrip())
+    return "\n".join(linhas)
 
 def auto_detect_port_and_fqbn(prefer_fqbn: str = "arduino:avr:uno") -> BuildConfig:
     """
-    Tenta detectar porta e FQBN via `arduino-cli board list`.
+    Tenta detectar porta e FQBN via `arduino-cli board list --format json`.
+    Preferência: placa reconhecida > porta serial USB > qualquer porta serial.
     Se não achar FQBN, usa prefer_fqbn.
     """
     _ = ensure_arduino_cli()
-    code, out = _run(["arduino-cli", "board", "list"])
-    if code != 0:
-        raise RuntimeError("Falha ao listar placas/portas:\n" + out)
+    placas = listar_placas()
 
-    # Heurística: pega a primeira linha com uma porta COMx ou /dev/tty*
-    lines = [ln.strip() for ln in out.splitlines() if ln.strip()]
-    port = None
-    fqbn = None
+    escolha = next((p for p in placas if p.fqbn), None)
+    if not escolha:
+        escolha = next((p for p in placas if p.protocol == "serial" and p.vid), None)
+    if not escolha:
+        escolha = next((p for p in placas if p.protocol == "serial"), None)
 
-    for ln in lines:
-        if ln.lower().startswith("port"):
-            continue
-        m = re.search(r"\b(COM\d+)\b", ln)
-        if not m:
-            m = re.search(r"(/dev/tty\w+)", ln)
-        if m:
-            port = m.group(1)
-            m2 = re.search(r"\b([a-z0-9_]+:[a-z0-9_]+:[a-z0-9_]+)\b", ln)
-            if m2:
-                fqbn = m2.group(1)
-            break
-
-    if not port:
+    if not escolha:
         raise RuntimeError(
             "Não encontrei porta automaticamente.\n"
-            "Conecte a placa e confirme a porta na Arduino IDE ou execute `arduino-cli board list`.\n\n"
-            + out
+            "Conecte a placa e confirme a porta na Arduino IDE ou execute `arduino-cli board list`."
         )
 
-    return BuildConfig(fqbn=fqbn or prefer_fqbn, port=port)
+    return BuildConfig(fqbn=escolha.fqbn or prefer_fqbn, port=escolha.port)
 
 # ------------------ PORTUINO -> ARDUINO (.ino) ------------------
+# A tradução fica em tradutor_portuino; aqui, os diagnósticos do compilador.
 
-def _to_cpp_expr(expr: str) -> str:
-    """
-    Converte coisas simples:
-    - verdadeiro/falso -> true/false
-    - concatenação com + em escrever(...) -> String(...)
-    """
-    expr = expr.strip()
-    expr = expr.replace("verdadeiro", "true").replace("falso", "false")
-
-    # Se tem aspas ou +, gera concat String
-    if "+" in expr:
-        parts = [p.strip() for p in expr.split("+")]
-        cpp_parts = []
-        for p in parts:
-            if p.startswith('"') and p.endswith('"'):
-                cpp_parts.append(p)
-            elif re.fullmatch(r"\d+(\.\d+)?", p):
-                cpp_parts.append(f"String({p})")
-            else:
-                cpp_parts.append(f"String({p})")
-        return " + ".join(cpp_parts)
-
-    return expr
-
-def portuino_to_ino(code_ptn: str, baud: int = 9600) -> str:
-    """
-    Tradutor simples (educacional) Portuino -> Arduino C++.
-    Regras suportadas:
-    - inteiro/real/logico/texto
-    - x <- expr
-    - se(...) entao / senao / fim_se
-    - enquanto(...) faca / fim_enquanto
-    - para i de A ate B passo P / fim_para
-    - configurar_saida(p), configurar_entrada(p)
-    - ligar(p), desligar(p), esperar(ms), ler(p)
-    - medir_distancia(trig, echo)
-    - escrever(...)
-    """
-    lines = [ln.rstrip() for ln in code_ptn.splitlines()]
-    in_prog = False
-    body = []
-
-    for ln in lines:
-        s = ln.strip()
-        if s == "inicio":
-            in_prog = True
-            continue
-        if s == "fim":
-            break
-        if in_prog:
-            if not s or s.startswith("//"):
-                continue
-            body.append(s)
-
-    # Coleta declarações (bem simples)
-    decls = []
-    stmts = []
-
-    type_map = {"inteiro": "int", "real": "float", "logico": "bool", "texto": "String"}
-
-    for s in body:
-        m = re.match(r"^(inteiro|real|logico|texto)\s+(\w+)\s*<-\s*(.+)$", s)
-        if m:
-            t, var, val = m.group(1), m.group(2), m.group(3)
-            decls.append(f"{type_map[t]} {var} = {_to_cpp_expr(val)};")
-        else:
-            stmts.append(s)
-
-    def tr(s: str) -> str:
-        # atribuição
-        m = re.match(r"^(\w+)\s*<-\s*(.+)$", s)
-        if m:
-            return f"{m.group(1)} = {_to_cpp_expr(m.group(2))};"
-
-        # controle
-        m = re.match(r"^se\s*\((.*)\)\s*entao$", s)
-        if m:
-            return f"if ({_to_cpp_expr(m.group(1))}) {{"
-
-        if s == "senao":
-            return "} else {"
-
-        if s == "fim_se":
-            return "}"
-
-        m = re.match(r"^enquanto\s*\((.*)\)\s*faca$", s)
-        if m:
-            return f"while ({_to_cpp_expr(m.group(1))}) {{"
-
-        if s == "fim_enquanto":
-            return "}"
-
-        m = re.match(r"^para\s+(\w+)\s+de\s+(.*)\s+ate\s+(.*)\s+passo\s+(.*)$", s)
-        if m:
-            var, a, b, p = m.group(1), m.group(2), m.group(3), m.group(4)
-            a, b, p = _to_cpp_expr(a), _to_cpp_expr(b), _to_cpp_expr(p)
-            return f"for (int {var} = {a}; {var} <= {b}; {var} += {p}) {{"
-
-
-
-        if s == "fim_para":
-            return "}"
-
-        # funções arduino
-        m = re.match(r"^configurar_saida\((.*)\)$", s)
-        if m:
-            return f"pinMode({m.group(1)}, OUTPUT);"
-
-        m = re.match(r"^configurar_entrada\((.*)\)$", s)
-        if m:
-            return f"pinMode({m.group(1)}, INPUT);"
-
-        m = re.match(r"^ligar\((.*)\)$", s)
-        if m:
-            return f"digitalWrite({m.group(1)}, HIGH);"
-
-        m = re.match(r"^desligar\((.*)\)$", s)
-        if m:
-            return f"digitalWrite({m.group(1)}, LOW);"
-
-        m = re.match(r"^esperar\((.*)\)$", s)
-        if m:
-            return f"delay((int)({_to_cpp_expr(m.group(1))}));"
-
-        m = re.match(r"^escrever\((.*)\)$", s)
-        if m:
-            expr = _to_cpp_expr(m.group(1))
-            return f"Serial.println({expr});"
-
-        # fallback: permite escrever C++ direto (educacional avançado)
-        return s + (";" if not s.endswith((";", "{", "}")) else "")
-
-    translated = [tr(s) for s in stmts]
-
-    # adiciona biblioteca runtime do ultrassom:
-    runtime = f"""
-/*
-  Sketch gerado pela Portuino IDE
-*/
-long medir_distancia(int trig, int echo) {{
-  digitalWrite(trig, LOW);
-  delayMicroseconds(2);
-  digitalWrite(trig, HIGH);
-  delayMicroseconds(10);
-  digitalWrite(trig, LOW);
-  long dur = pulseIn(echo, HIGH, 30000); // timeout ~30ms
-  long cm = dur / 58; // aproximação
-  return cm;
-}}
-"""
-
-    ino = f"""
-{runtime}
-
-void setup() {{
-  Serial.begin({baud});
-}}
-
-void loop() {{
-  // Declarações (re-inicializam a cada loop; educativo)
-  {' '.join(decls)}
-
-  // Código Portuino
-  {os.linesep.join(translated)}
-}}
-""".strip() + "\n"
-
-    return ino
-
-def compile_sketch(code_ptn: str, cfg: BuildConfig) -> Tuple[str, str]:
+@dataclass
+class Diagnostico:
+    linha: int      # linha no programa Portuino (editor), a partir de 1
+    tipo: str       # "erro" | "aviso" | "nota"
+    mensagem: str
+
+_DIAG_PTN_RE = re.compile(r"^(?:\[\s*[\d.]+s\] )?Linha (\d+): (erro|aviso|nota): (.*)$", re.M)
+
+def diagnosticos_portuino(texto: str) -> List[Diagnostico]:
+    """Extrai os diagnósticos já reescritos ("Linha N: erro: ...") de um log de compilação."""
+    vistos = set()
+    diags = []
+    for m in _DIAG_PTN_RE.finditer(texto):
+        d = Diagnostico(linha=int(m.group(1)), tipo=m.group(2), mensagem=m.group(3).strip())
+        if (d.linha, d.tipo, d.mensagem) not in vistos:
+            vistos.add((d.linha, d.tipo, d.mensagem))
+            diags.append(d)
+    return diags
+
+class ErroCompilacao(ErroArduinoCli):
+    """Erro de compilação com os diagnósticos já em linhas do programa Portuino."""
+    def __init__(self, titulo: str, saida: str):
+        super().__init__(titulo, saida)
+        self.diagnosticos = diagnosticos_portuino(saida)
+
+# ------------------ Tamanho do binário ------------------
+
+@dataclass
+class Tamanho:
+    flash: int                       # bytes de programa
+    flash_max: Optional[int] = None
+    ram: Optional[int] = None        # bytes de variáveis globais
+    ram_max: Optional[int] = None
+
+    @property
+    def flash_pct(self) -> Optional[float]:
+        return 100.0 * self.flash / self.flash_max if self.flash_max else None
+
+    @property
+    def ram_pct(self) -> Optional[float]:
+        return 100.0 * self.ram / self.ram_max if (self.ram is not None and self.ram_max) else None
+
+    def resumo(self) -> str:
+        """Ex.: 'Flash: 924 B (2.9%) | RAM: 9 B (0.4%)'."""
+        def parte(nome, usado, pct):
+            return f"{nome}: {usado} B" + (f" ({pct:.1f}%)" if pct is not None else "")
+        partes = [parte("Flash", self.flash, self.flash_pct)]
+        if self.ram is not None:
+            partes.append(parte("RAM", self.ram, self.ram_pct))
+        return " | ".join(partes)
+
+# Resumo do arduino-cli (inglês ou português, conforme o idioma do sistema)
+_MAXIMO = r"(?:Maximum is|O máximo (?:são|é))\s+(\d+)"
+_FLASH_RE = re.compile(r"(?:Sketch uses|O sketch usa)\s+(\d+)\s+bytes(?:.*?" + _MAXIMO + ")?")
+_RAM_RE = re.compile(r"(?:Global variables use|Variáveis globais usam)\s+(\d+)\s+bytes(?:.*?" + _MAXIMO + ")?")
+
+def tamanho_do_log(texto: str) -> Optional[Tamanho]:
+    """Extrai uso de flash/RAM do log do `arduino-cli compile` (None se não houver)."""
+    flash = ram = None
+    for m in _FLASH_RE.finditer(texto):
+        flash = m
+    for m in _RAM_RE.finditer(texto):
+        ram = m
+    if not flash:
+        return None
+    inteiro = lambda g: int(g) if g else None  # noqa: E731
+    return Tamanho(
+        flash=int(flash.group(1)),
+        flash_max=inteiro(flash.group(2)),
+        ram=inteiro(ram.group(1)) if ram else None,
+        ram_max=inteiro(ram.group(2)) if ram else None,
+    )
+
+@dataclass
+class ResultadoCompilacao:
+    build_dir: str                   # pasta do sketch (ou dos binários, se remoto)
+    log: str
+    tamanho: Optional[Tamanho] = None
+
+def compile_sketch(
+    code_ptn: str,
+    cfg: BuildConfig,
+    workdir: Optional[str] = None,
+    output_dir: Optional[str] = None,
+    on_line: Optional[Callable[[str], None]] = None,
+    cancel: Optional[Cancelamento] = None,
+) -> ResultadoCompilacao:
     """
-    Retorna (build_dir, logs)
+    Retorna ResultadoCompilacao(build_dir, log, tamanho)
+
+    workdir: pasta do sketch (o .ino recebe o nome da pasta, como exige o arduino-cli).
+    Compilações em paralelo precisam de pastas diferentes.
+    output_dir: se informado, o arduino-cli copia para lá os binários (.hex/.elf/.bin).
+    cfg.perfil escolhe as flags do GCC; cada perfil tem a sua pasta de build.
+    on_line/cancel: saída em tempo real e cancelamento (veja _run).
+    Mensagens do GCC chegam já com as linhas do programa Portuino; em caso de erro
+    levanta ErroCompilacao (com .diagnosticos).
     """
+    # Erro no programa aparece na hora, sem esperar (nem precisar de rede para) o core da placa
+    try:
+        sketch = traduzir(code_ptn, baud=cfg.baud, nao_bloqueante=cfg.nao_bloqueante, estrito=cfg.estrito)
+    except ErroTraducao as e:
+        raise ErroCompilacao("Erro no programa Portuino:", f"Linha {e.linha}: erro: {e.mensagem}")
+    args_perfil = _args_perfil(cfg.perfil)
     ensure_arduino_cli()
-    ino = portuino_to_ino(code_ptn, baud=cfg.baud)
+    garantir_core(cfg.fqbn, on_line=on_line, cancel=cancel)
 
-    workdir = os.path.join(tempfile.gettempdir(), "portuino_sketch")
+    if not workdir:
+        workdir = os.path.join(tempfile.gettempdir(), "portuino_sketch")
     os.makedirs(workdir, exist_ok=True)
-    ino_path = os.path.join(workdir, "portuino_sketch.ino")
+    ino_path = os.path.join(workdir, os.path.basename(os.path.normpath(workdir)) + ".ino")
     with open(ino_path, "w", encoding="utf-8") as f:
-        f.write(ino)
-
-    cmd = ["arduino-cli", "compile", "--fqbn", cfg.fqbn, workdir]
-    code, out = _run(cmd)
+        f.write(sketch.ino)
+
+    cmd = ["arduino-cli", "compile", "--fqbn", cfg.fqbn, "--build-path", _pasta_build(workdir, cfg.perfil)]
+    cmd += args_perfil + [workdir]
+    if output_dir:
+        cmd += ["--output-dir", output_dir]
+    linha_cb = (lambda ln: on_line(sketch.reescrever_diagnosticos(ln))) if on_line else None
+    code, out = _run(cmd, on_line=linha_cb, cancel=cancel)
+    out = sketch.reescrever_diagnosticos(out)
     if code != 0:
-        raise RuntimeError("Erro ao compilar:\n" + out)
-    return workdir, out
-
-def upload_sketch(code_ptn: str, cfg: BuildConfig) -> str:
+        raise ErroCompilacao("Erro ao compilar:", out)
+    return ResultadoCompilacao(build_dir=workdir, log=out, tamanho=tamanho_do_log(out))
+
+def upload_sketch(
+    code_ptn: str,
+    cfg: BuildConfig,
+    workdir: Optional[str] = None,
+    on_line: Optional[Callable[[str], None]] = None,
+    cancel: Optional[Cancelamento] = None,
+) -> str:
     ensure_arduino_cli()
-    workdir, logs = compile_sketch(code_ptn, cfg)
-    cmd = ["arduino-cli", "upload", "-p", cfg.port, "--fqbn", cfg.fqbn, workdir]
-    code, out = _run(cmd)
+    r = compile_sketch(code_ptn, cfg, workdir=workdir, on_line=on_line, cancel=cancel)
+    cmd = [
+        "arduino-cli", "upload", "-p", cfg.port, "--fqbn", cfg.fqbn,
+        "--input-dir", _pasta_build(r.build_dir, cfg.perfil), r.build_dir,
+    ]
+    code, out = _run(cmd, on_line=on_line, cancel=cancel)
     if code != 0:
-        raise RuntimeError("Erro ao fazer upload:\n" + out)
-    return logs + "\n" + out
+        raise ErroArduinoCli("Erro ao fazer upload:", out)
+    return r.log + "\n" + out
@@ -0,0 +1,434 @@
+# servidor_compilacao.py
+# Servidor de compilação para a sala de aula: um único PC compila para toda a turma.
+#
+# - Recebe código Portuino + FQBN via HTTP (JSON)
+# - Fila com número limitado de compilações simultâneas
+# - Jobs idênticos em andamento são compartilhados (hash do .ino gerado + FQBN)
+# - Binários (.hex/.bin) ficam numa loja compartilhada e são servidos por HTTP
+#
+# Servidor:  python servidor_compilacao.py --porta 8765 --workers 2
+#            (só este PC; para a turma: --host 0.0.0.0, numa rede em que se confia: não há senha)
+# Cliente:   compilar_remoto("http://professor:8765", codigo, cfg)
+#
+# O código recebido é traduzido no modo estrito: C++ direto e #include são recusados (senão um
+# '#include "/arquivo"' faria o GCC mostrar no log, devolvido ao cliente, arquivos deste PC).
+#
+# API:
+#   POST /compilar                 {"codigo": "...", "fqbn": "arduino:avr:uno", "baud": 9600,
+#                                   "nao_bloqueante": false, "perfil": "padrao"}
+#        -> 200 {"id", "estado": "ok", "arquivos": [...], "log"}
+#        -> 422 {"id", "estado": "erro", "log"}   (erro de compilação; erro no programa: sem "id")
+#        -> 413 {"erro"}                          (pedido maior que PEDIDO_MAX)
+#        -> 500 {"id", "estado": "erro", "erro"}  (falha do servidor, ex.: disco cheio)
+#   GET  /jobs/<id>                estado do job
+#   GET  /artefatos/<id>/<arquivo> binário gerado
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import urllib.request
+import urllib.error
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+import portuino_compiler as pc
+
+PORTA_PADRAO = 8765
+ERROS_MAX = 256  # jobs com erro lembrados para GET /jobs/<id> (os mais antigos saem)
+PEDIDO_MAX = 1024 * 1024  # bytes do corpo do POST (um programa Portuino tem poucos KB)
+_ID_VALIDO = set("0123456789abcdef")
+
+
+def _loja_padrao() -> str:
+    return os.path.join(tempfile.gettempdir(), "portuino_artefatos")
+
+
+def id_job(ino: str, fqbn: str, perfil: str = "padrao") -> str:
+    """Hash do conteúdo: mesmo sketch gerado + mesma placa + mesmo perfil = mesmo binário."""
+    h = hashlib.sha256()
+    h.update(fqbn.encode("utf-8"))
+    h.update(b"\0")
+    if perfil != "padrao":  # mantém os ids (e a loja) já existentes do perfil padrão
+        h.update(perfil.encode("utf-8"))
+        h.update(b"\0")
+    h.update(ino.encode("utf-8"))
+    return h.hexdigest()
+
+
+@dataclass
+class ResultadoJob:
+    id: str
+    ok: bool
+    log: str = ""
+    arquivos: List[str] = field(default_factory=list)
+
+
+class ServidorCompilacao:
+    """
+    Núcleo do serviço (independente do HTTP).
+
+    compilar: função com a assinatura de portuino_compiler.compile_sketch
+    (injetável para testes no localhost sem arduino-cli).
+    """
+
+    def __init__(
+        self,
+        loja: Optional[str] = None,
+        workers: int = 2,
+        max_fila: int = 64,
+        compilar: Callable[..., pc.ResultadoCompilacao] = pc.compile_sketch,
+    ):
+        self.loja = loja or _loja_padrao()
+        os.makedirs(self.loja, exist_ok=True)
+        self.max_fila = max_fila
+        self._compilar = compilar
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="compilacao")
+        self._lock = threading.Lock()
+        self._em_andamento: Dict[str, Future] = {}
+        self._erros: "OrderedDict[str, ResultadoJob]" = OrderedDict()  # só os ERROS_MAX mais recentes
+
+    # ---------- loja de artefatos ----------
+    def pasta_job(self, job: str) -> str:
+        return os.path.join(self.loja, job)
+
+    def _da_loja(self, job: str) -> Optional[ResultadoJob]:
+        pasta = self.pasta_job(job)
+        if not os.path.isdir(pasta):
+            return None
+        log = ""
+        log_path = os.path.join(pasta, "compilacao.log")
+        if os.path.exists(log_path):
+            with open(log_path, "r", encoding="utf-8") as f:
+                log = f.read()
+        arquivos = sorted(a for a in os.listdir(pasta) if a != "compilacao.log")
+        return ResultadoJob(id=job, ok=True, log=log, arquivos=arquivos)
+
+    # ---------- jobs ----------
+    def submeter(
+        self, codigo: str, fqbn: str, baud: int = 9600, nao_bloqueante: bool = False,
+        perfil: str = "padrao",
+    ) -> Tuple[str, Future]:
+        """Enfileira (ou reaproveita) a compilação; retorna (id, future[ResultadoJob])."""
+        if perfil not in pc.PERFIS:
+            raise ValueError(f"perfil desconhecido: {perfil}")
+        ino = pc.portuino_to_ino(codigo, baud=baud, nao_bloqueante=nao_bloqueante, estrito=True)
+        job = id_job(ino, fqbn, perfil)
+
+        with self._lock:
+            pronto = self._da_loja(job)
+            if pronto:
+                f: Future = Future()
+                f.set_result(pronto)
+                return job, f
+            if job in self._em_andamento:
+                return job, self._em_andamento[job]
+            if len(self._em_andamento) >= self.max_fila:
+                raise OverflowError("Fila de compilação cheia. Tente novamente em instantes.")
+            f = self._pool.submit(self._executar, job, codigo, fqbn, baud, nao_bloqueante, perfil)
+            self._em_andamento[job] = f
+            self._erros.pop(job, None)
+
+        f.add_done_callback(lambda _f, j=job: self._finalizar(j))
+        return job, f
+
+    def _finalizar(self, job: str) -> None:
+        with self._lock:
+            self._em_andamento.pop(job, None)
+
+    def _executar(
+        self, job: str, codigo: str, fqbn: str, baud: int, nao_bloqueante: bool, perfil: str
+    ) -> ResultadoJob:
+        cfg = pc.BuildConfig(
+            fqbn=fqbn, port="?", baud=baud, nao_bloqueante=nao_bloqueante, perfil=perfil, estrito=True
+        )
+        trabalho = tempfile.mkdtemp(prefix="portuino_job_")
+        sketch = os.path.join(trabalho, "portuino_sketch")
+        try:
+            saida_tmp = os.path.join(trabalho, "saida")
+            try:
+                log = self._compilar(
+                    codigo, cfg,
+                    workdir=sketch,
+                    output_dir=saida_tmp,
+                ).log
+            except Exception as e:
+                r = ResultadoJob(id=job, ok=False, log=str(e))
+                with self._lock:
+                    self._erros[job] = r
+                    while len(self._erros) > ERROS_MAX:
+                        self._erros.popitem(last=False)
+                return r
+
+            os.makedirs(saida_tmp, exist_ok=True)
+            with open(os.path.join(saida_tmp, "compilacao.log"), "w", encoding="utf-8") as f:
+                f.write(log)
+            # Publica na loja de forma atômica (rename): leitores nunca veem pasta pela metade.
+            destino = self.pasta_job(job)
+            try:
+                os.replace(saida_tmp, destino)
+            except OSError:
+                if not os.path.isdir(destino):
+                    raise
+            return self._da_loja(job) or ResultadoJob(id=job, ok=True, log=log)
+        finally:
+            # Os binários já estão na loja; a pasta de build deste job nunca seria reusada.
+            pc.limpar_build(sketch, perfil)
+            shutil.rmtree(trabalho, ignore_errors=True)
+
+    def estado(self, job: str) -> Optional[dict]:
+        with self._lock:
+            if job in self._em_andamento:
+                return {"id": job, "estado": "compilando"}
+            if job in self._erros:
+                r = self._erros[job]
+                return {"id": job, "estado": "erro", "log": r.log}
+        r = self._da_loja(job)
+        if r:
+            return {"id": job, "estado": "ok", "arquivos": r.arquivos, "log": r.log}
+        return None
+
+    def encerrar(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ------------------ HTTP ------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    servico: ServidorCompilacao  # definido em criar_servidor_http
+
+    def log_message(self, fmt, *args):  # silencioso (sala de aula = muitos pedidos)
+        pass
+
+    def _json(self, status: int, doc: dict) -> None:
+        corpo = json.dumps(doc, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/compilar":
+            return self._json(404, {"erro": "rota inexistente"})
+        try:
+            n = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            return self._json(400, {"erro": "Content-Length inválido"})
+        if n < 0 or n > PEDIDO_MAX:
+            self.close_connection = True  # o corpo não é lido
+            return self._json(413, {"erro": f"Pedido maior que {PEDIDO_MAX} bytes."})
+        try:
+            pedido = json.loads(self.rfile.read(n).decode("utf-8"))
+            codigo = pedido["codigo"]
+            fqbn = pedido.get("fqbn") or "arduino:avr:uno"
+            baud = int(pedido.get("baud") or 9600)
+            nao_bloqueante = bool(pedido.get("nao_bloqueante"))
+            perfil = str(pedido.get("perfil") or "padrao")
+        except Exception as e:
+            return self._json(400, {"erro": f"Pedido inválido: {e}"})
+
+        try:
+            job, futuro = self.servico.submeter(codigo, fqbn, baud, nao_bloqueante, perfil)
+        except OverflowError as e:
+            return self._json(503, {"erro": str(e)})
+        except pc.ErroTraducao as e:
+            # mesmo texto da compilação local: o cliente extrai o diagnóstico e marca a linha
+            return self._json(422, {"estado": "erro", "log": f"Linha {e.linha}: erro: {e.mensagem}"})
+        except Exception as e:
+            return self._json(400, {"erro": f"Erro na tradução: {e}"})
+
+        try:
+            r: ResultadoJob = futuro.result()
+        except Exception as e:
+            # Falha fora da compilação (ex.: disco cheio ao publicar na loja): o cliente recebe resposta
+            return self._json(500, {"id": job, "estado": "erro", "erro": f"Falha no servidor: {e}"})
+        if not r.ok:
+            return self._json(422, {"id": job, "estado": "erro", "log": r.log})
+        return self._json(200, {"id": job, "estado": "ok", "arquivos": r.arquivos, "log": r.log})
+
+    def do_GET(self):
+        partes = [p for p in self.path.split("?")[0].split("/") if p]
+        if len(partes) == 2 and partes[0] == "jobs" and set(partes[1]) <= _ID_VALIDO:
+            st = self.servico.estado(partes[1])
+            return self._json(200, st) if st else self._json(404, {"erro": "job desconhecido"})
+
+        if len(partes) == 3 and partes[0] == "artefatos" and set(partes[1]) <= _ID_VALIDO:
+            nome = os.path.basename(partes[2])
+            caminho = os.path.join(self.servico.pasta_job(partes[1]), nome)
+            if nome != partes[2] or not os.path.isfile(caminho):
+                return self._json(404, {"erro": "artefato inexistente"})
+            with open(caminho, "rb") as f:
+                dados = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+            return
+
+        return self._json(404, {"erro": "rota inexistente"})
+
+
+def criar_servidor_http(
+    servico: ServidorCompilacao, host: str = "127.0.0.1", porta: int = PORTA_PADRAO
+) -> ThreadingHTTPServer:
+    """porta=0 escolhe uma porta livre (útil em testes no localhost)."""
+    handler = type("HandlerCompilacao", (_Handler,), {"servico": servico})
+    httpd = ThreadingHTTPServer((host, porta), handler)
+    httpd.daemon_threads = True
+    return httpd
+
+
+# ------------------ Cliente (backend remoto da IDE) ------------------
+
+def _pedido(
+    url: str, dados: Optional[bytes] = None, timeout: float = 600, cancel: Optional[pc.Cancelamento] = None
+) -> Tuple[int, bytes]:
+    """
+    (status, corpo). O pedido roda numa thread e cancel é conferido a cada 100 ms: o botão
+    Cancelar não espera a resposta do servidor (o job continua lá e fica na loja).
+    """
+    req = urllib.request.Request(
+        url, data=dados, headers={"Content-Type": "application/json", "User-Agent": "PortuinoIDE/1.0"}
+    )
+    resultado: dict = {}
+
+    def rodar():
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as r:
+                resultado["r"] = (r.status, r.read())
+        except urllib.error.HTTPError as e:
+            resultado["r"] = (e.code, e.read())
+        except Exception as e:
+            resultado["erro"] = e
+
+    t = threading.Thread(target=rodar, daemon=True)
+    t.start()
+    while t.is_alive():
+        if cancel and cancel.cancelado:
+            raise pc.OperacaoCancelada("Operação cancelada.")
+        t.join(0.1)
+    if cancel and cancel.cancelado:
+        raise pc.OperacaoCancelada("Operação cancelada.")
+    if "erro" in resultado:
+        raise resultado["erro"]
+    return resultado["r"]
+
+
+def compilar_remoto(
+    url_servidor: str,
+    code_ptn: str,
+    cfg: pc.BuildConfig,
+    destino: Optional[str] = None,
+    on_line: Optional[Callable[[str], None]] = None,
+    cancel: Optional[pc.Cancelamento] = None,
+) -> pc.ResultadoCompilacao:
+    """
+    Compila no servidor e baixa os binários para `destino`.
+    Mesmo retorno de compile_sketch (build_dir = pasta com os binários baixados); sem destino,
+    a pasta é uma temporária nova que passa a ser de quem chama (apague build_dir depois).
+    on_line recebe o log do servidor (de uma vez, ao final), como na compilação local.
+    Erros do programa/compilação levantam ErroCompilacao com .diagnosticos, como compile_sketch.
+    """
+    base = url_servidor.rstrip("/")
+    corpo = json.dumps(
+        {
+            "codigo": code_ptn, "fqbn": cfg.fqbn, "baud": cfg.baud,
+            "nao_bloqueante": cfg.nao_bloqueante, "perfil": cfg.perfil,
+        }
+    ).encode("utf-8")
+    status, resp = _pedido(base + "/compilar", corpo, cancel=cancel)
+    try:
+        doc = json.loads(resp.decode("utf-8"))
+    except Exception:
+        doc = {"erro": resp.decode("utf-8", errors="replace")}
+    if on_line and doc.get("log"):
+        on_line(doc["log"].strip())
+    if status == 422:
+        raise pc.ErroCompilacao("Erro ao compilar (servidor):", doc.get("log") or "")
+    if status != 200:
+        raise RuntimeError(f"Servidor de compilação respondeu {status}: {doc.get('erro', '')}")
+
+    temporaria = not destino
+    destino = destino or tempfile.mkdtemp(prefix="portuino_remoto_")
+    try:
+        os.makedirs(destino, exist_ok=True)
+        for nome in doc.get("arquivos", []):
+            st, dados = _pedido(f"{base}/artefatos/{doc['id']}/{nome}", cancel=cancel)
+            if st != 200:
+                raise RuntimeError(f"Falha ao baixar artefato {nome} ({st}).")
+            with open(os.path.join(destino, os.path.basename(nome)), "wb") as f:
+                f.write(dados)
+    except BaseException:
+        if temporaria:
+            shutil.rmtree(destino, ignore_errors=True)
+        raise
+    log = doc.get("log", "")
+    return pc.ResultadoCompilacao(build_dir=destino, log=log, tamanho=pc.tamanho_do_log(log))
+
+
+def _binario_para_upload(pasta: str) -> str:
+    nomes = sorted(os.listdir(pasta))
+    for ext in (".hex", ".bin", ".uf2"):
+        for n in nomes:
+            if n.endswith(ext) and "with_bootloader" not in n:
+                return os.path.join(pasta, n)
+    raise RuntimeError("O servidor não gerou binário para upload.")
+
+
+def upload_remoto(
+    url_servidor: str,
+    code_ptn: str,
+    cfg: pc.BuildConfig,
+    on_line: Optional[Callable[[str], None]] = None,
+    cancel: Optional[pc.Cancelamento] = None,
+) -> str:
+    """Compila no servidor e grava localmente (a placa está conectada neste PC)."""
+    with tempfile.TemporaryDirectory(prefix="portuino_remoto_") as pasta:
+        r = compilar_remoto(url_servidor, code_ptn, cfg, destino=pasta, on_line=on_line, cancel=cancel)
+        binario = _binario_para_upload(r.build_dir)
+        cmd = ["arduino-cli", "upload", "-p", cfg.port, "--fqbn", cfg.fqbn, "--input-file", binario]
+        code, out = pc._run(cmd, on_line=on_line, cancel=cancel)
+    if code != 0:
+        raise pc.ErroArduinoCli("Erro ao fazer upload:", out)
+    return r.log + "\n" + out
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Servidor de compilação Portuino (sala de aula).")
+    ap.add_argument(
+        "--host", default="127.0.0.1",
+        help="interface (0.0.0.0 = toda a rede; o servidor não tem autenticação)",
+    )
+    ap.add_argument("--porta", type=int, default=PORTA_PADRAO)
+    ap.add_argument("--workers", type=int, default=2, help="compilações simultâneas")
+    ap.add_argument("--max-fila", type=int, default=64)
+    ap.add_argument("--loja", default=_loja_padrao(), help="pasta dos artefatos compartilhados")
+    args = ap.parse_args(argv)
+
+    pc.ensure_arduino_cli()
+    servico = ServidorCompilacao(loja=args.loja, workers=args.workers, max_fila=args.max_fila)
+    httpd = criar_servidor_http(servico, args.host, args.porta)
+    print(f"Servidor de compilação em http://{args.host}:{httpd.server_address[1]} (loja: {servico.loja})")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        servico.encerrar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
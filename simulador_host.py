@@ -0,0 +1,554 @@
+# simulador_host.py
+# Executa o sketch gerado (portuino_to_ino) no próprio PC, sem placa.
+#
+# - O .ino é compilado com o g++ do sistema contra um Arduino.h de mentira (ARDUINO_H)
+# - Relógio virtual: delay()/pulseIn() só avançam o contador (roda na velocidade nativa)
+# - Serial vai para stdout; pinMode/digitalWrite/linhas da Serial viram eventos (trace)
+# - Entradas (digitalRead/pulseIn) vêm de estímulos com tempo: Estimulo(t_ms, pino, valor)
+# - attachInterrupt nos pinos 2 e 3 (como no Uno): a borda de um estímulo chama a ISR na hora
+# - Binários ficam em cache (hash do .ino + runtime): rodar de novo não recompila
+#
+# Diferenças conhecidas para o AVR: int tem 32 bits (no Uno são 16) e double é double.
+#
+# Uso: python simulador_host.py programa.ptn --ate 5000
+
+from __future__ import annotations
+
+import os
+import sys
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import portuino_compiler as pc
+
+# Custo (µs virtuais) de cada volta de loop() — também evita laço sem tempo no modo não bloqueante
+CUSTO_LOOP_US = 10
+
+ARDUINO_H = r"""// Arduino.h de simulação (Portuino): relógio virtual e trace de pinos
+#pragma once
+#include <cstdio>
+#include <cstdlib>
+#include <cstdint>
+#include <cstring>
+#include <cmath>
+#include <string>
+
+#define HIGH 1
+#define LOW 0
+#define INPUT 0
+#define OUTPUT 1
+#define INPUT_PULLUP 2
+#define LED_BUILTIN 13
+#define A0 14
+#define A1 15
+#define A2 16
+#define A3 17
+#define A4 18
+#define A5 19
+#define CHANGE 1
+#define FALLING 2
+#define RISING 3
+#define NOT_AN_INTERRUPT -1
+#define IRAM_ATTR
+#define digitalPinToInterrupt(p) ((p) == 2 ? 0 : ((p) == 3 ? 1 : NOT_AN_INTERRUPT))
+
+typedef bool boolean;
+typedef uint8_t byte;
+
+// Os mesmos macros do core AVR (avaliam os argumentos duas vezes, como lá)
+#define min(a, b) ((a) < (b) ? (a) : (b))
+#define max(a, b) ((a) > (b) ? (a) : (b))
+#define abs(x) ((x) > 0 ? (x) : -(x))
+#define constrain(x, lo, hi) ((x) < (lo) ? (lo) : ((x) > (hi) ? (hi) : (x)))
+#define round(x) ((x) >= 0 ? (long)((x) + 0.5) : (long)((x) - 0.5))
+
+void _portuino_avancar(unsigned long us);
+void _portuino_evento(const char* tipo, int pino, long valor);
+std::string _portuino_real(double valor, int casas);
+
+void pinMode(int pino, int modo);
+void digitalWrite(int pino, int valor);
+int digitalRead(int pino);
+int analogRead(int pino);
+void analogWrite(int pino, int valor);
+unsigned long millis();
+unsigned long micros();
+void delay(unsigned long ms);
+void delayMicroseconds(unsigned int us);
+unsigned long pulseIn(int pino, int estado, unsigned long timeout = 1000000UL);
+void attachInterrupt(int interrupcao, void (*isr)(), int modo);
+void detachInterrupt(int interrupcao);
+void noInterrupts();
+void interrupts();
+
+class String {
+ public:
+  String() {}
+  String(const char* s) : s_(s ? s : "") {}
+  String(const std::string& s) : s_(s) {}
+  String(char c) : s_(1, c) {}
+  String(unsigned char v) : s_(std::to_string((unsigned)v)) {}
+  String(int v) : s_(std::to_string(v)) {}
+  String(unsigned int v) : s_(std::to_string(v)) {}
+  String(long v) : s_(std::to_string(v)) {}
+  String(unsigned long v) : s_(std::to_string(v)) {}
+  String(float v, int casas = 2) : s_(_portuino_real(v, casas)) {}
+  String(double v, int casas = 2) : s_(_portuino_real(v, casas)) {}
+
+  unsigned int length() const { return (unsigned int)s_.size(); }
+  const char* c_str() const { return s_.c_str(); }
+  long toInt() const { return atol(s_.c_str()); }
+  float toFloat() const { return (float)atof(s_.c_str()); }
+  String& operator+=(const String& o) { s_ += o.s_; return *this; }
+  friend String operator+(const String& a, const String& b) { return String(a.s_ + b.s_); }
+  friend bool operator==(const String& a, const String& b) { return a.s_ == b.s_; }
+  friend bool operator!=(const String& a, const String& b) { return a.s_ != b.s_; }
+  friend bool operator<(const String& a, const String& b) { return a.s_ < b.s_; }
+  friend bool operator>(const String& a, const String& b) { return a.s_ > b.s_; }
+  friend bool operator<=(const String& a, const String& b) { return a.s_ <= b.s_; }
+  friend bool operator>=(const String& a, const String& b) { return a.s_ >= b.s_; }
+
+ private:
+  std::string s_;
+};
+
+class SerialSimulado {
+ public:
+  void begin(long) {}
+  void end() {}
+  int available() { return 0; }
+  int read() { return -1; }
+  operator bool() const { return true; }
+
+  void print(const char* s) { escrever(s); }
+  void print(const String& s) { escrever(s.c_str()); }
+  void print(char c) { char b[2] = {c, 0}; escrever(b); }
+  void print(unsigned char v) { print((unsigned long)v); }
+  void print(int v) { print((long)v); }
+  void print(unsigned int v) { print((unsigned long)v); }
+  void print(long v) { char b[24]; snprintf(b, sizeof b, "%ld", v); escrever(b); }
+  void print(unsigned long v) { char b[24]; snprintf(b, sizeof b, "%lu", v); escrever(b); }
+  void print(double v, int casas = 2);
+
+  void println() { escrever("\n"); }
+  template <class T> void println(const T& v) { print(v); println(); }
+  void println(double v, int casas) { print(v, casas); println(); }
+
+  void flush() {}
+  void _descarregar(bool final = false);
+
+ private:
+  void escrever(const char* s);
+  std::string linha_;
+};
+
+extern SerialSimulado Serial;
+
+void setup();
+void loop();
+"""
+
+MAIN_CPP = r"""// Relógio virtual, pinos e Serial do simulador Portuino
+#include <vector>
+#include <algorithm>  // antes do Arduino.h: min/max lá são macros
+#include "Arduino.h"
+
+SerialSimulado Serial;
+
+namespace {
+unsigned long long agora_us = 0;
+unsigned long long limite_us = 0;
+int modo[128];
+int nivel[128];
+unsigned long pulso[128];
+
+struct Estimulo { unsigned long long t_us; char tipo; int pino; unsigned long valor; };
+std::vector<Estimulo> estimulos;
+size_t proximo = 0;
+
+// Interrupções externas 0 e 1 (pinos 2 e 3); com noInterrupts() a borda fica pendente
+struct Interrupcao { void (*isr)(); int modo; bool pendente; };
+Interrupcao interrupcoes[2];
+bool habilitadas = true;
+
+int pino_valido(int p) { return p >= 0 && p < 128; }
+
+void borda(int p, int antes, int agora) {
+  int n = digitalPinToInterrupt(p);
+  if (n == NOT_AN_INTERRUPT || !interrupcoes[n].isr || antes == agora) return;
+  int m = interrupcoes[n].modo;
+  if (m != CHANGE && (m == RISING) != (agora == HIGH)) return;
+  if (habilitadas) interrupcoes[n].isr();
+  else interrupcoes[n].pendente = true;
+}
+
+void aplicar_estimulos() {
+  while (proximo < estimulos.size() && estimulos[proximo].t_us <= agora_us) {
+    const Estimulo& e = estimulos[proximo++];
+    if (!pino_valido(e.pino)) continue;
+    if (e.tipo == 'P') {
+      pulso[e.pino] = e.valor;
+    } else {
+      int antes = nivel[e.pino];
+      nivel[e.pino] = e.valor ? HIGH : LOW;
+      borda(e.pino, antes, nivel[e.pino]);
+    }
+  }
+}
+
+void terminar() {
+  Serial._descarregar(true);
+  fprintf(stderr, "@%llu\tFIM\t\t\n", agora_us);
+  fflush(stdout);
+  fflush(stderr);
+  exit(0);
+}
+}  // namespace
+
+void _portuino_evento(const char* tipo, int pino, long valor) {
+  fprintf(stderr, "@%llu\t%s\t%d\t%ld\n", agora_us, tipo, pino, valor);
+}
+
+void _portuino_avancar(unsigned long us) {
+  agora_us += us;
+  aplicar_estimulos();
+  if (agora_us >= limite_us) terminar();
+}
+
+void pinMode(int p, int m) {
+  if (!pino_valido(p)) return;
+  modo[p] = m;
+  if (m == INPUT_PULLUP) nivel[p] = HIGH;
+  _portuino_evento("MODO", p, m);
+}
+
+void digitalWrite(int p, int v) {
+  if (!pino_valido(p)) return;
+  nivel[p] = v ? HIGH : LOW;
+  _portuino_evento("ESCRITA", p, nivel[p]);
+  _portuino_avancar(4);
+}
+
+int digitalRead(int p) {
+  _portuino_avancar(4);  // laço "enquanto (ler(p) == 0)" precisa de tempo para ver o estímulo
+  return pino_valido(p) ? nivel[p] : LOW;
+}
+
+int analogRead(int p) {
+  _portuino_avancar(100);
+  return pino_valido(p) ? (int)pulso[p] : 0;
+}
+
+void analogWrite(int p, int v) {
+  if (!pino_valido(p)) return;
+  _portuino_evento("PWM", p, v);
+}
+
+unsigned long millis() { _portuino_avancar(1); return (unsigned long)(agora_us / 1000ULL); }
+unsigned long micros() { _portuino_avancar(1); return (unsigned long)agora_us; }
+void delay(unsigned long ms) { _portuino_avancar(ms * 1000UL); }
+void delayMicroseconds(unsigned int us) { _portuino_avancar(us); }
+
+unsigned long pulseIn(int p, int, unsigned long timeout) {
+  unsigned long d = pino_valido(p) ? pulso[p] : 0;
+  if (d == 0 || d > timeout) {  // sem eco: a placa espera o timeout inteiro
+    _portuino_avancar(timeout);
+    return 0;
+  }
+  _portuino_avancar(d);
+  return d;
+}
+
+void attachInterrupt(int n, void (*isr)(), int m) {
+  if (n < 0 || n > 1) return;
+  interrupcoes[n] = {isr, m, false};
+}
+
+void detachInterrupt(int n) {
+  if (n >= 0 && n <= 1) interrupcoes[n] = {nullptr, 0, false};
+}
+
+void noInterrupts() { habilitadas = false; }
+
+void interrupts() {
+  habilitadas = true;
+  for (Interrupcao& i : interrupcoes) {
+    if (i.pendente && i.isr) {
+      i.pendente = false;
+      i.isr();
+    }
+  }
+}
+
+// Mesmo algoritmo do Print::printFloat do core (em float, como no AVR); também para String(float)
+std::string _portuino_real(double valor, int casas) {
+  float n = (float)valor;
+  if (std::isnan(n)) return "nan";
+  if (std::isinf(n)) return "inf";
+  if (n > 4294967040.0f || n < -4294967040.0f) return "ovf";
+  std::string s;
+  if (n < 0.0f) { s += '-'; n = -n; }
+  float arred = 0.5f;
+  for (int i = 0; i < casas; ++i) arred /= 10.0f;
+  n += arred;
+  unsigned long inteiro = (unsigned long)n;
+  float resto = n - (float)inteiro;
+  s += std::to_string(inteiro);
+  if (casas > 0) s += '.';
+  while (casas-- > 0) {
+    resto *= 10.0f;
+    unsigned int d = (unsigned int)resto;
+    s += std::to_string(d);
+    resto -= d;
+  }
+  return s;
+}
+
+void SerialSimulado::print(double valor, int casas) { escrever(_portuino_real(valor, casas).c_str()); }
+
+void SerialSimulado::escrever(const char* s) {
+  fputs(s, stdout);
+  for (; *s; ++s) {
+    if (*s == '\n') _descarregar();
+    else linha_ += *s;
+  }
+}
+
+void SerialSimulado::_descarregar(bool final) {
+  if (final && linha_.empty()) return;  // println("") também é uma linha
+  std::string esc;
+  for (char c : linha_) {
+    if (c == '\\') esc += "\\\\";
+    else if (c == '\t') esc += "\\t";
+    else if (c == '\r') esc += "\\r";
+    else esc += c;
+  }
+  fprintf(stderr, "@%llu\tSERIAL\t\t%s\n", agora_us, esc.c_str());
+  linha_.clear();
+}
+
+// argv: limite_ms custo_loop_us; estímulos na entrada padrão ("t_ms D|P pino valor" por linha)
+int main(int argc, char** argv) {
+  limite_us = (argc > 1 ? strtoull(argv[1], 0, 10) : 10000ULL) * 1000ULL;
+  unsigned long custo = argc > 2 ? strtoul(argv[2], 0, 10) : 10UL;
+  double t;
+  char tipo;
+  int p;
+  unsigned long v;
+  while (scanf("%lf %c %d %lu", &t, &tipo, &p, &v) == 4)
+    estimulos.push_back({(unsigned long long)(t * 1000.0), tipo, p, v});
+  std::stable_sort(estimulos.begin(), estimulos.end(),
+                   [](const Estimulo& a, const Estimulo& b) { return a.t_us < b.t_us; });
+  aplicar_estimulos();
+  setup();
+  for (;;) {
+    loop();
+    _portuino_avancar(custo);
+  }
+}
+"""
+
+_FLAGS = ["-std=gnu++11", "-O1", "-w"]
+
+
+class ErroSimulador(RuntimeError):
+    pass
+
+
+@dataclass
+class Estimulo:
+    t_ms: float
+    pino: int
+    valor: int              # digital: 0/1; pulso: duração em µs devolvida por pulseIn()
+    tipo: str = "digital"   # "digital" | "pulso"
+
+
+@dataclass
+class Evento:
+    t_us: int
+    tipo: str               # "modo" | "escrita" | "pwm" | "serial" | "fim"
+    pino: Optional[int] = None
+    valor: Optional[int] = None
+    texto: str = ""         # linha da Serial (sem o \n)
+
+
+@dataclass
+class ResultadoHost:
+    saida: str              # tudo o que o sketch mandou pela Serial
+    eventos: List[Evento]
+    tempo_us: int           # relógio virtual no fim da execução
+
+
+def _compilador() -> str:
+    cxx = shutil.which(os.environ.get("CXX") or "g++") or shutil.which("c++") or shutil.which("clang++")
+    if not cxx:
+        raise ErroSimulador("Compilador C++ (g++) não encontrado. Instale o g++ para simular no PC.")
+    return cxx
+
+
+def compilar_host(sketch: pc.SketchGerado) -> str:
+    """Compila o sketch para o PC (com cache) e retorna o caminho do executável."""
+    cxx = _compilador()
+    h = hashlib.sha256()
+    for parte in (cxx, " ".join(_FLAGS), ARDUINO_H, MAIN_CPP, sketch.ino):
+        h.update(parte.encode("utf-8"))
+        h.update(b"\0")
+    pasta = os.path.join(pc._cache_base(), "host", h.hexdigest()[:16])
+    exe = os.path.join(pasta, "sketch.exe" if pc._is_windows() else "sketch")
+    if os.path.exists(exe):
+        return exe
+
+    os.makedirs(pasta, exist_ok=True)
+    trabalho = tempfile.mkdtemp(prefix="portuino_host_", dir=pasta)
+    try:
+        with open(os.path.join(trabalho, "Arduino.h"), "w", encoding="utf-8") as f:
+            f.write(ARDUINO_H)
+        with open(os.path.join(trabalho, "portuino_main.cpp"), "w", encoding="utf-8") as f:
+            f.write(MAIN_CPP)
+        # #line: erros do g++ apontam para o .ino, e reescrever_diagnosticos leva à linha Portuino
+        with open(os.path.join(trabalho, "sketch.cpp"), "w", encoding="utf-8") as f:
+            f.write('#include "Arduino.h"\n#line 1 "portuino_sketch.ino"\n' + sketch.ino)
+        saida_tmp = os.path.join(trabalho, os.path.basename(exe))
+        p = subprocess.run(
+            [cxx, *_FLAGS, "-I", trabalho, "sketch.cpp", "portuino_main.cpp", "-o", saida_tmp],
+            cwd=trabalho, capture_output=True, text=True,
+        )
+        if p.returncode != 0:
+            raise pc.ErroCompilacao("Erro ao compilar (simulador):", sketch.reescrever_diagnosticos(p.stderr))
+        os.replace(saida_tmp, exe)  # atômico: execuções em paralelo compartilham o cache
+    finally:
+        shutil.rmtree(trabalho, ignore_errors=True)
+    return exe
+
+
+def _ler_eventos(trace: str) -> List[Evento]:
+    eventos = []
+    for ln in trace.splitlines():
+        if not ln.startswith("@"):
+            continue
+        t, tipo, pino, resto = (ln[1:].split("\t", 3) + ["", "", ""])[:4]
+        tipo = tipo.lower()
+        if tipo == "serial":
+            texto = resto.replace("\\t", "\t").replace("\\r", "\r").replace("\\\\", "\\")
+            eventos.append(Evento(int(t), tipo, texto=texto))
+        elif tipo == "fim":
+            eventos.append(Evento(int(t), tipo))
+        else:
+            eventos.append(Evento(int(t), tipo, int(pino), int(resto)))
+    return eventos
+
+
+def executar_host(
+    exe: str,
+    limite_ms: int = 10000,
+    estimulos: Sequence[Estimulo] = (),
+    timeout: float = 30.0,
+    custo_loop_us: int = CUSTO_LOOP_US,
+) -> ResultadoHost:
+    """Roda o executável até o relógio virtual chegar em limite_ms (timeout = segundos reais)."""
+    entrada = "".join(
+        f"{e.t_ms} {'P' if e.tipo == 'pulso' else 'D'} {int(e.pino)} {int(e.valor)}\n" for e in estimulos
+    )
+    try:
+        p = subprocess.run(
+            [exe, str(int(limite_ms)), str(int(custo_loop_us))],
+            input=entrada.encode("utf-8"), capture_output=True, timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        raise ErroSimulador(
+            f"Tempo real esgotado ({timeout:g}s): laço sem esperar()/ler() não avança o relógio virtual."
+        )
+    trace = p.stderr.decode("utf-8", errors="replace")
+    eventos = _ler_eventos(trace)
+    if p.returncode != 0 or not eventos or eventos[-1].tipo != "fim":
+        ultimas = "\n".join(ln for ln in trace.splitlines() if not ln.startswith("@"))[-2000:]
+        raise ErroSimulador(f"O sketch terminou com código {p.returncode}.\n{ultimas}".rstrip())
+    return ResultadoHost(
+        saida=p.stdout.decode("utf-8", errors="replace"), eventos=eventos, tempo_us=eventos[-1].t_us
+    )
+
+
+def simular(
+    code_ptn: str,
+    limite_ms: int = 10000,
+    estimulos: Sequence[Estimulo] = (),
+    baud: int = 9600,
+    nao_bloqueante: bool = False,
+    timeout: float = 30.0,
+) -> ResultadoHost:
+    """Traduz, compila para o PC e executa. Erros de tradução/compilação levantam ErroCompilacao."""
+    try:
+        sketch = pc.traduzir(code_ptn, baud=baud, nao_bloqueante=nao_bloqueante)
+    except pc.ErroTraducao as e:
+        raise pc.ErroCompilacao("Erro no programa Portuino:", f"Linha {e.linha}: erro: {e.mensagem}")
+    return executar_host(compilar_host(sketch), limite_ms=limite_ms, estimulos=estimulos, timeout=timeout)
+
+
+_MODOS = {0: "ENTRADA", 1: "SAÍDA", 2: "ENTRADA_PULLUP"}
+
+
+def formatar(eventos: Sequence[Evento]) -> str:
+    """Trace legível: '[   12.345 ms] PINO 13 = ALTO'."""
+    linhas = []
+    for e in eventos:
+        t = f"[{e.t_us / 1000:10.3f} ms]"
+        if e.tipo == "serial":
+            linhas.append(f"{t} {e.texto}")
+        elif e.tipo == "modo":
+            linhas.append(f"{t} PINO {e.pino} configurado como {_MODOS.get(e.valor, e.valor)}")
+        elif e.tipo == "escrita":
+            linhas.append(f"{t} PINO {e.pino} = {'ALTO' if e.valor else 'BAIXO'}")
+        elif e.tipo == "pwm":
+            linhas.append(f"{t} PINO {e.pino} = PWM {e.valor}")
+        elif e.tipo == "fim":
+            linhas.append(f"{t} fim da simulação")
+    return "\n".join(linhas)
+
+
+def ler_estimulos(caminho: str) -> List[Estimulo]:
+    """Arquivo texto: 't_ms pino valor' (digital) ou 't_ms pulso pino us' por linha; '#' comenta."""
+    estimulos = []
+    with open(caminho, "r", encoding="utf-8") as f:
+        for n, ln in enumerate(f, 1):
+            partes = ln.split("#", 1)[0].split()
+            if not partes:
+                continue
+            try:
+                if len(partes) == 4 and partes[1] == "pulso":
+                    estimulos.append(Estimulo(float(partes[0]), int(partes[2]), int(partes[3]), "pulso"))
+                elif len(partes) == 3:
+                    estimulos.append(Estimulo(float(partes[0]), int(partes[1]), int(partes[2])))
+                else:
+                    raise ValueError(ln.strip())
+            except ValueError:
+                raise ErroSimulador(f"{caminho}:{n}: estímulo inválido: {ln.strip()}")
+    return estimulos
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Roda um programa Portuino compilado para o PC (sem placa).")
+    ap.add_argument("arquivo")
+    ap.add_argument("--ate", type=int, default=10000, help="tempo virtual simulado (ms)")
+    ap.add_argument("--entradas", help="arquivo de estímulos (veja ler_estimulos)")
+    ap.add_argument("--nao-bloqueante", action="store_true")
+    args = ap.parse_args(argv)
+
+    with open(args.arquivo, "r", encoding="utf-8") as f:
+        codigo = f.read()
+    try:
+        estimulos = ler_estimulos(args.entradas) if args.entradas else []
+        r = simular(codigo, limite_ms=args.ate, estimulos=estimulos, nao_bloqueante=args.nao_bloqueante)
+    except (ErroSimulador, pc.ErroArduinoCli) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(formatar(r.eventos))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
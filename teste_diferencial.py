@@ -0,0 +1,591 @@
+# teste_diferencial.py
+# Teste diferencial: interpretador (interpretador_portuino) x sketch gerado (simulador_host).
+#
+# - Programas: exemplos/*.ptn, exemplos/regressao/*.ptn (divergências já corrigidas) e programas
+#   aleatórios gerados por gramática (sementes reproduzíveis)
+# - Os dois caminhos rodam com relógio virtual e os mesmos estímulos; compara-se o trace
+#   (linhas da Serial, modos e escritas de pinos, tempos com tolerância)
+# - Casos que divergem são reduzidos (remove instruções/blocos enquanto a divergência continua)
+#   e salvos em --saida; copiados para exemplos/regressao/ viram caso de regressão
+# - Casos em paralelo, um processo por núcleo
+#
+# Uso: python teste_diferencial.py --casos 200 --semente 1 -j 8
+
+from __future__ import annotations
+
+import os
+import re
+import sys
+import glob
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+import interpretador_portuino as ip
+import portuino_compiler as pc
+import simulador_host as sh
+import tradutor_portuino as tp
+
+PASTA_EXEMPLOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exemplos")
+PASTA_REGRESSAO = os.path.join(PASTA_EXEMPLOS, "regressao")
+LIMITE_MS = 2000
+MAX_TENTATIVAS_REDUCAO = 300
+
+# Pinos usados pelos programas gerados (e pelos exemplos)
+_SAIDAS = (8, 12, 13)
+_BOTAO = 2
+_TRIG, _ECO = 9, 10
+
+
+@dataclass
+class Caso:
+    nome: str
+    codigo: str
+    estimulos: List[sh.Estimulo] = field(default_factory=list)
+    nao_bloqueante: bool = False
+
+
+@dataclass
+class ResultadoCaso:
+    nome: str
+    ok: bool
+    motivo: str = ""
+    codigo: str = ""
+    reduzido: Optional[str] = None
+
+
+# ------------------ Gerador de programas ------------------
+
+_PALAVRAS = ("oi", "led", "valor", "x", "Portuino", "fim de teste", "a b")
+
+
+class _GeradorProgramas:
+    """Programas válidos e que terminam (laços contados; o laço infinito final sempre espera)."""
+
+    def __init__(self, semente: int, nao_bloqueante: bool = False):
+        self.r = random.Random(semente)
+        self.nao_bloqueante = nao_bloqueante
+        self.inteiros = ["n1", "n2", "n3"]
+        self.reais = ["x1", "x2"]
+        self.logicos = ["f1"]
+        self.textos = ["t1"]
+        self.vetores = {"inteiro": ("v1", 4), "real": ("r1", 3)}
+        self.chamadas = False  # já existem acao/calc para chamar (não dentro deles: sem recursão)
+        self._sem_esperar = False
+        self.contadores = 0
+        self.enquantos: List[str] = []  # contadores dos "enquanto" (declarados no início)
+        self.lacos: List[str] = []  # variáveis de 'para' em escopo (só leitura)
+        self.contados: List[str] = []  # variáveis declaradas em uso como contador de 'para'
+
+    # ---------- expressões ----------
+    def _lit_real(self) -> str:
+        # múltiplos de 0.25: exatos em float de 32 bits (sem empate de arredondamento ao escrever)
+        s = f"{self.r.randint(-8, 24) * 0.25:.2f}".rstrip("0")
+        return s + "0" if s.endswith(".") else s
+
+    def _item(self, tipo: str, d: int) -> str:
+        # abs(...) % n: índice sempre dentro do vetor
+        nome, n = self.vetores[tipo]
+        return f"{nome}[abs({self.inteiro(max(0, d - 1))}) % {n}]"
+
+    def inteiro(self, d: int) -> str:
+        r = self.r
+        formas = ["lit", "var"] + (["soma", "sub", "mul", "div", "mod", "par", "fn", "conv", "ler", "item", "tamanho"]
+                                   if d > 0 else [])
+        if d > 0 and self.chamadas:
+            formas.append("funcao")
+        f = r.choice(formas)
+        if f == "funcao":
+            return f"calc({self.inteiro(d - 1)})"
+        if f == "lit":
+            return str(r.randint(-5, 20))
+        if f == "var":
+            return r.choice(self.inteiros + self.lacos)
+        if f == "item":
+            return self._item("inteiro", d)
+        if f == "tamanho":
+            return f"tamanho({r.choice([v for v, _ in self.vetores.values()])})"
+        if f == "soma":
+            return f"{self.inteiro(d - 1)} + {self.inteiro(d - 1)}"
+        if f == "sub":
+            return f"{self.inteiro(d - 1)} - {self.inteiro(d - 1)}"
+        if f == "mul":
+            return f"{self.inteiro(d - 1)} * {r.randint(0, 4)}"
+        if f == "div":
+            return f"{self.inteiro(d - 1)} / {r.randint(1, 5)}"
+        if f == "mod":
+            return f"{self.inteiro(d - 1)} % {r.randint(1, 5)}"
+        if f == "par":
+            return f"({self.inteiro(d - 1)})"
+        if f == "fn":
+            nome = r.choice(("abs", "min", "max"))
+            if nome == "abs":
+                return f"abs({self.inteiro(d - 1)})"
+            return f"{nome}({self.inteiro(d - 1)}, {self.inteiro(d - 1)})"
+        if f == "conv":
+            return f"int({self.real(d - 1)})"
+        return f"ler({_BOTAO})"
+
+    def real(self, d: int) -> str:
+        r = self.r
+        formas = ["lit", "var"] + (["soma", "sub", "mul", "div", "misto", "conv", "item"] if d > 0 else [])
+        f = r.choice(formas)
+        if f == "lit":
+            return self._lit_real()
+        if f == "var":
+            return r.choice(self.reais)
+        if f == "item":
+            return self._item("real", d)
+        if f == "soma":
+            return f"{self.real(d - 1)} + {self.real(d - 1)}"
+        if f == "sub":
+            return f"{self.real(d - 1)} - {self.real(d - 1)}"
+        if f == "mul":
+            return f"{self.real(d - 1)} * {r.randint(0, 3)}"
+        if f == "div":
+            return f"({self.real(d - 1)}) / {r.choice(('2.0', '4.0'))}"
+        if f == "misto":
+            return f"{self.real(d - 1)} + {self.inteiro(d - 1)}"
+        return f"float({self.inteiro(d - 1)})"
+
+    def logico(self, d: int) -> str:
+        r = self.r
+        formas = ["lit", "var", "cmp"] + (["e", "ou", "nao", "cmp_real", "botao"] if d > 0 else [])
+        f = r.choice(formas)
+        if f == "lit":
+            return r.choice(("verdadeiro", "falso"))
+        if f == "var":
+            return r.choice(self.logicos)
+        if f == "cmp":
+            op = r.choice(("<", ">", "<=", ">=", "==", "!="))
+            return f"{self.inteiro(max(0, d - 1))} {op} {self.inteiro(max(0, d - 1))}"
+        if f == "cmp_real":
+            return f"{self.real(d - 1)} {r.choice(('<', '>='))} {self.real(d - 1)}"
+        if f == "botao":
+            return f"ler({_BOTAO}) == {r.randint(0, 1)}"
+        if f == "nao":
+            return f"{r.choice(('not', '!'))} ({self.logico(d - 1)})"
+        op = {"e": ("and", "&&"), "ou": ("or", "||")}[f]
+        return f"({self.logico(d - 1)}) {r.choice(op)} ({self.logico(d - 1)})"
+
+    def texto(self, d: int) -> str:
+        r = self.r
+        formas = ["lit"] + (["var"] if self.textos else []) + (["concat", "concat_esq", "str"] if d > 0 else [])
+        f = r.choice(formas)
+        if f == "lit":
+            return f'"{r.choice(_PALAVRAS)}"'
+        if f == "var":
+            return r.choice(self.textos)
+        if f == "concat":
+            # parênteses: "a" + x < 3 seria (texto < 3), mal tipado nos dois caminhos
+            return f"{self.texto(d - 1)} + ({self.qualquer(d - 1)})"
+        if f == "concat_esq":
+            # 1 + 2 + "a": a soma numérica acontece antes da concatenação
+            return f'{self.inteiro(d - 1)} + {self.inteiro(0)} + "{r.choice(_PALAVRAS)}"'
+        return f"str({self.inteiro(d - 1)})"
+
+    def qualquer(self, d: int) -> str:
+        return getattr(self, self.r.choice(("inteiro", "real", "logico", "texto")))(d)
+
+    # ---------- instruções ----------
+    def _esperar(self) -> str:
+        valores = (20, 50, 100) if self.nao_bloqueante else (0, 1, 10, 50, 100)
+        return f"esperar({self.r.choice(valores)})"
+
+    def _comentario(self, linha: str) -> str:
+        return linha + "  // comentário" if self.r.random() < 0.1 else linha
+
+    def bloco(self, d: int, nivel: int, minimo: int = 1) -> List[str]:
+        linhas: List[str] = []
+        for _ in range(self.r.randint(minimo, 4)):
+            linhas += self.instrucao(d, nivel)
+        return linhas
+
+    def instrucao(self, d: int, nivel: int) -> List[str]:
+        r = self.r
+        ind = "    " * nivel
+        formas = ["atrib"] * 3 + ["escrever"] * 3 + ["pino"] * 2 + ["esperar", "item"]
+        if d > 0:
+            formas += ["se", "se", "enquanto", "para", "decl", "distancia"]
+        if self.chamadas:
+            formas.append("chamar")
+        f = r.choice(formas)
+
+        if f == "chamar":
+            return [ind + f"acao({self.inteiro(1)}, {self.real(1)})"]
+
+        if f == "item":
+            if r.random() < 0.5:
+                return [ind + f"{self._item('inteiro', 2)} <- ({self.inteiro(2)}) % 1000"]
+            return [ind + f"{self._item('real', 2)} <- max(min({self.real(2)}, 1000.0), -1000.0)"]
+
+        if f == "atrib":
+            tipo = r.choice(("inteiro", "real", "logico", "texto"))
+            if tipo == "inteiro":
+                # % 1000 mantém os valores longe do estouro (int de 16 bits no Uno)
+                return [ind + self._comentario(f"{r.choice(self.inteiros)} <- ({self.inteiro(2)}) % 1000")]
+            if tipo == "real":
+                return [ind + f"{r.choice(self.reais)} <- max(min({self.real(2)}, 1000.0), -1000.0)"]
+            if tipo == "logico":
+                return [ind + f"{r.choice(self.logicos)} <- {self.logico(2)}"]
+            # o texto pode crescer a cada volta, mas nunca dobrar (t <- t + t estoura a memória)
+            textos, self.textos = self.textos, []
+            t = r.choice(textos)
+            valor = self.texto(2) if r.random() < 0.5 else f"{t} + ({self.qualquer(1)})"
+            self.textos = textos
+            return [ind + f"{t} <- {valor}"]
+        if f == "decl":
+            # declaração repetida dentro de bloco: reinicia a variável a cada passagem
+            if r.random() < 0.2:
+                tipo = r.choice(list(self.vetores))
+                nome, n = self.vetores[tipo]
+                return [ind + f"vetor {tipo} {nome}[{n}]"]
+            # (parâmetro não pode ser declarado de novo no procedimento)
+            return [ind + f"inteiro {r.choice([v for v in self.inteiros if v != 'a'])} <- {r.randint(0, 9)}"]
+        if f == "escrever":
+            return [ind + self._comentario(f"escrever({self.qualquer(2)})")]
+        if f == "pino":
+            return [ind + f"{r.choice(('ligar', 'desligar'))}({r.choice(_SAIDAS)})"]
+        if f == "esperar":
+            return [ind + (self._esperar() if not self._sem_esperar else f"escrever({self.qualquer(1)})")]
+        if f == "distancia":
+            return [ind + f"{r.choice(self.inteiros)} <- medir_distancia({_TRIG}, {_ECO})"]
+        if f == "se":
+            linhas = [ind + f"se ({self.logico(2)})" + (" entao" if r.random() < 0.5 else "")]
+            linhas += self.bloco(d - 1, nivel + 1)
+            if r.random() < 0.5:
+                linhas += [ind + "senao"] + self.bloco(d - 1, nivel + 1)
+            return linhas + [ind + "fim_se"]
+        if f == "enquanto":
+            self.contadores += 1
+            w = f"w{self.contadores}"
+            self.enquantos.append(w)
+            linhas = [ind + f"{w} <- 0", ind + f"enquanto ({w} < {r.randint(0, 4)})" + (" faca" if r.random() < 0.5 else "")]
+            linhas += [ind + "    " + f"{w} <- {w} + 1"] + self.bloco(d - 1, nivel + 1)
+            return linhas + [ind + "fim_enquanto"]
+        # para: contador novo (i1, i2...) ou uma variável já declarada, lida depois do laço
+        # (o valor final e a declaração repetida dentro do corpo têm de bater com a placa)
+        passo = r.choice((1, 1, 2, 3, -1, -2))
+        a = r.randint(-3, 6)
+        b = a + passo * r.randint(-1, 4)
+        existentes = [v for v in self.inteiros if v not in self.contados]
+        if existentes and r.random() < 0.5:
+            i = r.choice(existentes)
+            # o corpo só lê o contador: atribuir a ele poderia nunca terminar o laço
+            self.contados.append(i)
+            self.inteiros = [v for v in self.inteiros if v != i]
+            self.lacos.append(i)
+            corpo = self.bloco(d - 1, nivel + 1)
+            self.lacos.remove(i)
+            self.inteiros = self.inteiros + [i]
+            self.contados.remove(i)
+            depois = [ind + f'escrever("{i} = " + {i})']
+        else:
+            self.contadores += 1
+            i = f"i{self.contadores}"
+            self.lacos.append(i)
+            corpo = self.bloco(d - 1, nivel + 1)
+            self.lacos.remove(i)
+            depois = []
+        return [ind + f"para {i} de {a} ate {b} passo {passo}"] + corpo + [ind + "fim_para"] + depois
+
+    def _subrotinas(self) -> List[str]:
+        """
+        acao: procedimento com efeitos (pinos, escrita, globais; sem esperar no modo não
+        bloqueante, já que as tarefas o chamam). calc: funcao pura, porque a ordem em que o
+        C++ avalia os operandos de uma expressão não é definida.
+        """
+        r = self.r
+        inteiros, reais, nao_bloqueante = self.inteiros, self.reais, self.nao_bloqueante
+        self.inteiros, self.reais = inteiros + ["a"], reais + ["b"]
+        self._sem_esperar = nao_bloqueante
+        acao = ["procedimento acao(inteiro a, real b)"] + self.bloco(1, 1) + ["fim_procedimento"]
+        self._sem_esperar = False
+        self.inteiros, self.reais = ["a", "k"], reais
+        calc = [
+            "funcao inteiro calc(inteiro a)",
+            f"    inteiro k <- ({self.inteiro(1)}) % 100",
+            f"    se ({self.logico(1)})",
+            f"        retornar ({self.inteiro(2)}) % 1000",
+            "    fim_se",
+            f"    k <- ({self.inteiro(2)}) % 1000",
+        ] + (["    retornar k"] if r.random() < 0.7 else []) + ["fim_funcao"]  # sem retornar: devolve 0
+        self.inteiros = inteiros
+        self.chamadas = True
+        return acao + [""] + calc + [""]
+
+    def _quando_mudar(self) -> List[str]:
+        """quando_mudar no pino do botão (os estímulos alternam 1/0): corpo sem esperar."""
+        r = self.r
+        self._sem_esperar = True
+        corpo = self.bloco(1, 1)
+        self._sem_esperar = False
+        borda = r.choice(("subida", "descida", "mudanca"))
+        return [f"quando_mudar({_BOTAO}, {borda})", f'    escrever("borda {borda}")'] + corpo + ["fim_quando_mudar", ""]
+
+    def programa(self) -> str:
+        r = self.r
+        subrotinas = self._subrotinas() if r.random() < 0.5 else []
+        corpo = self.bloco(3, 1, minimo=3)
+        infinito = r.random() < 0.5 or self.nao_bloqueante
+        laco: List[str] = []
+        if infinito:
+            espera = f"        esperar({r.choice((20, 50, 100))})"  # o laço infinito sempre avança o relógio
+            laco = ["    enquanto (verdadeiro)"] + self.bloco(2, 2) + [espera, "    fim_enquanto"]
+        quando = self._quando_mudar() if r.random() < 0.3 else []  # antes das declarações (usa as globais)
+        decls = [f"    inteiro {v} <- {r.randint(-3, 9)}" for v in self.inteiros]
+        decls += [f"    real {v} <- {self._lit_real()}" for v in self.reais]
+        decls += [f"    logico {v} <- {r.choice(('verdadeiro', 'falso'))}" for v in self.logicos]
+        decls += [f'    texto {v} <- "{r.choice(_PALAVRAS)}"' for v in self.textos]
+        decls += [f"    inteiro {w} <- 0" for w in self.enquantos]
+        decls += [f"    vetor {tipo} {nome}[{n}]" for tipo, (nome, n) in self.vetores.items()]
+        pinos = [f"    configurar_saida({p})" for p in _SAIDAS + (_TRIG,)]
+        pinos += [f"    configurar_entrada({p})" for p in (_BOTAO, _ECO)]
+        programa = ["inicio"] + decls + pinos + ["    // programa gerado"] + corpo + laco + ["fim", ""]
+        return "\n".join(subrotinas + quando + programa)
+
+    def estimulos(self, limite_ms: int) -> List[sh.Estimulo]:
+        r = self.r
+        tempos = sorted(r.uniform(0, limite_ms) for _ in range(r.randint(0, 6)))
+        est = [sh.Estimulo(round(t, 3), _BOTAO, 1 - k % 2) for k, t in enumerate(tempos)]
+        if r.random() < 0.7:
+            est.append(sh.Estimulo(0, _ECO, r.choice((0, 580, 1160, 5800)), "pulso"))
+        return est
+
+
+def gerar_casos(n: int, semente: int, limite_ms: int, nao_bloqueante: bool = False) -> List[Caso]:
+    casos = []
+    for k in range(n):
+        s = semente * 100000 + k
+        g = _GeradorProgramas(s, nao_bloqueante)
+        casos.append(Caso(f"gerado-{s}", g.programa(), g.estimulos(limite_ms), nao_bloqueante))
+    return casos
+
+
+def casos_exemplos(limite_ms: int) -> List[Caso]:
+    """
+    exemplos/*.ptn com estímulos padrão (botão alternando, eco de 10 cm) e exemplos/regressao/*.ptn,
+    com o modo e os estímulos do cabeçalho que _salvar_falha escreve (sem estímulos: os padrão).
+    """
+    est = [sh.Estimulo(t, _BOTAO, (t // 150) % 2) for t in range(150, limite_ms, 150)]
+    est.append(sh.Estimulo(0, _ECO, 580, "pulso"))
+    casos = []
+    for arq in sorted(glob.glob(os.path.join(PASTA_EXEMPLOS, "*.ptn"))):
+        with open(arq, "r", encoding="utf-8") as f:
+            nome = os.path.splitext(os.path.basename(arq))[0]
+            casos.append(Caso(f"exemplo-{nome}", f.read(), est))
+    for arq in sorted(glob.glob(os.path.join(PASTA_REGRESSAO, "*.ptn"))):
+        with open(arq, "r", encoding="utf-8") as f:
+            codigo = f.read()
+        nome = os.path.splitext(os.path.basename(arq))[0]
+        nao_bloqueante = bool(re.search(r"^// nao_bloqueante: True$", codigo, re.M))
+        proprios = [
+            sh.Estimulo(int(t), int(p), int(v), "pulso" if pulso else "digital")
+            for t, pulso, p, v in re.findall(r"^// estímulo: (\d+) (pulso )?(\d+) (\d+)$", codigo, re.M)
+        ]
+        casos.append(Caso(f"regressao-{nome}", codigo, proprios or est, nao_bloqueante))
+    return casos
+
+
+# ------------------ Execução e comparação ------------------
+
+Trace = List[Tuple[int, tuple]]
+
+
+def _normalizar(eventos: Sequence[tuple]) -> Trace:
+    """(t_us, chave); pinMode repetido (mesmo modo) não conta — o interpretador nem repete."""
+    modos = {}
+    saida = []
+    for t, tipo, pino, valor, texto in eventos:
+        if tipo == "fim":
+            continue
+        if tipo == "modo":
+            if modos.get(pino) == valor:
+                continue
+            modos[pino] = valor
+        saida.append((t, ("serial", texto) if tipo == "serial" else (tipo, pino, valor)))
+    return saida
+
+
+def _tolerancia(t_us: int, nao_bloqueante: bool) -> int:
+    # esperar() com millis() tem resolução de 1 ms por chamada: folga maior no modo não bloqueante
+    return 2000 + int(t_us * (0.10 if nao_bloqueante else 0.02))
+
+
+def _descrever(chave: tuple) -> str:
+    if chave[0] == "serial":
+        return f"escrever -> {chave[1]!r}"
+    if chave[0] == "modo":
+        return f"PINO {chave[1]} modo {'SAÍDA' if chave[2] else 'ENTRADA'}"
+    return f"PINO {chave[1]} = {chave[2]}"
+
+
+def _corrida(ta: int, tb: int, estimulos_us: Sequence[int], nao_bloqueante: bool) -> bool:
+    """Um estímulo caiu na janela de folga do evento: cada lado pode ter lido a entrada antes/depois."""
+    folga = _tolerancia(max(ta, tb), nao_bloqueante)
+    return any(min(ta, tb) - folga <= t <= max(ta, tb) + folga for t in estimulos_us)
+
+
+def comparar(
+    interp: Trace, host: Trace, limite_us: int, terminou: bool, nao_bloqueante: bool,
+    estimulos_us: Sequence[int] = (),
+) -> Optional[str]:
+    """Primeira divergência (None = equivalentes ou inconclusivo por corrida com um estímulo)."""
+    for k, ((ta, a), (tb, b)) in enumerate(zip(interp, host)):
+        if a != b:
+            if _corrida(ta, tb, estimulos_us, nao_bloqueante):
+                return None
+            return f"evento {k + 1}: interpretador {_descrever(a)} (t={ta / 1000:.3f} ms) x " \
+                   f"sketch {_descrever(b)} (t={tb / 1000:.3f} ms)"
+        if abs(ta - tb) > _tolerancia(max(ta, tb), nao_bloqueante):
+            return f"evento {k + 1} ({_descrever(a)}): interpretador em {ta / 1000:.3f} ms x sketch em {tb / 1000:.3f} ms"
+    n = min(len(interp), len(host))
+    if len(interp) == len(host):
+        return None
+    # Eventos a mais só são aceitos perto do limite (o outro lado pode ter sido cortado pelo tempo)
+    longo, quem = (interp, "interpretador") if len(interp) > len(host) else (host, "sketch")
+    t, chave = longo[n]
+    if quem == "sketch" and terminou:
+        return f"sketch continuou depois do fim do programa: {_descrever(chave)} (t={t / 1000:.3f} ms)"
+    if t < limite_us - _tolerancia(limite_us, nao_bloqueante):
+        return f"só o {quem} teve o evento {n + 1}: {_descrever(chave)} (t={t / 1000:.3f} ms)"
+    return None
+
+
+def executar_caso(caso: Caso, limite_ms: int = LIMITE_MS) -> Optional[str]:
+    """None se os dois caminhos concordam; senão, o motivo."""
+    est_ip = [(int(e.t_ms * 1000), "P" if e.tipo == "pulso" else "D", e.pino, int(e.valor)) for e in caso.estimulos]
+    try:
+        rel = ip.simular_codigo(caso.codigo, limite_ms, est_ip)
+    except Exception as e:
+        return f"interpretador falhou: {type(e).__name__}: {e}"
+    if rel.passos > rel.max_passos:
+        return None  # laço sem esperar(): inconclusivo (o sketch também não avançaria o relógio)
+    try:
+        host = sh.simular(caso.codigo, limite_ms=limite_ms, estimulos=caso.estimulos,
+                          nao_bloqueante=caso.nao_bloqueante)
+    except pc.ErroArduinoCli as e:
+        return f"sketch gerado não compila: {e.saida.strip().splitlines()[-1] if e.saida.strip() else e}"
+    except sh.ErroSimulador as e:
+        return f"sketch falhou: {e}"
+    eventos_host = [(e.t_us, e.tipo, e.pino, e.valor, e.texto) for e in host.eventos]
+    bordas = [t for t, tipo, _, _ in est_ip if tipo == "D"]
+    return comparar(_normalizar(rel.eventos), _normalizar(eventos_host), limite_ms * 1000,
+                    rel.terminou, caso.nao_bloqueante, bordas)
+
+
+# ------------------ Redução ------------------
+
+def _candidatos(linhas: List[str]) -> List[Tuple[int, int]]:
+    """Trechos removíveis (início, fim inclusive): instruções simples e blocos inteiros."""
+    fins = {"se": "fim_se", "enquanto": "fim_enquanto", "para": "fim_para"}
+    trechos = []
+    pilha: List[Tuple[int, str]] = []
+    for i, ln in enumerate(linhas):
+        s = tp._sem_comentario(ln.strip())
+        if s in ("inicio", "fim", "", "senao") or s.startswith("//"):
+            continue
+        m = re.match(r"^(se|enquanto|para)\b", s)
+        if m:
+            pilha.append((i, fins[m.group(1)]))
+        elif pilha and s == pilha[-1][1]:
+            ini, _ = pilha.pop()
+            trechos.append((ini, i))
+        else:
+            trechos.append((i, i))
+    # blocos grandes primeiro: reduzem mais rápido
+    return sorted(trechos, key=lambda t: t[0] - t[1])
+
+
+def reduzir(caso: Caso, limite_ms: int = LIMITE_MS) -> Caso:
+    """Remove instruções/blocos enquanto o caso continuar divergindo (mesma categoria de motivo)."""
+    motivo = executar_caso(caso, limite_ms)
+    if motivo is None:
+        return caso
+    categoria = motivo.split(":")[0]
+    linhas = caso.codigo.splitlines()
+    tentativas = 0
+    mudou = True
+    while mudou and tentativas < MAX_TENTATIVAS_REDUCAO:
+        mudou = False
+        for ini, fim in _candidatos(linhas):
+            tentativas += 1
+            novo = linhas[:ini] + linhas[fim + 1:]
+            teste = Caso(caso.nome, "\n".join(novo) + "\n", caso.estimulos, caso.nao_bloqueante)
+            m = executar_caso(teste, limite_ms)
+            if m is not None and m.split(":")[0] == categoria:
+                linhas = novo
+                mudou = True
+                break
+            if tentativas >= MAX_TENTATIVAS_REDUCAO:
+                break
+    return Caso(caso.nome, "\n".join(linhas) + "\n", caso.estimulos, caso.nao_bloqueante)
+
+
+def _rodar(caso: Caso, limite_ms: int, reduzir_falhas: bool) -> ResultadoCaso:
+    motivo = executar_caso(caso, limite_ms)
+    if motivo is None:
+        return ResultadoCaso(caso.nome, True)
+    reduzido = reduzir(caso, limite_ms).codigo if reduzir_falhas else None
+    return ResultadoCaso(caso.nome, False, motivo, caso.codigo, reduzido)
+
+
+def rodar_casos(
+    casos: Sequence[Caso], limite_ms: int = LIMITE_MS, jobs: Optional[int] = None, reduzir_falhas: bool = True
+) -> List[ResultadoCaso]:
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as ex:
+        futuros = [ex.submit(_rodar, c, limite_ms, reduzir_falhas) for c in casos]
+        resultados = []
+        for c, f in zip(casos, futuros):
+            try:
+                resultados.append(f.result())
+            except Exception as e:  # processo morto (ex.: memória) não derruba o relatório
+                resultados.append(ResultadoCaso(c.nome, False, f"erro no teste: {type(e).__name__}: {e}", c.codigo))
+        return resultados
+
+
+def _salvar_falha(pasta: str, caso: Caso, r: ResultadoCaso) -> str:
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f"{r.nome}.ptn")
+    cabecalho = [f"// {r.motivo}", f"// nao_bloqueante: {caso.nao_bloqueante}"]
+    cabecalho += [f"// estímulo: {e.t_ms} {'pulso ' if e.tipo == 'pulso' else ''}{e.pino} {int(e.valor)}"
+                  for e in caso.estimulos]
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("\n".join(cabecalho) + "\n" + (r.reduzido or r.codigo))
+    return caminho
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Compara interpretador e sketch gerado (simulação no PC).")
+    ap.add_argument("--casos", type=int, default=100, help="programas gerados aleatoriamente")
+    ap.add_argument("--semente", type=int, default=1)
+    ap.add_argument("--ate", type=int, default=LIMITE_MS, help="tempo virtual por caso (ms)")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--nao-bloqueante", action="store_true", help="gera o sketch no modo não bloqueante")
+    ap.add_argument("--sem-exemplos", action="store_true")
+    ap.add_argument("--sem-reducao", action="store_true")
+    ap.add_argument("--saida", default="falhas_diferencial", help="pasta dos casos que divergiram")
+    args = ap.parse_args(argv)
+
+    try:
+        sh._compilador()
+    except sh.ErroSimulador as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    casos = [] if args.sem_exemplos else casos_exemplos(args.ate)
+    casos += gerar_casos(args.casos, args.semente, args.ate, args.nao_bloqueante)
+    resultados = rodar_casos(casos, args.ate, args.jobs, not args.sem_reducao)
+
+    falhas = [(c, r) for c, r in zip(casos, resultados) if not r.ok]
+    for c, r in falhas:
+        print(f"[DIVERGE] {r.nome}: {r.motivo}")
+        print(f"          salvo em {_salvar_falha(args.saida, c, r)}")
+    print(f"{len(casos) - len(falhas)}/{len(casos)} casos equivalentes.")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
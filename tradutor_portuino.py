@@ -0,0 +1,1423 @@
+# tradutor_portuino.py
+# Tradutor (educacional) Portuino -> Arduino C++ (.ino)
+#
+# 1) analisar(): texto -> árvore de blocos (Decl/Atribuicao/Comando/Se/Enquanto/Para),
+#    cada nó com a linha de origem (para o mapa de linhas e mensagens de erro)
+# 2) traduzir(): variáveis globais declaradas uma vez, inicialização em setup()
+#    e o "enquanto (verdadeiro)" final como loop() — mesma semântica do interpretador
+# 3) traduções guardadas num cache LRU (hash do texto + opções): verificar, enviar e a
+#    prévia do C++ na IDE não retraduzem um programa que não mudou
+# 4) tradução incremental: cada bloco de nível superior (instrução, se, enquanto, para) é
+#    analisado e gerado uma vez; numa edição só os blocos alterados são refeitos, os outros
+#    reaproveitam o C++ já gerado (linhas relativas ao bloco, deslocadas na montagem)
+# 5) procedimentos e funções (antes de 'inicio') viram funções C++ com variáveis locais;
+#    as pequenas (poucas instruções, sem laço nem recursão) saem como inline
+# 6) quando_mudar(pino, borda): attachInterrupt com uma ISR que só conta a borda (volatile);
+#    o corpo roda fora da interrupção, nos esperar() e a cada volta de laço
+
+from __future__ import annotations
+
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple, Union
+
+
+class ErroTraducao(RuntimeError):
+    """Programa Portuino mal formado (ex.: 'se' sem 'fim_se'). `linha` a partir de 1."""
+    def __init__(self, linha: int, mensagem: str):
+        super().__init__(f"Linha {linha}: {mensagem}")
+        self.linha = linha
+        self.mensagem = mensagem
+
+
+# ------------------ Árvore ------------------
+
+@dataclass
+class Decl:
+    linha: int
+    tipo: str       # inteiro | real | logico | texto | inteiro[N] (vetor: tipo do item e tamanho)
+    nome: str
+    expr: str       # vazio no vetor (começa zerado)
+
+@dataclass
+class Atribuicao:
+    linha: int
+    nome: str
+    expr: str
+    indice: Optional[str] = None    # v[indice] <- expr
+
+@dataclass
+class Comando:
+    linha: int
+    texto: str      # ligar(13), esperar(100), escrever(...), C++ direto...
+
+@dataclass
+class Se:
+    linha: int
+    cond: str
+    entao: List["No"]
+    senao: List["No"]
+    linha_senao: Optional[int]
+    linha_fim: int
+
+@dataclass
+class Enquanto:
+    linha: int
+    cond: str
+    corpo: List["No"]
+    linha_fim: int
+
+@dataclass
+class Para:
+    linha: int
+    var: str
+    de: str
+    ate: str
+    passo: str
+    corpo: List["No"]
+    linha_fim: int
+
+@dataclass
+class Retornar:
+    linha: int
+    expr: Optional[str]     # None: sai do procedimento
+
+@dataclass
+class Subrotina:
+    linha: int
+    nome: str
+    retorno: Optional[str]              # tipo devolvido pela funcao; None = procedimento
+    params: List[Tuple[str, str]]       # (tipo, nome), passados por valor
+    corpo: List["No"]
+    linha_fim: int
+
+@dataclass
+class QuandoMudar:
+    linha: int
+    pino: int
+    borda: str                          # subida | descida | mudanca
+    corpo: List["No"]
+    linha_fim: int
+
+No = Union[Decl, Atribuicao, Comando, Se, Enquanto, Para, Retornar, Subrotina, QuandoMudar]
+
+
+# ------------------ Análise ------------------
+
+# "entao"/"faca" são opcionais (os exemplos e muitos alunos omitem)
+_SE_RE = re.compile(r"^se\s*\((.*)\)\s*(?:entao)?$")
+_ENQUANTO_RE = re.compile(r"^enquanto\s*\((.*)\)\s*(?:faca)?$")
+_PARA_RE = re.compile(r"^para\s+(\w+)\s+de\s+(.*)\s+ate\s+(.*)\s+passo\s+(.*)$")
+_DECL_RE = re.compile(r"^(inteiro|real|logico|texto)\s+(\w+)\s*<-\s*(.+)$")
+_VETOR_DECL_RE = re.compile(r"^vetor\s+(\w+)\s+(\w+)\s*\[(.*)\]$")
+_ATRIB_RE = re.compile(r"^(\w+)\s*<-\s*(.+)$")
+_ATRIB_ITEM_RE = re.compile(r"^(\w+)\s*\[(.*)\]\s*<-\s*(.+)$")
+_TIPOS_VETOR = ("inteiro", "real", "logico")
+VETOR_MAX = 32767  # o índice é int (16 bits no AVR)
+_SUB_RE = re.compile(r"^(procedimento|funcao)\s+(?:(inteiro|real|logico|texto)\s+)?(\w+)\s*\((.*)\)$")
+_ABRE_SUB_RE = re.compile(r"^(procedimento|funcao|quando_mudar)\b")
+_PARAM_RE = re.compile(r"^(inteiro|real|logico|texto)\s+(\w+)$")
+_RETORNAR_RE = re.compile(r"^retornar\b\s*(.*)$")
+_QUANDO_RE = re.compile(r"^quando_mudar\s*\(\s*(\d+)\s*,\s*(\w+)\s*\)$")
+_BORDAS = {"subida": "RISING", "descida": "FALLING", "mudanca": "CHANGE"}
+_FIM_SUB = {"procedimento": "fim_procedimento", "funcao": "fim_funcao", "quando_mudar": "fim_quando_mudar"}
+_FECHAMENTOS = ("senao", "fim_se", "fim_enquanto", "fim_para", "fim_procedimento", "fim_funcao", "fim_quando_mudar")
+
+
+def _sem_comentario(s: str) -> str:
+    """Remove '// comentário' no fim da linha (fora de aspas)."""
+    if "//" not in s:
+        return s
+    if '"' not in s:
+        return s[:s.index("//")].rstrip()
+    aspas = False
+    i = 0
+    while i < len(s):
+        ch = s[i]
+        if ch == "\\" and aspas:
+            i += 2
+            continue
+        if ch == '"':
+            aspas = not aspas
+        elif not aspas and s.startswith("//", i):
+            return s[:i].rstrip()
+        i += 1
+    return s
+
+
+def _linhas_programa(code_ptn: str) -> List[Tuple[int, str]]:
+    """
+    (linha, instrução) entre 'inicio' e 'fim', sem comentários nem linhas vazias.
+    Antes de 'inicio' entram só os procedimentos, funções e quando_mudar (o resto continua ignorado).
+    """
+    itens = []
+    em_programa = False
+    fim_sub = None  # fechamento da sub-rotina que está sendo lida antes de 'inicio'
+    for n, ln in enumerate(code_ptn.splitlines(), 1):
+        s = _sem_comentario(ln.strip())
+        if s == "inicio":
+            em_programa = True
+            continue
+        if s == "fim":
+            break
+        m = _ABRE_SUB_RE.match(s)
+        if em_programa:
+            if m:
+                raise ErroTraducao(n, f"'{m.group(1)}' deve ficar antes de 'inicio'.")
+            if s:
+                itens.append((n, s))
+            continue
+        if fim_sub is None and m:
+            fim_sub = _FIM_SUB[m.group(1)]
+        if fim_sub and s:
+            itens.append((n, s))
+            if s == fim_sub:
+                fim_sub = None
+    return itens
+
+
+def _bloco(itens: List[Tuple[int, str]], i: int, fins: Tuple[str, ...]) -> Tuple[List[No], int]:
+    """Lê instruções até encontrar uma de `fins` (retorna o índice dela) ou o fim do programa."""
+    nos: List[No] = []
+    while i < len(itens):
+        n, s = itens[i]
+        if s in fins:
+            return nos, i
+        if s in _FECHAMENTOS:
+            raise ErroTraducao(n, f"'{s}' sem bloco correspondente.")
+
+        m = _ABRE_SUB_RE.match(s)
+        if m:
+            if fins:
+                raise ErroTraducao(n, f"'{m.group(1)}' não pode ficar dentro de outro bloco.")
+            sub, i = _subrotina(itens, i)
+            nos.append(sub)
+            continue
+
+        m = _RETORNAR_RE.match(s)
+        if m:
+            nos.append(Retornar(n, m.group(1).strip() or None))
+            i += 1
+            continue
+
+        m = _SE_RE.match(s)
+        if m:
+            entao, i = _bloco(itens, i + 1, ("senao", "fim_se"))
+            senao: List[No] = []
+            linha_senao = None
+            if i < len(itens) and itens[i][1] == "senao":
+                linha_senao = itens[i][0]
+                senao, i = _bloco(itens, i + 1, ("fim_se",))
+            if i >= len(itens):
+                raise ErroTraducao(n, "'se' sem 'fim_se'.")
+            nos.append(Se(n, m.group(1), entao, senao, linha_senao, itens[i][0]))
+            i += 1
+            continue
+
+        m = _ENQUANTO_RE.match(s)
+        if m:
+            corpo, i = _bloco(itens, i + 1, ("fim_enquanto",))
+            if i >= len(itens):
+                raise ErroTraducao(n, "'enquanto' sem 'fim_enquanto'.")
+            nos.append(Enquanto(n, m.group(1), corpo, itens[i][0]))
+            i += 1
+            continue
+
+        if re.match(r"^para\s", s):
+            m = _PARA_RE.match(s)
+            if not m:
+                raise ErroTraducao(n, "sintaxe: para i de A ate B passo P")
+            corpo, i = _bloco(itens, i + 1, ("fim_para",))
+            if i >= len(itens):
+                raise ErroTraducao(n, "'para' sem 'fim_para'.")
+            var, de, ate, passo = (g.strip() for g in m.groups())
+            nos.append(Para(n, var, de, ate, passo, corpo, itens[i][0]))
+            i += 1
+            continue
+
+        m = _DECL_RE.match(s)
+        if m:
+            nos.append(Decl(n, m.group(1), m.group(2), m.group(3).strip()))
+        elif s.startswith("vetor"):
+            nos.append(_decl_vetor(n, s))
+        else:
+            m = _ATRIB_ITEM_RE.match(s) or _ATRIB_RE.match(s)
+            if m and m.re is _ATRIB_ITEM_RE:
+                nos.append(Atribuicao(n, m.group(1), m.group(3).strip(), m.group(2).strip()))
+            elif m:
+                nos.append(Atribuicao(n, m.group(1), m.group(2).strip()))
+            else:
+                nos.append(Comando(n, s))
+        i += 1
+    return nos, i
+
+
+def _subrotina(itens: List[Tuple[int, str]], i: int) -> Tuple[Union[Subrotina, QuandoMudar], int]:
+    """procedimento nome(inteiro a, ...) / funcao tipo nome(...) / quando_mudar(2, subida) até o fim_."""
+    n, s = itens[i]
+    if s.startswith("quando_mudar"):
+        return _quando_mudar(itens, i)
+    m = _SUB_RE.match(s)
+    if not m or (m.group(1) == "funcao") != bool(m.group(2)):
+        raise ErroTraducao(n, "sintaxe: procedimento nome(inteiro a, ...) ou funcao inteiro nome(inteiro a, ...)")
+    palavra, retorno, nome, lista = m.groups()
+    params: List[Tuple[str, str]] = []
+    for p in (x.strip() for x in lista.split(",")) if lista.strip() else ():
+        mp = _PARAM_RE.match(p)
+        if not mp:
+            raise ErroTraducao(n, f"parâmetro inválido: '{p}' (use: inteiro nome)")
+        if any(mp.group(2) == q for _, q in params):
+            raise ErroTraducao(n, f"parâmetro '{mp.group(2)}' repetido.")
+        params.append((mp.group(1), mp.group(2)))
+    fim = _FIM_SUB[palavra]
+    corpo, i = _bloco(itens, i + 1, (fim,))
+    if i >= len(itens):
+        raise ErroTraducao(n, f"'{palavra}' sem '{fim}'.")
+    return Subrotina(n, nome, retorno, params, corpo, itens[i][0]), i + 1
+
+
+def _quando_mudar(itens: List[Tuple[int, str]], i: int) -> Tuple[QuandoMudar, int]:
+    """quando_mudar(pino, subida|descida|mudanca): o pino é um número (a interrupção é ligada em setup)."""
+    n, s = itens[i]
+    m = _QUANDO_RE.match(s)
+    if not m or m.group(2) not in _BORDAS:
+        raise ErroTraducao(n, f"sintaxe: quando_mudar(2, subida) (borda: {', '.join(_BORDAS)}; pino é um número)")
+    corpo, i = _bloco(itens, i + 1, ("fim_quando_mudar",))
+    if i >= len(itens):
+        raise ErroTraducao(n, "'quando_mudar' sem 'fim_quando_mudar'.")
+    return QuandoMudar(n, int(m.group(1)), m.group(2), corpo, itens[i][0]), i + 1
+
+
+def _decl_vetor(n: int, s: str) -> Decl:
+    """vetor inteiro v[10]: tamanho fixo, conhecido na tradução (vira int v[10] no sketch)."""
+    m = _VETOR_DECL_RE.match(s)
+    if not m:
+        raise ErroTraducao(n, "sintaxe: vetor inteiro nome[tamanho]")
+    tipo, nome, tamanho = m.group(1), m.group(2), m.group(3).strip()
+    if tipo not in _TIPOS_VETOR:
+        raise ErroTraducao(n, f"vetor de {tipo} não é suportado (use {', '.join(_TIPOS_VETOR)}).")
+    if not re.fullmatch(r"\d+", tamanho) or not 1 <= int(tamanho) <= VETOR_MAX:
+        raise ErroTraducao(n, f"tamanho do vetor '{nome}' deve ser um número de 1 a {VETOR_MAX}: [{tamanho}]")
+    return Decl(n, f"{tipo}[{int(tamanho)}]", nome, "")
+
+
+def _vetor(tipo: Optional[str]) -> Optional[Tuple[str, int]]:
+    """'inteiro[10]' -> ('inteiro', 10); None se não é vetor."""
+    m = re.fullmatch(r"(\w+)\[(\d+)\]", tipo or "")
+    return (m.group(1), int(m.group(2))) if m else None
+
+
+def _nome_tipo(tipo: str) -> str:
+    v = _vetor(tipo)
+    return f"vetor {v[0]}[{v[1]}]" if v else tipo
+
+
+def analisar(code_ptn: str) -> List[No]:
+    """Árvore do programa (instruções de nível superior)."""
+    return [b.no for b in _blocos(code_ptn)]
+
+
+@dataclass
+class _Bloco:
+    """Instrução de nível superior e o trecho de onde veio (chave dos caches incrementais)."""
+    no: No
+    itens: Optional[Tuple[Tuple[int, str], ...]]    # (linha relativa, instrução); None = sem cache
+    desloc: int                                     # linha absoluta = relativa + desloc
+    nomes: FrozenSet[str] = frozenset()             # identificadores do trecho
+
+
+def _abre_bloco(s: str) -> bool:
+    if not s.startswith(("se", "enquanto", "para", "procedimento", "funcao", "quando_mudar")):
+        return False
+    return bool(_SE_RE.match(s) or _ENQUANTO_RE.match(s) or re.match(r"^para\s", s) or _ABRE_SUB_RE.match(s))
+
+
+def _grupos_topo(itens: List[Tuple[int, str]]) -> Optional[List[List[Tuple[int, str]]]]:
+    """Itens separados por instrução de nível superior; None se os blocos não fecham."""
+    grupos: List[List[Tuple[int, str]]] = []
+    nivel = 0
+    for item in itens:
+        s = item[1]
+        if nivel == 0:
+            grupos.append([])
+        grupos[-1].append(item)
+        if _abre_bloco(s):
+            nivel += 1
+        elif s in _FECHAMENTOS[1:]:
+            nivel -= 1
+            if nivel < 0:
+                return None
+    return grupos if nivel == 0 else None
+
+
+def _deslocar(no: No, d: int) -> No:
+    """Cópia do nó com as linhas somadas de d."""
+    if not d:
+        return no
+    if isinstance(no, Se):
+        return replace(
+            no, linha=no.linha + d, linha_fim=no.linha_fim + d,
+            linha_senao=None if no.linha_senao is None else no.linha_senao + d,
+            entao=[_deslocar(x, d) for x in no.entao], senao=[_deslocar(x, d) for x in no.senao],
+        )
+    if isinstance(no, (Enquanto, Para, Subrotina, QuandoMudar)):
+        return replace(no, linha=no.linha + d, linha_fim=no.linha_fim + d, corpo=[_deslocar(x, d) for x in no.corpo])
+    return replace(no, linha=no.linha + d)
+
+
+def _blocos(code_ptn: str) -> List[_Bloco]:
+    """
+    Instruções de nível superior. Cada trecho é analisado com linhas relativas e guardado
+    em _ANALISES (também já deslocado, para edições que não mudam o número de linhas):
+    inserir linhas acima de um bloco só desloca o bloco, sem analisá-lo de novo.
+    """
+    itens = _linhas_programa(code_ptn)
+    grupos = _grupos_topo(itens)
+    if grupos is None:
+        # blocos sem fechamento: a análise completa aponta o erro
+        nos, _ = _bloco(itens, 0, ())
+        return [_Bloco(no, None, 0) for no in nos]
+
+    blocos = []
+    for grupo in grupos:
+        desloc = grupo[0][0] - 1
+        chave = tuple((n - desloc, s) for n, s in grupo)
+        analisado = _ANALISES.get((chave, desloc))
+        if analisado is None:
+            relativo = _ANALISES.get((chave, 0))
+            if relativo is None:
+                try:
+                    nos, _ = _bloco(list(chave), 0, ())
+                except ErroTraducao as e:
+                    raise ErroTraducao(e.linha + desloc, e.mensagem) from None
+                nomes = frozenset(re.findall(r"[A-Za-z_]\w*", "\n".join(s for _, s in grupo)))
+                relativo = (nos[0], nomes)
+                _ANALISES.put((chave, 0), relativo)
+            analisado = (_deslocar(relativo[0], desloc), relativo[1])
+            _ANALISES.put((chave, desloc), analisado)
+        no, nomes = analisado
+        blocos.append(_Bloco(no, chave, desloc, nomes))
+    return blocos
+
+
+def _percorrer(nos: List[No]):
+    for no in nos:
+        yield no
+        if isinstance(no, Se):
+            yield from _percorrer(no.entao)
+            yield from _percorrer(no.senao)
+        elif isinstance(no, (Enquanto, Para, Subrotina, QuandoMudar)):
+            yield from _percorrer(no.corpo)
+
+
+# ------------------ Expressões ------------------
+# Expressões são analisadas (precedência como em Python/C++) e recebem um tipo Portuino.
+# Com o tipo, "texto" + número vira impressão em partes (Serial.print) sem String no heap,
+# e String só aparece quando um texto é guardado numa variável.
+
+_TOKEN_RE = re.compile(
+    r'\s*(?:(?P<num>\d+\.\d*|\.\d+|\d+)|(?P<str>"(?:\\.|[^"\\])*")|(?P<id>[A-Za-z_]\w*)'
+    r'|(?P<op>==|!=|<=|>=|&&|\|\||[-+*/%<>!(),\[\]]))'
+)
+
+# nome -> (C++, tipo do resultado; None = tipo do 1º argumento)
+_FUNCOES: Dict[str, Tuple[str, Optional[str]]] = {
+    "ler": ("digitalRead", "inteiro"),
+    "medir_distancia": ("medir_distancia", "inteiro"),
+    "int": ("(int)", "inteiro"),
+    "float": ("(float)", "real"),
+    "str": ("String", "texto"),
+    "abs": ("abs", None),
+    "min": ("min", None),
+    "max": ("max", None),
+    "round": ("round", "inteiro"),
+}
+
+
+@dataclass
+class _Expr:
+    cpp: str
+    tipo: str                                  # inteiro | real | logico | texto
+    partes: Optional[List["_Expr"]] = None     # concatenação de texto, já achatada
+    atomo: bool = True                         # pode ser operando sem parênteses
+
+    def parte(self) -> str:
+        """Operando de concatenação/impressão (logico vira "verdadeiro"/"falso")."""
+        if self.tipo == "logico":
+            return f'({self.cpp} ? "verdadeiro" : "falso")'
+        return self.cpp if self.atomo else f"({self.cpp})"
+
+
+def _numerico(a: _Expr, b: _Expr) -> str:
+    return "real" if "real" in (a.tipo, b.tipo) else "inteiro"
+
+
+def _valor_tipo(tipo: Optional[str], e: _Expr) -> str:
+    """C++ de `e` guardado num valor do tipo (texto recebe o número/lógico como no interpretador)."""
+    if tipo == "texto" and e.tipo != "texto":
+        return f"String({e.parte()})"
+    return e.cpp
+
+
+def _assinatura(sig: str) -> Tuple[Optional[str], List[str]]:
+    """'inteiro(inteiro,texto)' -> ('inteiro', ['inteiro', 'texto']); procedimento: (None, [...])."""
+    retorno, _, params = sig.partition("(")
+    return retorno or None, [p for p in params.rstrip(")").split(",") if p]
+
+
+class _AnalisadorExpr:
+    """
+    Descida recursiva: ou > e > nao > comparação > soma > produto > unário > primário.
+    Sub-rotinas do programa estão em `tipos` como "nome()" -> assinatura (veja _assinatura).
+    """
+
+    def __init__(self, texto: str, tipos: Dict[str, str], linha: int, usados: Optional[set] = None,
+                 comando: bool = False):
+        self.texto = texto
+        self.tipos = tipos
+        self.linha = linha
+        self.usados = usados if usados is not None else set()
+        self.comando = comando  # instrução sozinha: aceita chamar procedimento
+        self.toks: List[Tuple[str, str]] = []
+        pos = 0
+        texto = texto.rstrip()
+        while pos < len(texto):
+            m = _TOKEN_RE.match(texto, pos)
+            if not m or m.end() == pos:
+                self._erro(f"símbolo inesperado em '{texto[pos:].strip()}'")
+            self.toks.append((m.lastgroup, m.group(m.lastgroup)))
+            pos = m.end()
+        self.i = 0
+
+    def _erro(self, msg: str):
+        raise ErroTraducao(self.linha, f"expressão inválida ({msg}): {self.texto.strip()}")
+
+    def _ver(self) -> Optional[str]:
+        return self.toks[self.i][1] if self.i < len(self.toks) else None
+
+    def _pegar(self, esperado: Optional[str] = None) -> Tuple[str, str]:
+        if self.i >= len(self.toks):
+            self._erro("fim inesperado")
+        tok = self.toks[self.i]
+        if esperado is not None and tok[1] != esperado:
+            self._erro(f"esperava '{esperado}'")
+        self.i += 1
+        return tok
+
+    def analisar(self) -> _Expr:
+        e = self._ou()
+        if self.i != len(self.toks):
+            self._erro(f"sobrou '{self._ver()}'")
+        return e
+
+    def _logico(self, ops: Tuple[str, ...], cpp: str, prox) -> _Expr:
+        e = prox()
+        while self._ver() in ops:
+            self._pegar()
+            d = prox()
+            e = _Expr(f"{e.cpp} {cpp} {d.cpp}", "logico", atomo=False)
+        return e
+
+    def _ou(self) -> _Expr:
+        return self._logico(("or", "||"), "||", self._e)
+
+    def _e(self) -> _Expr:
+        return self._logico(("and", "&&"), "&&", self._nao)
+
+    def _nao(self) -> _Expr:
+        if self._ver() in ("not", "!"):
+            self._pegar()
+            e = self._nao()
+            return _Expr(f"!{e.cpp}" if e.atomo else f"!({e.cpp})", "logico")
+        return self._comparacao()
+
+    def _comparacao(self) -> _Expr:
+        e = self._soma()
+        while self._ver() in ("==", "!=", "<", ">", "<=", ">="):
+            op = self._pegar()[1]
+            d = self._soma()
+            e = _Expr(f"{e.cpp} {op} {d.cpp}", "logico", atomo=False)
+        return e
+
+    def _soma(self) -> _Expr:
+        e = self._produto()
+        while self._ver() in ("+", "-"):
+            op = self._pegar()[1]
+            d = self._produto()
+            if op == "+" and "texto" in (e.tipo, d.tipo):
+                # Concatenação (como no interpretador: cada parte vira texto)
+                partes = (e.partes or [e]) + (d.partes or [d])
+                cpp = " + ".join([f"String({partes[0].parte()})"] + [p.parte() for p in partes[1:]])
+                e = _Expr(cpp, "texto", partes=partes, atomo=False)
+            else:
+                e = _Expr(f"{e.cpp} {op} {d.cpp}", _numerico(e, d), atomo=False)
+        return e
+
+    def _produto(self) -> _Expr:
+        e = self._unario()
+        while self._ver() in ("*", "/", "%"):
+            op = self._pegar()[1]
+            d = self._unario()
+            e = _Expr(f"{e.cpp} {op} {d.cpp}", _numerico(e, d), atomo=False)
+        return e
+
+    def _unario(self) -> _Expr:
+        if self._ver() in ("-", "+"):
+            op = self._pegar()[1]
+            e = self._unario()
+            return _Expr(f"{op}{e.cpp}" if e.atomo else f"{op}({e.cpp})", e.tipo)
+        return self._primario()
+
+    def _primario(self) -> _Expr:
+        tipo, valor = self._pegar()
+        if tipo == "num":
+            return _Expr(valor, "real" if "." in valor else "inteiro")
+        if tipo == "str":
+            return _Expr(valor, "texto")
+        if valor == "(":
+            e = self._ou()
+            self._pegar(")")
+            if e.partes:
+                return e  # concatenação entre parênteses continua sendo uma só
+            return _Expr(f"({e.cpp})", e.tipo)
+        if tipo == "id":
+            if valor in ("verdadeiro", "VERDADEIRO", "True"):
+                return _Expr("true", "logico")
+            if valor in ("falso", "FALSO", "False"):
+                return _Expr("false", "logico")
+            if self._ver() == "(":
+                return self._tamanho() if valor == "tamanho" else self._chamada(valor)
+            vetor = _vetor(self.tipos.get(valor))
+            if vetor:
+                return self._item(valor, *vetor)
+            if self._ver() == "[":
+                self._erro(f"'{valor}' não é vetor")
+            # Variável do programa ou constante do Arduino (HIGH, A0, LED_BUILTIN...)
+            return _Expr(valor, self.tipos.get(valor, "inteiro"))
+        self._erro(f"'{valor}' fora de lugar")
+
+    def _item(self, nome: str, tipo: str, tamanho: int) -> _Expr:
+        """v[i]: índice inteiro; índice constante é conferido contra o tamanho na tradução."""
+        if self._ver() != "[":
+            self._erro(f"vetor '{nome}' precisa de índice: {nome}[i]")
+        self._pegar("[")
+        i = self._ou()
+        self._pegar("]")
+        if i.tipo != "inteiro":
+            self._erro(f"índice de '{nome}' deve ser inteiro")
+        if re.fullmatch(r"-?\d+", i.cpp) and not 0 <= int(i.cpp) < tamanho:
+            self._erro(f"índice {i.cpp} fora do vetor '{nome}' (0 a {tamanho - 1})")
+        return _Expr(f"{nome}[{i.cpp}]", tipo)
+
+    def _tamanho(self) -> _Expr:
+        """tamanho(v): constante da tradução (o tamanho do vetor é fixo)."""
+        self._pegar("(")
+        _, nome = self._pegar()
+        self._pegar(")")
+        vetor = _vetor(self.tipos.get(nome))
+        if not vetor:
+            self._erro(f"tamanho() espera um vetor, não '{nome}'")
+        return _Expr(str(vetor[1]), "inteiro")
+
+    def _chamada(self, nome: str) -> _Expr:
+        inicio = self.i - 1
+        self._pegar("(")
+        args: List[_Expr] = []
+        if self._ver() != ")":
+            args.append(self._ou())
+            while self._ver() == ",":
+                self._pegar()
+                args.append(self._ou())
+        self._pegar(")")
+        assinatura = self.tipos.get(nome + "()")
+        if assinatura is not None:
+            return self._subrotina(nome, assinatura, args, sozinha=inicio == 0 and self.i == len(self.toks))
+        self.usados.add(nome)
+        cpp, tipo = _FUNCOES.get(nome, (nome, "inteiro"))
+        if tipo is None:
+            tipo = args[0].tipo if args else "inteiro"
+        if cpp.startswith("("):  # conversão: int(x) -> (int)(x)
+            return _Expr(f"{cpp}({args[0].cpp if args else ''})", tipo)
+        return _Expr(f"{cpp}({', '.join(a.cpp for a in args)})", tipo)
+
+
+    def _subrotina(self, nome: str, assinatura: str, args: List[_Expr], sozinha: bool) -> _Expr:
+        retorno, params = _assinatura(assinatura)
+        if len(args) != len(params):
+            self._erro(f"'{nome}' espera {len(params)} argumento(s), recebeu {len(args)}")
+        if retorno is None and not (self.comando and sozinha):
+            self._erro(f"procedimento '{nome}' não devolve valor (use uma funcao)")
+        for k, (tipo, a) in enumerate(zip(params, args), 1):
+            if a.tipo == "texto" and tipo != "texto":
+                self._erro(f"argumento {k} de '{nome}' deve ser {tipo}")
+        cpp = ", ".join(_valor_tipo(tipo, a) for tipo, a in zip(params, args))
+        return _Expr(f"{nome}({cpp})", retorno or "inteiro")
+
+
+def _expr(texto: str, tipos: Dict[str, str], linha: int, usados: Optional[set] = None) -> _Expr:
+    """Analisa a expressão; `usados` recebe os nomes das funções chamadas."""
+    return _AnalisadorExpr(texto, tipos, linha, usados).analisar()
+
+
+def _eh_verdadeiro(cond: str) -> bool:
+    return cond.strip().lower() in ("verdadeiro", "true", "1")
+
+
+def _constante(expr: str) -> bool:
+    """Inicializador que pode ficar na declaração global (sem chamadas nem variáveis)."""
+    sem_textos = re.sub(r'"(?:\\.|[^"\\])*"', '""', expr)
+    return "(" not in sem_textos and not re.search(r"\b(?!verdadeiro\b|falso\b)[A-Za-z_]\w*", sem_textos)
+
+
+def _tabela_tipos(
+    programa: List[No], base: Optional[Dict[str, str]] = None
+) -> Tuple[Dict[str, str], Dict[str, Decl], Dict[str, Atribuicao]]:
+    """
+    (tipos, declaradas, inferidas): variáveis declaradas e as usadas sem declaração
+    (ex.: `distancia <- medir_distancia(...)`), com o tipo da 1ª atribuição.
+    base: nomes já conhecidos (assinaturas; numa sub-rotina, globais e parâmetros).
+    """
+    declaradas: Dict[str, Decl] = {}
+    for no in _percorrer(programa):
+        if isinstance(no, Decl):
+            anterior = declaradas.get(no.nome)
+            if anterior and anterior.tipo != no.tipo:
+                raise ErroTraducao(
+                    no.linha,
+                    f"'{no.nome}' já foi declarada como {_nome_tipo(anterior.tipo)} (linha {anterior.linha}).",
+                )
+            declaradas.setdefault(no.nome, no)
+
+    tipos = dict(base or {})
+    tipos.update((nome, d.tipo) for nome, d in declaradas.items())
+    inferidas: Dict[str, Atribuicao] = {}
+    for no in _percorrer(programa):
+        if isinstance(no, Para):
+            tipos.setdefault(no.var, "inteiro")
+        elif isinstance(no, Atribuicao):
+            vetor = _vetor(tipos.get(no.nome))
+            if no.indice is not None and not vetor:
+                raise ErroTraducao(no.linha, f"'{no.nome}' não é um vetor declarado (vetor inteiro {no.nome}[N]).")
+            if no.indice is None and vetor:
+                raise ErroTraducao(no.linha, f"vetor '{no.nome}' precisa de índice: {no.nome}[i] <- ...")
+            if no.nome not in tipos:
+                tipos[no.nome] = _expr(no.expr, tipos, no.linha).tipo
+                inferidas[no.nome] = no
+    return tipos, declaradas, inferidas
+
+
+# ------------------ Geração ------------------
+
+_TIPOS_CPP = {"inteiro": "int", "real": "float", "logico": "bool", "texto": "String"}
+_ZEROS_CPP = {"inteiro": "0", "real": "0.0", "logico": "false", "texto": '""'}
+
+# Nomes que uma sub-rotina não pode ter (palavras da linguagem, biblioteca, funções do sketch)
+_RESERVADAS = frozenset((
+    "inicio", "fim", "se", "senao", "entao", "enquanto", "faca", "para", "de", "ate", "passo",
+    "vetor", "procedimento", "funcao", "retornar", "quando_mudar", "tamanho", "verdadeiro", "falso", "and", "or", "not",
+    "escrever", "esperar", "ligar", "desligar", "configurar_saida", "configurar_entrada", "setup", "loop",
+)) | frozenset(_FUNCOES) | frozenset(_TIPOS_CPP)
+INLINE_MAX = 3  # instruções de uma sub-rotina pequena (sai como inline)
+BORDAS_MAX = 255  # bordas guardadas por quando_mudar enquanto o corpo não roda (uint8_t)
+
+# Biblioteca de apoio: só entra no sketch o que o programa usa.
+# nome -> (código C++, outras funções da biblioteca que ele usa)
+_RUNTIME: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "medir_distancia": ("""long medir_distancia(int trig, int echo) {
+  digitalWrite(trig, LOW);
+  delayMicroseconds(2);
+  digitalWrite(trig, HIGH);
+  delayMicroseconds(10);
+  digitalWrite(trig, LOW);
+  long dur = pulseIn(echo, HIGH, 30000); // timeout ~30ms
+  long cm = dur / 58; // aproximação
+  return cm;
+}""", ()),
+}
+
+# Periféricos iniciados em setup() só se usados
+_PERIFERICOS: Dict[str, str] = {
+    "Serial": "Serial.begin({baud});",
+}
+
+
+def _runtime_necessario(usados: set) -> List[str]:
+    """Nomes da biblioteca (com dependências) na ordem de _RUNTIME."""
+    necessarios = set()
+    pendentes = [n for n in usados if n in _RUNTIME]
+    while pendentes:
+        nome = pendentes.pop()
+        if nome not in necessarios:
+            necessarios.add(nome)
+            pendentes.extend(_RUNTIME[nome][1])
+    return [n for n in _RUNTIME if n in necessarios]
+
+
+# "<...>/portuino_sketch.ino:12:5: error: ..." (com ou sem o prefixo "[  1.2s] " de _run)
+_DIAG_INO_RE = re.compile(
+    r"^(?P<pre>\[\s*[\d.]+s\] )?(?P<arq>[^\n]*?\.ino):(?P<linha>\d+):(?:\d+:)?"
+    r"(?:\s*(?P<tipo>fatal error|error|warning|note):)?",
+    re.M,
+)
+_TIPOS_DIAG = {"fatal error": "erro", "error": "erro", "warning": "aviso", "note": "nota"}
+
+
+@dataclass
+class SketchGerado:
+    """Sketch gerado + mapa linha do .ino -> linha do .ptn (ambas a partir de 1)."""
+    ino: str
+    mapa: Dict[int, int]
+
+    def reescrever_diagnosticos(self, texto: str) -> str:
+        """Troca posições do .ino nas mensagens do GCC por linhas do programa Portuino."""
+        def trocar(m: "re.Match") -> str:
+            tipo = _TIPOS_DIAG.get(m.group("tipo") or "")
+            linha = self.mapa.get(int(m.group("linha")))
+            if linha is None:
+                local = f"(código gerado) {os.path.basename(m.group('arq'))}:{m.group('linha')}:"
+            else:
+                local = f"Linha {linha}:"
+            return (m.group("pre") or "") + local + (f" {tipo}:" if tipo else "")
+        return _DIAG_INO_RE.sub(trocar, texto)
+
+
+@dataclass
+class _Saida:
+    """Linhas geradas + linha Portuino de origem de cada uma."""
+    linhas: List[Tuple[str, Optional[int]]] = field(default_factory=list)
+
+    def add(self, texto: str = "", linha: Optional[int] = None, nivel: int = 0) -> None:
+        self.linhas.append((("  " * nivel + texto) if texto else "", linha))
+
+
+@dataclass
+class _Tarefa:
+    """Tarefa cooperativa (modo não bloqueante): cada esperar() vira um ponto de retomada."""
+    pontos: int = 0                                     # case 1..N do switch
+    locais: List[str] = field(default_factory=list)     # variáveis de 'para' (static)
+
+
+class _Gerador:
+    def __init__(self, tipos: Dict[str, str], iniciadas: set, eventos: bool = False, estrito: bool = False,
+                 variaveis: Optional[set] = None):
+        self.tipos = tipos
+        self.iniciadas = iniciadas
+        # nomes já declarados no C++ (globais; numa sub-rotina também parâmetros e locais):
+        # o 'para' usa a variável existente em vez de criar outra que a esconda
+        self.variaveis = variaveis or set()
+        self.eventos = eventos  # há quando_mudar: esperar() e os laços atendem as bordas
+        self.estrito = estrito  # recusa C++ direto (servidor de compilação)
+        self.usados: set = set()  # funções da biblioteca / periféricos usados
+        self.tarefa: Optional[_Tarefa] = None  # gerando o corpo de uma tarefa não bloqueante
+        self.sub: Optional[Subrotina] = None  # gerando o corpo de um procedimento/funcao
+
+    def expr(self, texto: str, linha: int) -> str:
+        return _expr(texto, self.tipos, linha, self.usados).cpp
+
+    def valor_para(self, nome: str, texto: str, linha: int) -> str:
+        """Expressão convertida para o tipo da variável de destino."""
+        return _valor_tipo(self.tipos.get(nome), _expr(texto, self.tipos, linha, self.usados))
+
+    def retornar(self, no: Retornar) -> str:
+        if self.sub is None:
+            raise ErroTraducao(no.linha, "'retornar' só pode ser usado dentro de procedimento ou funcao.")
+        if self.sub.retorno is None:
+            if no.expr:
+                raise ErroTraducao(no.linha, f"procedimento '{self.sub.nome}' não devolve valor (use uma funcao).")
+            return "return;"
+        if not no.expr:
+            raise ErroTraducao(no.linha, f"funcao '{self.sub.nome}' precisa devolver um valor: retornar <expressão>")
+        e = _expr(no.expr, self.tipos, no.linha, self.usados)
+        if e.tipo == "texto" and self.sub.retorno != "texto":
+            raise ErroTraducao(no.linha, f"funcao '{self.sub.nome}' devolve {self.sub.retorno}, não texto.")
+        return f"return {_valor_tipo(self.sub.retorno, e)};"
+
+    def escrever(self, texto: str, linha: int) -> str:
+        """escrever(a + b + c) -> Serial.print(a); Serial.print(b); Serial.println(c);"""
+        e = _expr(texto, self.tipos, linha, self.usados)
+        self.usados.add("Serial")
+        if e.partes and any(n + "()" in self.tipos for n in re.findall(r"(\w+)\s*\(", texto)):
+            # Chama procedimento/funcao: o texto é montado antes (o que a função escrever sai
+            # antes da linha, como no interpretador)
+            return f"Serial.println({e.cpp});"
+        partes = e.partes or [e]
+        prints = [f"Serial.print({p.parte()});" for p in partes[:-1]]
+        ultima = partes[-1]
+        prints.append(f"Serial.println({ultima.parte() if ultima.tipo == 'logico' else ultima.cpp});")
+        return " ".join(prints)
+
+    def comando(self, s: str, linha: int) -> str:
+        # funções arduino
+        m = re.match(r"^configurar_saida\((.*)\)$", s)
+        if m:
+            return f"pinMode({self.expr(m.group(1), linha)}, OUTPUT);"
+
+        m = re.match(r"^configurar_entrada\((.*)\)$", s)
+        if m:
+            return f"pinMode({self.expr(m.group(1), linha)}, INPUT);"
+
+        m = re.match(r"^ligar\((.*)\)$", s)
+        if m:
+            return f"digitalWrite({self.expr(m.group(1), linha)}, HIGH);"
+
+        m = re.match(r"^desligar\((.*)\)$", s)
+        if m:
+            return f"digitalWrite({self.expr(m.group(1), linha)}, LOW);"
+
+        m = re.match(r"^esperar\((.*)\)$", s)
+        if m:
+            ms = self.expr(m.group(1), linha)
+            if self.tarefa:
+                # Devolve a vez às outras tarefas; volta aqui (case N) até o tempo passar
+                self.tarefa.pontos += 1
+                n = self.tarefa.pontos
+                return (
+                    f"_espera = (unsigned long)({ms}); _t0 = millis(); _pt = {n}; return; "
+                    f"case {n}: if (millis() - _t0 < _espera) return;"
+                )
+            if self.eventos:
+                return f"_esperar((unsigned long)({ms}));"
+            # unsigned long, como delay(): int no AVR tem 16 bits (esperar(40000) estouraria)
+            return f"delay((unsigned long)({ms}));"
+
+        m = re.match(r"^escrever\((.*)\)$", s)
+        if m:
+            return self.escrever(m.group(1), linha)
+
+        # chamada de procedimento/funcao do programa
+        m = re.match(r"^(\w+)\s*\(", s)
+        if m and m.group(1) + "()" in self.tipos:
+            return _AnalisadorExpr(s, self.tipos, linha, self.usados, comando=True).analisar().cpp + ";"
+
+        # fallback: permite escrever C++ direto (educacional avançado)
+        if self.estrito:
+            raise ErroTraducao(
+                linha, f"comando desconhecido: {s} (C++ direto e #include não são aceitos neste modo)"
+            )
+        self.usados.update(n for n in re.findall(r"[A-Za-z_]\w*", s) if n in _RUNTIME or n in _PERIFERICOS)
+        return s + (";" if not s.endswith((";", "{", "}")) else "")
+
+    def bloco(self, nos: List[No], nivel: int, out: _Saida) -> None:
+        for no in nos:
+            if isinstance(no, Decl):
+                if no.linha in self.iniciadas:
+                    continue
+                if _vetor(no.tipo):
+                    # Declarar de novo zera o vetor (como no interpretador)
+                    out.add(f"memset({no.nome}, 0, sizeof({no.nome}));", no.linha, nivel)
+                else:
+                    out.add(f"{no.nome} = {self.valor_para(no.nome, no.expr, no.linha)};", no.linha, nivel)
+            elif isinstance(no, Atribuicao):
+                destino = no.nome if no.indice is None else self.expr(f"{no.nome}[{no.indice}]", no.linha)
+                out.add(f"{destino} = {self.valor_para(no.nome, no.expr, no.linha)};", no.linha, nivel)
+            elif isinstance(no, Comando):
+                out.add(self.comando(no.texto, no.linha), no.linha, nivel)
+            elif isinstance(no, Retornar):
+                out.add(self.retornar(no), no.linha, nivel)
+            elif isinstance(no, Se):
+                out.add(f"if ({self.expr(no.cond, no.linha)}) {{", no.linha, nivel)
+                self.bloco(no.entao, nivel + 1, out)
+                if no.senao:
+                    out.add("} else {", no.linha_senao, nivel)
+                    self.bloco(no.senao, nivel + 1, out)
+                out.add("}", no.linha_fim, nivel)
+            elif isinstance(no, Enquanto):
+                out.add(f"while ({self.expr(no.cond, no.linha)}) {{", no.linha, nivel)
+                if self.eventos:
+                    out.add("_eventos();", no.linha, nivel + 1)
+                self.bloco(no.corpo, nivel + 1, out)
+                out.add("}", no.linha_fim, nivel)
+            elif isinstance(no, Para):
+                v = no.var
+                a, b, p = (self.expr(x, no.linha) for x in (no.de, no.ate, no.passo))
+                # Inclusivo (como no interpretador); passo negativo conta para baixo
+                if re.fullmatch(r"-\s*\d+", p):
+                    cond = f"{v} >= {b}"
+                elif re.fullmatch(r"\d+", p):
+                    cond = f"{v} <= {b}"
+                else:
+                    cond = f"({p}) > 0 ? {v} <= {b} : {v} >= {b}"
+                if v in self.variaveis:
+                    # variável do programa: o valor depois do laço é o mesmo do interpretador
+                    out.add(f"for ({v} = {a}; {cond}; {v} += {p}) {{", no.linha, nivel)
+                elif self.tarefa:
+                    # O switch pode retomar dentro do laço: a variável não pode ser local ao for
+                    if v not in self.tarefa.locais:
+                        self.tarefa.locais.append(v)
+                    out.add(f"for ({v} = {a}; {cond}; {v} += {p}) {{", no.linha, nivel)
+                else:
+                    out.add(f"for (int {v} = {a}; {cond}; {v} += {p}) {{", no.linha, nivel)
+                self.bloco(no.corpo, nivel + 1, out)
+                out.add("}", no.linha_fim, nivel)
+
+
+def _gerar_tarefa(ger: _Gerador, k: int, laco: Enquanto, out: _Saida) -> None:
+    """
+    void tarefa_k(): corpo de um "enquanto (verdadeiro)" como protothread.
+    O switch retoma no último esperar(); ao fim do corpo volta ao começo (case 0).
+    """
+    ger.tarefa = _Tarefa()
+    corpo = _Saida()
+    ger.bloco(laco.corpo, 2, corpo)
+    tarefa, ger.tarefa = ger.tarefa, None
+
+    out.add(f"void tarefa_{k}() {{", laco.linha)
+    if not tarefa.pontos:
+        # Sem esperar(): o corpo roda inteiro a cada chamada
+        out.linhas += [(ln[2:] if ln.startswith("  ") else ln, n) for ln, n in corpo.linhas]
+        out.add("}", laco.linha_fim)
+        return
+    out.add("static int _pt = 0;  // ponto de retomada", nivel=1)
+    out.add("static unsigned long _t0, _espera;", nivel=1)
+    for v in tarefa.locais:
+        out.add(f"static int {v};", nivel=1)
+    out.add("switch (_pt) {", nivel=1)
+    out.add("case 0:", nivel=1)
+    out.linhas += corpo.linhas
+    out.add("}", nivel=1)
+    out.add("_pt = 0;", nivel=1)
+    out.add("}", laco.linha_fim)
+
+
+def _chamados(no: No, nomes) -> set:
+    """Sub-rotinas chamadas nas expressões da própria instrução (sem descer nos blocos)."""
+    textos = [getattr(no, c, None) or "" for c in ("expr", "indice", "texto", "cond", "de", "ate", "passo")]
+    sem_textos = re.sub(r'"(?:\\.|[^"\\])*"', '""', "\n".join(textos))
+    return {n for n in re.findall(r"([A-Za-z_]\w*)\s*\(", sem_textos) if n in nomes}
+
+
+def _assinaturas(subs: List[Subrotina]) -> Dict[str, str]:
+    """"nome()" -> assinatura de cada sub-rotina (como entram na tabela de tipos)."""
+    assinaturas: Dict[str, str] = {}
+    for s in subs:
+        if s.nome in _RESERVADAS:
+            raise ErroTraducao(s.linha, f"'{s.nome}' é um nome reservado.")
+        if s.nome + "()" in assinaturas:
+            raise ErroTraducao(s.linha, f"'{s.nome}' já foi definido.")
+        assinaturas[s.nome + "()"] = f"{s.retorno or ''}({','.join(t for t, _ in s.params)})"
+    return assinaturas
+
+
+def _alcancaveis(grafo: Dict[str, set], inicio: set) -> set:
+    """Sub-rotinas chamadas a partir de `inicio`, direta ou indiretamente (inclui `inicio`)."""
+    vistos: set = set()
+    pendentes = list(inicio)
+    while pendentes:
+        n = pendentes.pop()
+        if n not in vistos:
+            vistos.add(n)
+            pendentes.extend(grafo[n])
+    return vistos
+
+
+def _locais(sub: Subrotina, tipos: Dict[str, str]) -> Tuple[Dict[str, str], List[Tuple[str, str, int]]]:
+    """
+    (tipos no corpo, locais (tipo, nome, linha)): parâmetros, variáveis declaradas na sub-rotina
+    e as atribuídas sem declaração que não são globais. Locais escondem globais de mesmo nome.
+    """
+    params = {nome: tipo for tipo, nome in sub.params}
+    tipos_sub, declaradas, inferidas = _tabela_tipos(sub.corpo, {**tipos, **params})
+    locais = []
+    for nome, d in declaradas.items():
+        if nome in params:
+            raise ErroTraducao(d.linha, f"'{nome}' já é parâmetro de '{sub.nome}'.")
+        locais.append((d.tipo, nome, d.linha))
+    locais += [(tipos_sub[nome], nome, a.linha) for nome, a in inferidas.items()]
+    return tipos_sub, locais
+
+
+def _em_escopo(globais: set, sub: Subrotina, locais: List[Tuple[str, str, int]]) -> set:
+    """Variáveis declaradas no C++ dentro da sub-rotina: globais, parâmetros e locais."""
+    return set(globais) | {nome for _, nome in sub.params} | {nome for _, nome, _ in locais}
+
+
+def _preparo(no: No, subs) -> bool:
+    """Declaração ou configurar_* sem chamar sub-rotina: vem antes de ligar os quando_mudar."""
+    if isinstance(no, Decl):
+        return not _chamados(no, subs)
+    return (
+        isinstance(no, Comando) and re.match(r"^configurar_(entrada|saida)\(", no.texto) is not None
+        and not _chamados(no, subs)
+    )
+
+
+def _ligar_eventos(quandos: List[QuandoMudar], out: _Saida) -> None:
+    """attachInterrupt de cada quando_mudar (pino sem interrupção: guarda o nível para comparar)."""
+    for k, q in enumerate(quandos, 1):
+        p = q.pino
+        out.add(f"if (digitalPinToInterrupt({p}) != NOT_AN_INTERRUPT) "
+                f"attachInterrupt(digitalPinToInterrupt({p}), _ev_isr_{k}, {_BORDAS[q.borda]});", q.linha, 1)
+        out.add(f"else _ev_nivel[{k - 1}] = digitalRead({p}) == HIGH;  // sem interrupção: compara leituras",
+                q.linha, 1)
+
+
+def _prototipo(sub: Subrotina, inline: bool) -> str:
+    params = ", ".join(f"{_TIPOS_CPP[t]} {n}" for t, n in sub.params)
+    return f"{'inline ' if inline else ''}{_TIPOS_CPP.get(sub.retorno, 'void')} {sub.nome}({params})"
+
+
+def _gerar_subrotina(ger: _Gerador, sub: Subrotina, locais: List[Tuple[str, str, int]], inline: bool,
+                     out: _Saida) -> None:
+    """Função C++: locais no começo (zeradas), corpo, e o valor padrão se a funcao chega ao fim."""
+    out.add(_prototipo(sub, inline) + " {", sub.linha)
+    for tipo, nome, linha in locais:
+        vetor = _vetor(tipo)
+        if vetor:
+            out.add(f"{_TIPOS_CPP[vetor[0]]} {nome}[{vetor[1]}];", linha, 1)
+        else:
+            out.add(f"{_TIPOS_CPP[tipo]} {nome} = {_ZEROS_CPP[tipo]};", linha, 1)
+    ger.sub = sub
+    ger.bloco(sub.corpo, 1, out)
+    ger.sub = None
+    if sub.retorno and not (sub.corpo and isinstance(sub.corpo[-1], Retornar)):
+        out.add(f"return {_ZEROS_CPP[sub.retorno]};", sub.linha_fim, 1)
+    out.add("}", sub.linha_fim)
+
+
+def _gerar_eventos(quandos: List[QuandoMudar], out: _Saida) -> None:
+    """
+    Apoio dos quando_mudar: a ISR só conta a borda (volatile, saturando em BORDAS_MAX) e
+    _eventos() roda os corpos fora da interrupção, quando o programa está num ponto seguro
+    (esperar, volta de laço). Pino sem interrupção na placa: _eventos() compara leituras.
+    """
+    n = len(quandos)
+    out.add("// quando_mudar: a interrupção só conta a borda; o corpo roda fora dela, em _eventos()")
+    out.add("#if defined(ESP8266) || defined(ESP32)")
+    out.add("#define _EV_ISR IRAM_ATTR")
+    out.add("#else")
+    out.add("#define _EV_ISR")
+    out.add("#endif")
+    out.add("#ifndef NOT_AN_INTERRUPT")
+    out.add("#define NOT_AN_INTERRUPT -1")
+    out.add("#endif")
+    out.add(f"volatile uint8_t _ev_bordas[{n}];  // bordas ainda não atendidas")
+    out.add(f"int8_t _ev_nivel[{n}] = {{{', '.join(['-1'] * n)}}};  // pino sem interrupção: última leitura")
+    for k, q in enumerate(quandos, 1):
+        out.add(f"void quando_mudar_{k}();", q.linha)
+    for k, q in enumerate(quandos, 1):
+        out.add(f"void _EV_ISR _ev_isr_{k}() {{ if (_ev_bordas[{k - 1}] < {BORDAS_MAX}) _ev_bordas[{k - 1}]++; }}", q.linha)
+    out.add()
+    out.add("bool _ev_tirar(uint8_t k) {")
+    out.add("noInterrupts();  // a ISR não pode mudar o contador no meio", nivel=1)
+    out.add("bool tem = _ev_bordas[k] > 0;", nivel=1)
+    out.add("if (tem) _ev_bordas[k]--;", nivel=1)
+    out.add("interrupts();", nivel=1)
+    out.add("return tem;", nivel=1)
+    out.add("}")
+    out.add()
+    out.add("void _ev_ler(uint8_t k, int pino, int modo) {")
+    out.add("if (_ev_nivel[k] < 0) return;", nivel=1)
+    out.add("int8_t v = digitalRead(pino) == HIGH;", nivel=1)
+    out.add("if (v != _ev_nivel[k] && (modo == CHANGE || (modo == RISING) == (v == 1)) && _ev_bordas[k] < "
+            f"{BORDAS_MAX}) _ev_bordas[k]++;", nivel=1)
+    out.add("_ev_nivel[k] = v;", nivel=1)
+    out.add("}")
+    out.add()
+    out.add("void _eventos() {")
+    out.add("static bool atendendo = false;  // esperar() dentro de um quando_mudar não atende de novo", nivel=1)
+    out.add("if (atendendo) return;", nivel=1)
+    out.add("atendendo = true;", nivel=1)
+    for k, q in enumerate(quandos, 1):
+        out.add(f"_ev_ler({k - 1}, {q.pino}, {_BORDAS[q.borda]});", q.linha, 1)
+    for k, q in enumerate(quandos, 1):
+        out.add(f"while (_ev_tirar({k - 1})) quando_mudar_{k}();", q.linha, 1)
+    out.add("atendendo = false;", nivel=1)
+    out.add("}")
+    out.add()
+    out.add("void _esperar(unsigned long ms) {")
+    out.add("unsigned long t0 = millis();", nivel=1)
+    out.add("do {", nivel=1)
+    out.add("_eventos();", nivel=2)
+    out.add("} while (millis() - t0 < ms);", nivel=1)
+    out.add("}")
+    out.add()
+
+
+def traduzir(
+    code_ptn: str, baud: int = 9600, nao_bloqueante: bool = False, estrito: bool = False
+) -> SketchGerado:
+    """
+    Portuino -> Arduino C++ (com cache: o mesmo texto e opções devolvem o mesmo SketchGerado,
+    que não deve ser alterado por quem chama).
+    - variáveis declaradas uma vez, como globais (constantes iniciadas na própria declaração);
+      variáveis usadas sem declaração recebem o tipo da 1ª atribuição
+    - instruções antes do "enquanto (verdadeiro)" final vão para setup(), o corpo dele para loop()
+    - sem esse laço final o programa roda uma vez (setup) e loop() fica vazio, como no interpretador
+    - escrever("a" + x) imprime em partes (Serial.print), sem String no heap
+    - só entram as funções da biblioteca de apoio (_RUNTIME) e os periféricos que o programa usa
+    - procedimentos/funções viram funções C++ (parâmetros por valor, variáveis locais);
+      as pequenas saem como inline para não pagar a chamada
+    - quando_mudar liga attachInterrupt em setup(), depois das declarações e configurar_* do
+      começo (o pino já tem o modo do programa); a ISR só conta a borda e o corpo roda
+      nos esperar() e a cada volta de laço (pino sem interrupção: comparação de leituras)
+    nao_bloqueante: cada "enquanto (verdadeiro)" de nível superior vira uma tarefa cooperativa
+    (esperar() usa millis() e devolve a vez); as tarefas rodam juntas em loop() e o resto do
+    programa roda antes, em setup().
+    estrito: linhas que não são comandos Portuino (C++ direto, #include...) viram erro em vez
+    de irem para o sketch; o servidor de compilação traduz sempre assim.
+    Cada linha gerada guarda a linha Portuino de origem (SketchGerado.mapa).
+    """
+    chave = _chave_cache(code_ptn, baud, nao_bloqueante, estrito)
+    r = _CACHE.get(chave)
+    if r is None:
+        try:
+            r = _traduzir(code_ptn, baud, nao_bloqueante, estrito)
+        except ErroTraducao as e:
+            r = e  # erros também: a prévia da IDE pede de novo a cada tecla
+        _CACHE.put(chave, r)
+    if isinstance(r, ErroTraducao):
+        raise ErroTraducao(r.linha, r.mensagem)
+    return r
+
+
+def _emitir(ger: _Gerador, b: _Bloco, contexto: str, out: _Saida, gerar: Callable[[_Saida], None]) -> set:
+    """
+    C++ de um bloco de nível superior (gerado por `gerar` ou reaproveitado de _EMITIDOS);
+    devolve os nomes da biblioteca/periféricos que ele usa. O C++ só depende do trecho, do
+    lugar onde entra (setup, loop, tarefa_k), dos tipos das variáveis citadas no trecho, de
+    quais delas já existem no C++ e de a declaração ter virado inicializador global.
+    """
+    ger.usados = set()
+    if b.itens is None:
+        gerar(out)
+        return ger.usados
+    tipos = tuple(sorted((k, ger.tipos[k]) for n in b.nomes for k in (n, n + "()") if k in ger.tipos))
+    existentes = tuple(sorted(n for n in b.nomes if n in ger.variaveis))
+    chave = (b.itens, contexto, tipos, existentes, b.no.linha in ger.iniciadas, ger.estrito)
+    pronto = _EMITIDOS.get(chave)
+    if pronto is None:
+        parcial = _Saida()
+        gerar(parcial)
+        pronto = ([(ln, None if n is None else n - b.desloc) for ln, n in parcial.linhas], frozenset(ger.usados))
+        _EMITIDOS.put(chave, pronto)
+    linhas, usados = pronto
+    out.linhas += [(ln, None if n is None else n + b.desloc) for ln, n in linhas]
+    return set(usados)
+
+
+def _traduzir(code_ptn: str, baud: int, nao_bloqueante: bool, estrito: bool = False) -> SketchGerado:
+    blocos = _blocos(code_ptn)
+    subs = [b for b in blocos if isinstance(b.no, Subrotina)]
+    quandos = [b for b in blocos if isinstance(b.no, QuandoMudar)]
+    blocos = [b for b in blocos if not isinstance(b.no, (Subrotina, QuandoMudar))]
+    programa = [b.no for b in blocos]
+    pinos: Dict[int, int] = {}
+    for b in quandos:
+        if b.no.pino in pinos:
+            raise ErroTraducao(b.no.linha, f"o pino {b.no.pino} já tem quando_mudar (linha {pinos[b.no.pino]}).")
+        pinos[b.no.pino] = b.no.linha
+    # Contexto dos blocos gerados: com quando_mudar, esperar() e os laços mudam
+    ev = ":eventos" if quandos else ""
+
+    tipos, declaradas, inferidas = _tabela_tipos(programa, _assinaturas([b.no for b in subs]))
+    for b in subs:
+        if b.no.nome in tipos:
+            raise ErroTraducao(b.no.linha, f"'{b.no.nome}' já é nome de variável.")
+
+    # Grafo de chamadas: recursão não vira inline; no modo não bloqueante, as tarefas não
+    # podem chamar sub-rotinas que esperam (delay() dentro da função travaria as outras tarefas)
+    nomes = {b.no.nome for b in subs}
+    grafo = {b.no.nome: set().union(*(_chamados(no, nomes) for no in _percorrer(b.no.corpo))) for b in subs}
+    recursivas = {n for n in grafo if n in _alcancaveis(grafo, grafo[n])}
+    esperam = {
+        b.no.nome for b in subs
+        if any(isinstance(no, Comando) and no.texto.startswith("esperar(") for no in _percorrer(b.no.corpo))
+    }
+
+    # Declarações constantes no começo do programa viram inicializadores globais
+    iniciadas = set()
+    for no in programa:
+        if not isinstance(no, Decl):
+            break
+        if declaradas[no.nome] is no and _constante(no.expr):
+            iniciadas.add(no.linha)
+
+    principal: Optional[_Bloco] = None
+    tarefas: List[_Bloco] = []
+    inicializacao = blocos
+    if nao_bloqueante:
+        tarefas = [b for b in blocos if isinstance(b.no, Enquanto) and _eh_verdadeiro(b.no.cond)]
+        inicializacao = [b for b in blocos if not any(b is t for t in tarefas)]
+        for t in tarefas:
+            for no in _percorrer(t.no.corpo):
+                for n in _chamados(no, nomes):
+                    if _alcancaveis(grafo, {n}) & esperam:
+                        raise ErroTraducao(
+                            no.linha, f"'{n}' usa esperar(): no modo não bloqueante, uma tarefa "
+                            "só chama procedimentos/funções sem esperar (ou desligue o modo).",
+                        )
+        for b in quandos:
+            for no in _percorrer(b.no.corpo):
+                espera = isinstance(no, Comando) and no.texto.startswith("esperar(")
+                if espera or any(_alcancaveis(grafo, {n}) & esperam for n in _chamados(no, nomes)):
+                    raise ErroTraducao(
+                        no.linha, "no modo não bloqueante, quando_mudar não pode esperar "
+                        "(travaria as tarefas); use uma variável e deixe a tarefa esperar.",
+                    )
+    elif programa and isinstance(programa[-1], Enquanto) and _eh_verdadeiro(programa[-1].cond):
+        principal = blocos[-1]
+        inicializacao = blocos[:-1]
+
+    variaveis = set(declaradas) | set(inferidas)
+    ger = _Gerador(tipos, iniciadas, bool(quandos), estrito, variaveis)
+    globais = _Saida()
+    if declaradas or inferidas:
+        globais.add("// Variáveis (declaradas uma vez)")
+        for d in declaradas.values():
+            vetor = _vetor(d.tipo)
+            if vetor:
+                # globais começam zeradas
+                globais.add(f"{_TIPOS_CPP[vetor[0]]} {d.nome}[{vetor[1]}];", d.linha)
+            elif d.linha in iniciadas:
+                globais.add(f"{_TIPOS_CPP[d.tipo]} {d.nome} = {ger.valor_para(d.nome, d.expr, d.linha)};", d.linha)
+            else:
+                globais.add(f"{_TIPOS_CPP[d.tipo]} {d.nome};", d.linha)
+        for nome, a in inferidas.items():
+            globais.add(f"{_TIPOS_CPP[tipos[nome]]} {nome};", a.linha)
+        globais.add()
+
+    # Corpo antes do cabeçalho: só então se sabe o que a biblioteca precisa incluir
+    usados = set(ger.usados)
+    setup = _Saida()
+    # quando_mudar liga as bordas depois das declarações e configurar_* do começo: o pino já está
+    # no modo do programa (nível inicial certo, sem borda falsa ao configurar) e o resto já é atendido
+    preparo = 0
+    while preparo < len(inicializacao) and _preparo(inicializacao[preparo].no, nomes):
+        preparo += 1
+    for b in inicializacao[:preparo]:
+        usados |= _emitir(ger, b, "setup" + ev, setup, lambda out: ger.bloco([b.no], 1, out))
+    _ligar_eventos([b.no for b in quandos], setup)
+    for b in inicializacao[preparo:]:
+        usados |= _emitir(ger, b, "setup" + ev, setup, lambda out: ger.bloco([b.no], 1, out))
+    loop = _Saida()
+    funcoes = _Saida()
+    if quandos:
+        _gerar_eventos([b.no for b in quandos], funcoes)
+    if subs:
+        funcoes.add("// Procedimentos e funções")
+        pequenas = {
+            b.no.nome for b in subs
+            if b.no.nome not in recursivas and len(list(_percorrer(b.no.corpo))) <= INLINE_MAX
+            and not any(isinstance(no, (Enquanto, Para)) for no in _percorrer(b.no.corpo))
+        }
+        for b in subs:
+            funcoes.add(_prototipo(b.no, b.no.nome in pequenas) + ";", b.no.linha)
+        funcoes.add()
+        for b in subs:
+            tipos_sub, locais = _locais(b.no, tipos)
+            ger_sub = _Gerador(tipos_sub, set(), bool(quandos), estrito, _em_escopo(variaveis, b.no, locais))
+            inline = b.no.nome in pequenas
+            # o contexto leva as locais: o mesmo trecho gera outro C++ se um nome deixa de ser global
+            contexto = f"funcao:{int(inline)}{ev}:{','.join(n for _, n, _ in locais)}"
+            usados |= _emitir(ger_sub, b, contexto, funcoes,
+                              lambda out: _gerar_subrotina(ger_sub, b.no, locais, inline, out))
+            funcoes.add()
+    if quandos:
+        funcoes.add("// quando_mudar (rodam fora da interrupção)")
+        for k, b in enumerate(quandos, 1):
+            # Corpo como um procedimento sem parâmetros (variáveis locais, 'retornar' sai)
+            sub = Subrotina(b.no.linha, f"quando_mudar_{k}", None, [], b.no.corpo, b.no.linha_fim)
+            tipos_sub, locais = _locais(sub, tipos)
+            ger_sub = _Gerador(tipos_sub, set(), True, estrito, _em_escopo(variaveis, sub, locais))
+            contexto = f"quando_mudar_{k}:{','.join(n for _, n, _ in locais)}"
+            usados |= _emitir(ger_sub, b, contexto, funcoes,
+                              lambda out: _gerar_subrotina(ger_sub, sub, locais, False, out))
+            funcoes.add()
+    if quandos and (tarefas or principal):
+        loop.add("_eventos();", nivel=1)  # sem laço final os quando_mudar param com o programa
+    if tarefas:
+        for k, t in enumerate(tarefas, 1):
+            usados |= _emitir(ger, t, f"tarefa_{k}{ev}", funcoes, lambda out: _gerar_tarefa(ger, k, t.no, out))
+            funcoes.add()
+            loop.add(f"tarefa_{k}();", t.no.linha, nivel=1)
+    elif principal:
+        usados |= _emitir(ger, principal, "loop" + ev, loop, lambda out: ger.bloco(principal.no.corpo, 1, out))
+    else:
+        loop.add("// Sem \"enquanto (verdadeiro)\" no final: o programa roda uma vez (setup).", nivel=1)
+
+    out = _Saida()
+    out.add("/*")
+    out.add("  Sketch gerado pela Portuino IDE")
+    out.add("*/")
+    out.add()
+    for nome in _runtime_necessario(usados):
+        for ln in _RUNTIME[nome][0].splitlines():
+            out.add(ln)
+        out.add()
+    out.linhas += globais.linhas
+    out.linhas += funcoes.linhas
+
+    out.add("void setup() {")
+    for nome, inicio in _PERIFERICOS.items():
+        if nome in usados:
+            out.add(inicio.format(baud=baud), nivel=1)
+    out.linhas += setup.linhas
+    out.add("}")
+    out.add()
+    out.add("void loop() {", principal.no.linha if principal else None)
+    out.linhas += loop.linhas
+    out.add("}", principal.no.linha_fim if principal else None)
+
+    ino = "\n".join(ln for ln, _ in out.linhas) + "\n"
+    mapa = {i: n for i, (_, n) in enumerate(out.linhas, 1) if n is not None}
+    return SketchGerado(ino=ino, mapa=mapa)
+
+
+# ------------------ Cache de traduções ------------------
+
+class _LRU:
+    """Dicionário limitado: os itens usados há mais tempo saem primeiro (seguro entre threads)."""
+    def __init__(self, maximo: int):
+        self.maximo = maximo
+        self._itens: "OrderedDict[object, object]" = OrderedDict()
+        self._lock = threading.Lock()  # IDE, CLI e servidor traduzem em threads
+
+    def get(self, chave):
+        with self._lock:
+            valor = self._itens.get(chave)
+            if valor is not None:
+                self._itens.move_to_end(chave)
+            return valor
+
+    def put(self, chave, valor) -> None:
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._itens.clear()
+
+
+CACHE_MAX = 64          # programas inteiros (SketchGerado ou ErroTraducao)
+BLOCOS_MAX = 4096       # blocos de nível superior analisados / gerados
+_CACHE = _LRU(CACHE_MAX)
+_ANALISES = _LRU(BLOCOS_MAX)    # (trecho com linhas relativas, deslocamento) -> (nó, identificadores)
+_EMITIDOS = _LRU(BLOCOS_MAX)    # trecho + contexto -> (linhas C++ relativas, usados)
+
+
+def _chave_cache(code_ptn: str, baud: int, nao_bloqueante: bool, estrito: bool = False) -> str:
+    # só entram as opções que mudam o .ino (o perfil de compilação muda apenas as flags do GCC)
+    h = hashlib.sha256(code_ptn.encode("utf-8"))
+    h.update(f"\0{int(baud)}\0{int(bool(nao_bloqueante))}".encode("ascii"))
+    if estrito:  # mantém as chaves já existentes do modo normal
+        h.update(b"\0estrito")
+    return h.hexdigest()
+
+
+def limpar_cache() -> None:
+    for cache in (_CACHE, _ANALISES, _EMITIDOS):
+        cache.clear()
+
+
+def portuino_to_ino(
+    code_ptn: str, baud: int = 9600, nao_bloqueante: bool = False, estrito: bool = False
+) -> str:
+    """Só o texto do sketch (veja traduzir para o mapa de linhas)."""
+    return traduzir(code_ptn, baud=baud, nao_bloqueante=nao_bloqueante, estrito=estrito).ino